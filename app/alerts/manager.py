@@ -1,23 +1,280 @@
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import List
+import asyncio
 import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Set, Tuple
+
+from fastapi import WebSocket
+
+from .pubsub import InProcessBackend, create_backend
+from .replay import ReplayBuffer
+from .subscriptions import Subscription, SubscriptionIndex
+
+logger = logging.getLogger("alerts_hub")
+
+# What to do when a client's queue is full
+LAGGARD_POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+# Same encoding as WebSocket.send_json, done once per broadcast
+_JSON_SEPARATORS = (",", ":")
+
+
+@dataclass(eq=False)
+class _Client:
+    websocket: WebSocket
+    queue: "asyncio.Queue[Tuple[str, float]]"
+    connected_at: float = field(default_factory=time.time)
+    sender: asyncio.Task | None = None
+    sent: int = 0
+    dropped: int = 0
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    Fan-out hub for the alerts WebSocket.
 
-    async def connect(self, websocket: WebSocket):
+    `broadcast` serializes a message once and puts the text on every
+    client's bounded queue without awaiting any socket; a sender task per
+    connection drains its queue. A client whose queue is full is a laggard:
+    depending on `laggard_policy` its oldest queued message is dropped, the
+    new message is dropped, or it is disconnected. Sends that fail or exceed
+    `send_timeout` close the connection, so a dead or stalled socket never
+    holds up other clients or the caller. Each client has a `Subscription`
+    (everything by default) and messages are only queued for clients whose
+    subscription matches, as looked up in a `SubscriptionIndex`.
+
+    Broadcasts go through a pub/sub `backend`; with a shared backend (Redis)
+    an alert broadcast by any worker process reaches the clients of all
+    workers.
+
+    Every broadcast is stamped with a monotonically increasing `seq` and
+    kept in a `ReplayBuffer`. A client reconnecting with the last `seq` it
+    saw gets the matching alerts it missed from memory before live ones.
+    Alerts sent while the backend cannot allocate a sequence id carry
+    `seq: null` and are not replayable.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 100,
+        laggard_policy: str = "drop_oldest",
+        send_timeout: float = 5.0,
+        backend=None,
+        replay_size: int = 1000,
+    ):
+        if laggard_policy not in LAGGARD_POLICIES:
+            raise ValueError(f"laggard_policy must be one of {LAGGARD_POLICIES}, got {laggard_policy!r}")
+        self.queue_size = queue_size
+        self.laggard_policy = laggard_policy
+        self.send_timeout = send_timeout
+        self.backend = backend or InProcessBackend()
+        self.backend.bind(self._deliver)
+        self.replay = ReplayBuffer(replay_size)
+        self._clients: Dict[WebSocket, _Client] = {}
+        self._subscriptions = SubscriptionIndex()
+        # Pending socket closes, referenced so they are not garbage collected mid-flight
+        self._closing: Set[asyncio.Task] = set()
+        self._broadcasts = 0
+        self._replayed = 0
+        self._filtered = 0
+        self._enqueued = 0
+        self._sent = 0
+        self._dropped = 0
+        self._laggards_disconnected = 0
+        self._send_failures = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    @property
+    def active_connections(self):
+        return list(self._clients)
+
+    async def connect(self, websocket: WebSocket, subscription: Subscription | None = None, since: int | None = None):
+        """
+        Register a client. With `since`, alerts after that sequence id are
+        replayed first; registration and replay happen without yielding to
+        the event loop, so nothing is missed or repeated between them.
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
+        subscription = subscription or Subscription()
+        client = _Client(websocket=websocket, queue=asyncio.Queue(maxsize=self.queue_size))
+        client.sender = asyncio.create_task(self._send_loop(client))
+        self._clients[websocket] = client
+        self._subscriptions.add(websocket, subscription)
+        if since is not None:
+            self._replay_to(client, subscription, since)
+
+    def _replay_to(self, client: _Client, subscription: Subscription, since: int):
+        last = self.replay.last_sequence
+        if since > last:
+            # The client saw sequence ids this hub never issued (e.g. before a restart)
+            self._send_notice(client, {"event": "REPLAY_RESET", "last_seq": last})
+            return
+        entries = [entry for entry in self.replay.since(since) if subscription.matches(entry.message)]
+        gap_to = None
+        oldest = self.replay.oldest_sequence
+        if oldest is not None and oldest > since + 1:
+            gap_to = oldest - 1
+        # Keep the newest entries that fit the queue, one slot left for the gap notice
+        room = self.queue_size - 1
+        if len(entries) > room:
+            entries = entries[len(entries) - room:] if room > 0 else []
+            gap_to = entries[0].seq - 1 if entries else last
+        if gap_to is not None:
+            self._send_notice(client, {
+                "event": "REPLAY_GAP",
+                "from_seq": since + 1,
+                "to_seq": gap_to,
+                "detail": "Alerts in this range are no longer buffered; fetch them from /api/v1/alerts/history",
+            })
+        queued_at = time.perf_counter()
+        for entry in entries:
+            client.queue.put_nowait((entry.text, queued_at))
+        self._replayed += len(entries)
+
+    def _send_notice(self, client: _Client, message: dict):
+        client.queue.put_nowait((json.dumps(message, separators=_JSON_SEPARATORS), time.perf_counter()))
+
+    def subscribe(self, websocket: WebSocket, subscription: Subscription):
+        """Replace the filter of a connected client."""
+        if websocket in self._clients:
+            self._subscriptions.add(websocket, subscription)
+
+    def subscription(self, websocket: WebSocket) -> Subscription | None:
+        return self._subscriptions.get(websocket)
+
+    def send_to(self, websocket: WebSocket, message: dict):
+        """Queue a message for one client only, in order with its broadcasts."""
+        client = self._clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, json.dumps(message, separators=_JSON_SEPARATORS, ensure_ascii=False), time.perf_counter())
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        """Forget a connection and stop its sender; safe to call more than once."""
+        self._subscriptions.remove(websocket)
+        client = self._clients.pop(websocket, None)
+        if client is not None and client.sender is not None and client.sender is not asyncio.current_task():
+            client.sender.cancel()
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
+    async def start(self):
+        """Connect the pub/sub backend (application startup)."""
+        await self.backend.start()
+
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        """Publish `message` to every subscribed client; never waits on a socket."""
+        self._broadcasts += 1
+        # With no shared sequence id (Redis unreachable) the alert goes out
+        # with seq None: a worker-local id could collide with ids INCR hands
+        # out once Redis is back, so it is delivered live but not replayable
+        seq = await self.backend.next_sequence()
+        message = {**message, "seq": seq}
+        await self.backend.publish(message, json.dumps(message, separators=_JSON_SEPARATORS, ensure_ascii=False))
+
+    async def _deliver(self, message: dict, text: str):
+        if isinstance(message.get("seq"), int):
+            self.replay.append(message["seq"], message, text)
+        targets = self._subscriptions.match(message)
+        self._filtered += len(self._clients) - len(targets)
+        queued_at = time.perf_counter()
+        for websocket in targets:
+            client = self._clients.get(websocket)
+            if client is not None:
+                self._enqueue(client, text, queued_at)
+
+    def _enqueue(self, client: _Client, text: str, queued_at: float):
+        if client.queue.full():
+            if self.laggard_policy == "disconnect":
+                self._laggards_disconnected += 1
+                logger.warning("Disconnecting alerts client: %d messages behind", client.queue.qsize())
+                self._close(client)
+                return
+            client.dropped += 1
+            self._dropped += 1
+            if self.laggard_policy == "drop_newest":
+                return
+            client.queue.get_nowait()
+        client.queue.put_nowait((text, queued_at))
+        self._enqueued += 1
+
+    async def _send_loop(self, client: _Client):
+        try:
+            while True:
+                text, queued_at = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(text), self.send_timeout)
+                latency = time.perf_counter() - queued_at
+                client.sent += 1
+                self._sent += 1
+                self._total_latency += latency
+                self._max_latency = max(self._max_latency, latency)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Closed sockets surface as WebSocketDisconnect, RuntimeError or
+            # server-specific errors depending on the ASGI server
+            self._send_failures += 1
+            logger.info("Alerts client dropped after failed send: %s", e or type(e).__name__)
+            self._close(client)
+
+    def _close(self, client: _Client):
+        self.disconnect(client.websocket)
+        task = asyncio.create_task(self._close_socket(client.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def close(self):
+        """Disconnect the backend and stop every sender task (application shutdown)."""
+        await self.backend.stop()
+        senders = [client.sender for client in self._clients.values() if client.sender is not None]
+        self._clients.clear()
+        self._subscriptions = SubscriptionIndex()
+        for sender in senders:
+            sender.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+
+    def stats(self) -> dict:
+        depths = [client.queue.qsize() for client in self._clients.values()]
+        sent = self._sent
+        return {
+            "connections": len(depths),
+            "queue_size": self.queue_size,
+            "laggard_policy": self.laggard_policy,
+            "send_timeout_seconds": self.send_timeout,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "broadcasts": self._broadcasts,
+            "replayed": self._replayed,
+            "filtered": self._filtered,
+            "enqueued": self._enqueued,
+            "sent": sent,
+            "dropped": self._dropped,
+            "laggards_disconnected": self._laggards_disconnected,
+            "send_failures": self._send_failures,
+            "avg_send_latency_ms": round(self._total_latency / sent * 1000, 3) if sent else 0.0,
+            "max_send_latency_ms": round(self._max_latency * 1000, 3),
+            "pubsub": self.backend.stats(),
+            "replay": self.replay.stats(),
+        }
+
 
-manager = ConnectionManager()
+manager = ConnectionManager(
+    queue_size=int(os.getenv("ALERT_WS_QUEUE_SIZE", "100")),
+    laggard_policy=os.getenv("ALERT_WS_LAGGARD_POLICY", "drop_oldest"),
+    send_timeout=float(os.getenv("ALERT_WS_SEND_TIMEOUT_SECONDS", "5")),
+    backend=create_backend(
+        os.getenv("ALERT_PUBSUB_BACKEND", "memory"),
+        url=os.getenv("ALERT_PUBSUB_URL"),
+        channel=os.getenv("ALERT_PUBSUB_CHANNEL", "water-leak:alerts"),
+    ),
+    replay_size=int(os.getenv("ALERT_REPLAY_BUFFER_SIZE", "1000")),
+)
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional: only needed for ALERT_PUBSUB_BACKEND=redis
+    redis_asyncio = None
+
+logger = logging.getLogger("alerts_pubsub")
+
+# deliver(message, serialized_message) fans a published alert out to local clients
+Deliver = Callable[[dict, str], Awaitable[None]]
+
+
+class InProcessBackend:
+    """Delivers published alerts straight to this process's clients."""
+
+    name = "memory"
+    # Alerts only reach the publishing worker's clients
+    shared = False
+
+    def __init__(self):
+        self._deliver: Deliver | None = None
+        self._published = 0
+        self._sequence = 0
+
+    async def next_sequence(self) -> int:
+        self._sequence += 1
+        return self._sequence
+
+    def bind(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, message: dict, text: str):
+        self._published += 1
+        await self._deliver(message, text)
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "shared": self.shared, "published": self._published}
+
+
+class RedisBackend:
+    """
+    Shares alerts between worker processes over a Redis (or any server
+    speaking the Redis pub/sub protocol) channel. Every worker, including the
+    publisher, delivers what it reads from the channel, so each alert reaches
+    every client exactly once. If publishing fails the alert is delivered
+    locally so this worker's clients still get it. Sequence ids come from
+    an INCR counter next to the channel so they are shared by all workers.
+    Requires the optional `redis` package.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, channel: str, reconnect_delay: float = 1.0):
+        if redis_asyncio is None:
+            raise RuntimeError("ALERT_PUBSUB_BACKEND=redis requires the 'redis' package")
+        self.url = url
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._deliver: Deliver | None = None
+        self._client = None
+        self._reader: asyncio.Task | None = None
+        self._published = 0
+        self._received = 0
+        self._publish_failures = 0
+        self._reconnects = 0
+
+    def bind(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def next_sequence(self) -> int | None:
+        """Cluster-wide sequence id, or None when Redis is unreachable."""
+        try:
+            return int(await self._client.incr(f"{self.channel}:seq"))
+        except Exception as e:
+            logger.error("Alert sequence allocation failed: %s", e)
+            return None
+
+    async def start(self):
+        self._client = redis_asyncio.from_url(self.url)
+        self._reader = asyncio.create_task(self._read())
+
+    async def stop(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def publish(self, message: dict, text: str):
+        try:
+            await self._client.publish(self.channel, text)
+            self._published += 1
+        except Exception as e:
+            self._publish_failures += 1
+            logger.error("Alert publish to %s failed, delivering locally: %s", self.channel, e)
+            await self._deliver(message, text)
+
+    async def _read(self):
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    data = item["data"]
+                    text = data.decode("utf-8") if isinstance(data, bytes) else data
+                    self._received += 1
+                    await self._deliver(json.loads(text), text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._reconnects += 1
+                logger.warning("Alert subscription to %s lost, retrying: %s", self.channel, e)
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "shared": self.shared,
+            "channel": self.channel,
+            "subscribed": self._reader is not None and not self._reader.done(),
+            "published": self._published,
+            "received": self._received,
+            "publish_failures": self._publish_failures,
+            "reconnects": self._reconnects,
+        }
+
+
+def create_backend(name: str, url: str | None = None, channel: str = "water-leak:alerts"):
+    """Backend for ALERT_PUBSUB_BACKEND: "memory" (default) or "redis"."""
+    if name == "memory":
+        return InProcessBackend()
+    if name == "redis":
+        return RedisBackend(url or "redis://localhost:6379/0", channel)
+    raise ValueError(f"Unknown alert pub/sub backend {name!r}; expected 'memory' or 'redis'")
@@ -0,0 +1,57 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass(frozen=True)
+class ReplayEntry:
+    seq: int
+    message: dict
+    text: str
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of the last `capacity` delivered alerts, ordered by sequence
+    id. Reading everything after a sequence id walks back from the newest
+    entry, so a resume costs the size of the gap, not of the buffer.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._entries: "deque[ReplayEntry]" = deque(maxlen=capacity)
+        self._last_sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def last_sequence(self) -> int:
+        """Highest sequence id seen (0 before the first alert)."""
+        return self._last_sequence
+
+    @property
+    def oldest_sequence(self) -> int | None:
+        return self._entries[0].seq if self._entries else None
+
+    def append(self, seq: int, message: dict, text: str):
+        self._entries.append(ReplayEntry(seq, message, text))
+        self._last_sequence = max(self._last_sequence, seq)
+
+    def since(self, seq: int) -> List[ReplayEntry]:
+        """Buffered entries with a sequence id above `seq`, oldest first."""
+        newer = []
+        for entry in reversed(self._entries):
+            if entry.seq <= seq:
+                break
+            newer.append(entry)
+        newer.reverse()
+        return newer
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "buffered": len(self._entries),
+            "oldest_seq": self.oldest_sequence,
+            "last_seq": self._last_sequence,
+        }
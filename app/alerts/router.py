@@ -1,25 +1,81 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+import json
+from datetime import datetime
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query, Response
 from sqlalchemy.orm import Session
 from .manager import manager
+from .subscriptions import Subscription
+from app.database.pagination import keyset_page, set_next_cursor
 from app.database.session import get_db
+from app.executors.pool import db_executor
 from app.models.db_models import LeakAlert
 
 router = APIRouter()
 
+def _query_alert_history(db: Session, limit: int, cursor, start, end):
+    return keyset_page(db.query(LeakAlert), LeakAlert, limit, cursor, start, end)
+
 @router.get("/history")
-async def get_alert_history(limit: int = 50, db: Session = Depends(get_db)):
+async def get_alert_history(
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=1000),
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: Session = Depends(get_db),
+):
     """
-    Fetch historical leak alerts from the database.
+    Fetch historical leak alerts from the database, newest first. Pass the
+    X-Next-Cursor response header back as `cursor` for the next page.
     """
-    alerts = db.query(LeakAlert).order_by(LeakAlert.timestamp.desc()).limit(limit).all()
-    return alerts
+    rows, next_cursor = await db_executor.run(_query_alert_history, db, limit, cursor, start, end)
+    set_next_cursor(response, next_cursor)
+    return rows
+
+def _handle_client_message(websocket: WebSocket, text: str):
+    """
+    Apply a subscription message:
+    {"action": "subscribe", "events": [...], "locations": [...], "min_severity": "..."}
+    Omitted filters match everything. Other text (keep-alives) is ignored.
+    """
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(message, dict) or message.get("action") != "subscribe":
+        return
+    try:
+        subscription = Subscription.parse(message.get("events"), message.get("locations"), message.get("min_severity"))
+    except ValueError as e:
+        manager.send_to(websocket, {"event": "SUBSCRIPTION_ERROR", "detail": str(e)})
+        return
+    manager.subscribe(websocket, subscription)
+    manager.send_to(websocket, {"event": "SUBSCRIBED", "subscription": subscription.to_dict()})
 
 @router.websocket("/ws/alerts")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    events: str | None = None,
+    locations: str | None = None,
+    min_severity: str | None = None,
+    since: int | None = None,
+):
+    """
+    Live alert stream. Filters may be given as comma-separated query
+    parameters and changed later by sending a subscribe message. Every alert
+    carries a `seq`; reconnecting with `since=<last seq>` first replays the
+    missed alerts that are still buffered. Alerts sent while the pub/sub
+    backend was unreachable have `seq: null` and are not replayed.
+    """
+    try:
+        subscription = Subscription.parse(events, locations, min_severity)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e)[:120])
+        return
+    await manager.connect(websocket, subscription, since=since)
     try:
         while True:
-            # Keep connection alive
-            await websocket.receive_text()
+            _handle_client_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Hashable, List, Set
+
+# Events broadcast on the alerts WebSocket
+ALERT_EVENTS = ("LEAK_DETECTED", "LEAK_UPDATED", "LEAK_RESOLVED", "WATER_QUALITY_ALERT", "ISSUE_RESOLVED")
+
+# Severity labels used across leak, water-quality and image alerts, by rank.
+# Labels outside this table (e.g. "Resolved") are not subject to a floor.
+SEVERITY_RANK = {"low": 1, "minor": 1, "warning": 2, "moderate": 2, "high": 3, "critical": 4}
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """
+    Alert filter for one WebSocket client. Empty `events` / `locations` match
+    everything; `locations` is compared with a payload's `location` and
+    `sensor_id`; `min_severity` drops alerts ranked below it.
+    """
+    events: FrozenSet[str] = frozenset()
+    locations: FrozenSet[str] = frozenset()
+    min_severity: str | None = None
+
+    @property
+    def floor(self) -> int:
+        return SEVERITY_RANK[self.min_severity.lower()] if self.min_severity else 0
+
+    @classmethod
+    def parse(cls, events=None, locations=None, min_severity=None) -> "Subscription":
+        """Validate client-supplied filter values; raises ValueError."""
+        events = frozenset(_as_list(events, "events"))
+        unknown = events - set(ALERT_EVENTS)
+        if unknown:
+            raise ValueError(f"Unknown events {sorted(unknown)}; expected any of {list(ALERT_EVENTS)}")
+        if min_severity is not None and str(min_severity).lower() not in SEVERITY_RANK:
+            raise ValueError(f"Unknown min_severity {min_severity!r}; expected one of {sorted(SEVERITY_RANK)}")
+        return cls(events=events, locations=frozenset(_as_list(locations, "locations")), min_severity=min_severity)
+
+    def matches(self, message: dict) -> bool:
+        """Whether `message` passes this filter (same rules as `SubscriptionIndex.match`)."""
+        if self.events and message.get("event") not in self.events:
+            return False
+        if self.locations and not any(
+            value is not None and str(value) in self.locations
+            for value in (message.get("location"), message.get("sensor_id"))
+        ):
+            return False
+        rank = SEVERITY_RANK.get(str(message.get("severity") or "").lower())
+        return rank is None or rank >= self.floor
+
+    def to_dict(self) -> dict:
+        return {
+            "events": sorted(self.events),
+            "locations": sorted(self.locations),
+            "min_severity": self.min_severity,
+        }
+
+
+def _as_list(value, name: str) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    if isinstance(value, list) and all(isinstance(part, str) for part in value):
+        return value
+    raise ValueError(f"{name} must be a list of strings or a comma-separated string")
+
+
+class SubscriptionIndex:
+    """
+    Routing table from alert attributes to subscribers.
+
+    Subscribers are indexed by each event type and location they ask for,
+    with wildcard sets for those that filter on neither, and bucketed by
+    severity floor. Matching a message intersects the (wildcard + exact)
+    sets of its event and location, then removes the buckets whose floor is
+    above its severity, so the cost follows the number of matching
+    subscribers rather than the number of connections.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[Hashable, Subscription] = {}
+        self._by_event: Dict[str, Set[Hashable]] = {}
+        self._any_event: Set[Hashable] = set()
+        self._by_location: Dict[str, Set[Hashable]] = {}
+        self._any_location: Set[Hashable] = set()
+        self._by_floor: Dict[int, Set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def get(self, key: Hashable) -> Subscription | None:
+        return self._subscriptions.get(key)
+
+    def add(self, key: Hashable, subscription: Subscription):
+        """Register or replace the subscription of `key`."""
+        self.remove(key)
+        self._subscriptions[key] = subscription
+        for event in subscription.events or [None]:
+            (self._by_event.setdefault(event, set()) if event else self._any_event).add(key)
+        for location in subscription.locations or [None]:
+            (self._by_location.setdefault(location, set()) if location else self._any_location).add(key)
+        self._by_floor.setdefault(subscription.floor, set()).add(key)
+
+    def remove(self, key: Hashable):
+        subscription = self._subscriptions.pop(key, None)
+        if subscription is None:
+            return
+        for event in subscription.events:
+            _discard(self._by_event, event, key)
+        for location in subscription.locations:
+            _discard(self._by_location, location, key)
+        self._any_event.discard(key)
+        self._any_location.discard(key)
+        _discard(self._by_floor, subscription.floor, key)
+
+    def match(self, message: dict) -> Set[Hashable]:
+        """Keys of every subscription that accepts `message`."""
+        by_event = self._any_event | self._by_event.get(message.get("event"), set())
+        if not by_event:
+            return set()
+        by_location = self._any_location.copy()
+        for value in {message.get("location"), message.get("sensor_id")}:
+            if value is not None:
+                by_location |= self._by_location.get(str(value), set())
+        matched = by_event & by_location
+        rank = SEVERITY_RANK.get(str(message.get("severity") or "").lower())
+        if matched and rank is not None:
+            for floor, keys in self._by_floor.items():
+                if floor > rank:
+                    matched -= keys
+        return matched
+
+
+def _discard(index: Dict, value, key: Hashable):
+    keys = index.get(value)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[value]
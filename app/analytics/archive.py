@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import delete, exists, or_, select
+
+from app.analytics import export
+from app.database.session import SessionLocal
+from app.executors.pool import ExecutorSaturatedError, db_executor
+from app.models.db_models import LeakAlert, MaintenanceTicket
+
+try:
+    import pyarrow.dataset as pa_dataset
+except ImportError:  # optional, like the rest of the Arrow support in app.analytics.export
+    pa_dataset = None
+
+logger = logging.getLogger("analytics_archive")
+
+# Rows deleted per statement; keeps SQLite under its bound-parameter limit
+DELETE_CHUNK = 500
+
+
+class ParquetArchive:
+    """
+    Moves aged rows out of the database into date-partitioned Parquet files,
+    `<root>/<table>/date=YYYY-MM-DD/part-<first id>.parquet`.
+
+    Rows older than `after_days` are read `batch_rows` at a time in
+    (timestamp, id) order; each batch is written (atomically, one file per
+    date it spans) and only then deleted, in one short transaction per batch.
+    A file is named after the id of its first row alone. After a crash between
+    writing and deleting, the re-run batch starts at the same row however many
+    rows it picks up (the cutoff has moved on since), so it rewrites the same
+    files, now including the extra rows, instead of archiving rows twice.
+    Leak alerts that are still open or referenced by a maintenance ticket
+    stay in the database.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        after_days: int,
+        tables: List[str] | None = None,
+        batch_rows: int = export.ROW_GROUP_ROWS,
+        interval: float = 3600.0,
+    ):
+        unknown = set(tables or []) - set(export.EXPORT_TABLES)
+        if unknown:
+            raise ValueError(f"Unknown archive tables {sorted(unknown)}; expected any of {sorted(export.EXPORT_TABLES)}")
+        self.root = root
+        self.after_days = after_days
+        self.tables = tables or list(export.EXPORT_TABLES)
+        self.batch_rows = batch_rows
+        self.interval = interval
+        self._running = False
+        self._archived: Dict[str, int] = defaultdict(int)
+        self._files_written = 0
+        self._runs = 0
+        self._last_run_at: float | None = None
+        self._last_run_seconds = 0.0
+        self._last_error: str | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+
+    def table_dir(self, table: str) -> str:
+        return os.path.join(self.root, table)
+
+    @staticmethod
+    def _archivable(model):
+        if model is LeakAlert:
+            return [
+                or_(LeakAlert.incident_status.is_(None), LeakAlert.incident_status != "open"),
+                ~exists().where(MaintenanceTicket.alert_id == LeakAlert.id),
+            ]
+        return []
+
+    def _write_partition(self, table: str, day: str, rows: List[dict], schema) -> str:
+        directory = os.path.join(self.table_dir(table), f"date={day}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{rows[0]['id']:012d}.parquet"
+        path = os.path.join(directory, name)
+        # Dot-prefixed files are skipped by dataset discovery until renamed
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        export.write_parquet(tmp_path, export.record_batches(rows, schema), schema)
+        os.replace(tmp_path, path)
+        return path
+
+    def archive_table(self, table: str, cutoff: datetime) -> int:
+        """Move every archivable row of `table` older than `cutoff`; returns the row count."""
+        export.require_pyarrow()
+        model = export.EXPORT_TABLES[table]
+        columns = export.table_columns(model)
+        schema = export.arrow_schema(model, columns)
+        stmt = (
+            select(*(getattr(model, name) for name in columns))
+            .where(model.timestamp < cutoff, *self._archivable(model))
+            .order_by(model.timestamp, model.id)
+            .limit(self.batch_rows)
+        )
+        moved = 0
+        while True:
+            db = SessionLocal()
+            try:
+                rows = [dict(zip(columns, row)) for row in db.execute(stmt)]
+                if not rows:
+                    return moved
+                by_day: Dict[str, List[dict]] = defaultdict(list)
+                for row in rows:
+                    by_day[row["timestamp"].date().isoformat()].append(row)
+                for day, day_rows in by_day.items():
+                    self._write_partition(table, day, day_rows, schema)
+                    self._files_written += 1
+                ids = [row["id"] for row in rows]
+                for i in range(0, len(ids), DELETE_CHUNK):
+                    db.execute(delete(model).where(model.id.in_(ids[i:i + DELETE_CHUNK])))
+                db.commit()
+            finally:
+                db.close()
+            moved += len(rows)
+            self._archived[table] += len(rows)
+
+    def run_once(self) -> Dict[str, int]:
+        """Archive every configured table once; returns rows moved per table."""
+        started = time.perf_counter()
+        cutoff = datetime.now() - timedelta(days=self.after_days)
+        moved = {}
+        try:
+            for table in self.tables:
+                moved[table] = self.archive_table(table, cutoff)
+            self._last_error = None
+        except Exception as exc:
+            self._last_error = str(exc)
+            raise
+        finally:
+            self._runs += 1
+            self._last_run_at = time.time()
+            self._last_run_seconds = time.perf_counter() - started
+        if any(moved.values()):
+            logger.info("Archived rows older than %s: %s", cutoff.isoformat(), moved)
+        return moved
+
+    async def run(self):
+        """Archive loop, every `interval` seconds while enabled."""
+        if not self.enabled:
+            return
+        self._running = True
+        try:
+            while True:
+                try:
+                    await db_executor.run(self.run_once)
+                except ExecutorSaturatedError as exc:
+                    logger.warning("Archive run deferred: %s", exc)
+                except Exception as exc:
+                    logger.error("Archive run failed: %s", exc)
+                await asyncio.sleep(self.interval)
+        finally:
+            self._running = False
+
+    def dataset(self, table: str):
+        """The archived rows of `table` as a pyarrow dataset, or None if nothing is archived."""
+        export.require_pyarrow()
+        directory = self.table_dir(table)
+        if not os.path.isdir(directory):
+            return None
+        model = export.EXPORT_TABLES[table]
+        partition_schema = export.pa.schema([("date", export.pa.string())])
+        schema = export.arrow_schema(model, export.table_columns(model))
+        return pa_dataset.dataset(
+            directory,
+            format="parquet",
+            schema=export.pa.unify_schemas([schema, partition_schema]),
+            partitioning=pa_dataset.partitioning(partition_schema, flavor="hive"),
+        )
+
+    def scan(
+        self,
+        table: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        columns: List[str] | None = None,
+    ):
+        """Record batches of archived `table` rows in [start, end), pruned by date partition."""
+        dataset = self.dataset(table)
+        if dataset is None:
+            return iter(())
+        conditions = []
+        if start is not None:
+            conditions += [pa_dataset.field("date") >= start.date().isoformat(), pa_dataset.field("timestamp") >= start]
+        if end is not None:
+            conditions += [pa_dataset.field("date") <= end.date().isoformat(), pa_dataset.field("timestamp") < end]
+        condition = None
+        for part in conditions:
+            condition = part if condition is None else condition & part
+        return dataset.to_batches(columns=columns, filter=condition, batch_size=self.batch_rows)
+
+    def iter_rows(
+        self,
+        table: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        columns: List[str] | None = None,
+        iso_timestamps: bool = True,
+    ) -> Iterator[dict]:
+        """Archived rows as dicts, with ISO timestamps by default, like `export.iter_rows`."""
+        columns = columns or export.table_columns(export.EXPORT_TABLES[table])
+        for batch in self.scan(table, start, end, columns):
+            for row in batch.to_pylist():
+                if iso_timestamps:
+                    yield {name: export._value(value) for name, value in row.items()}
+                else:
+                    yield row
+
+    def history_rows(
+        self,
+        table: str,
+        columns: List[str],
+        start: datetime | None = None,
+        iso_timestamps: bool = True,
+    ) -> Iterator[dict]:
+        """
+        Rows of `table` from `start` on wherever they live now: the archived
+        ones first (they are the oldest), then those still in the database.
+        """
+        if export.pa is not None:
+            yield from self.iter_rows(table, start, None, columns, iso_timestamps)
+        yield from export.iter_rows(export.EXPORT_TABLES[table], columns, start, iso_timestamps)
+
+    def arrow_stream(self, table: str, start: datetime | None = None, end: datetime | None = None) -> Iterator[bytes]:
+        model = export.EXPORT_TABLES[table]
+        columns = export.table_columns(model)
+        return export.ipc_stream(self.scan(table, start, end, columns), export.arrow_schema(model, columns))
+
+    def partitions(self, table: str) -> List[str]:
+        directory = self.table_dir(table)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[len("date="):] for name in os.listdir(directory) if name.startswith("date="))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._running,
+            "root": self.root,
+            "after_days": self.after_days,
+            "tables": self.tables,
+            "interval_seconds": self.interval,
+            "archived": dict(self._archived),
+            "files_written": self._files_written,
+            "runs": self._runs,
+            "last_run_at": self._last_run_at,
+            "last_run_seconds": round(self._last_run_seconds, 6),
+            "last_error": self._last_error,
+            "partitions": {table: len(self.partitions(table)) for table in self.tables},
+        }
+
+
+parquet_archive = ParquetArchive(
+    root=os.getenv("ARCHIVE_DIR", "archive"),
+    after_days=int(os.getenv("ARCHIVE_AFTER_DAYS", "0")),
+    tables=[name.strip() for name in os.getenv("ARCHIVE_TABLES", "").split(",") if name.strip()] or None,
+    interval=float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600")),
+)
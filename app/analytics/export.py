@@ -0,0 +1,262 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+
+from app.database.session import SessionLocal
+from app.models.db_models import LeakAlert, SensorReading, WaterQualityReadingRecord
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for Arrow/Parquet exports and the archive
+    pa = None
+    pq = None
+
+# Rows fetched per round trip and bytes buffered before a chunk is sent
+FETCH_ROWS = 2000
+CHUNK_BYTES = 64 * 1024
+
+# Rows per Parquet row group / Arrow record batch
+ROW_GROUP_ROWS = int(os.getenv("EXPORT_ROW_GROUP_ROWS", "50000"))
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Tables available as columnar exports and to the archive
+EXPORT_TABLES = {
+    model.__tablename__: model
+    for model in (SensorReading, WaterQualityReadingRecord, LeakAlert)
+}
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Arrow/Parquet support requires the 'pyarrow' package")
+
+
+def table_columns(model) -> List[str]:
+    return [column.name for column in model.__table__.columns]
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_rows(
+    model,
+    columns: List[str],
+    start: datetime | None = None,
+    iso_timestamps: bool = True,
+) -> Iterator[dict]:
+    """
+    Rows of `model` from `start` on, in timestamp order, fetched `FETCH_ROWS`
+    at a time through a server-side cursor. Opens its own session, since a
+    streaming response outlives the request's dependency-managed one.
+    """
+    stmt = select(*(getattr(model, name) for name in columns)).order_by(model.timestamp, model.id)
+    if start is not None:
+        stmt = stmt.where(model.timestamp >= start)
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=FETCH_ROWS))
+        for row in result:
+            if iso_timestamps:
+                yield {name: _value(value) for name, value in zip(columns, row)}
+            else:
+                yield dict(zip(columns, row))
+    finally:
+        db.close()
+
+
+def _csv_chunks(rows: Iterable[dict], columns: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows: Iterable[dict]) -> Iterator[str]:
+    parts, size = [], 0
+    for row in rows:
+        line = json.dumps(row, separators=(",", ":")) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(parts)
+            parts, size = [], 0
+    yield "".join(parts)
+
+
+def _json_chunks(rows: Iterable[dict], meta: dict) -> Iterator[str]:
+    """`{**meta, "records": [...], "count": n}`, with the count written last."""
+    head = json.dumps(meta, separators=(",", ":"))
+    yield head[:-1] + ("," if meta else "") + '"records":['
+    parts, size, count = [], 0, 0
+    for row in rows:
+        item = ("," if count else "") + json.dumps(row, separators=(",", ":"))
+        parts.append(item)
+        size += len(item)
+        count += 1
+        if size >= CHUNK_BYTES:
+            yield "".join(parts)
+            parts, size = [], 0
+    parts.append(f'],"count":{count}}}')
+    yield "".join(parts)
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode(
+    rows_factory: Callable[[], Iterable[dict]],
+    columns: List[str],
+    fmt: str,
+    compress: bool = False,
+    meta: dict | None = None,
+) -> Iterator[bytes]:
+    """
+    Body of a streaming export: `fmt` is "csv", "ndjson" or "json" (one
+    document, `meta` keys first). Rows are produced lazily by
+    `rows_factory()`, so memory stays flat whatever the row count.
+    """
+    def chunks() -> Iterator[bytes]:
+        rows = rows_factory()
+        if fmt == "csv":
+            text = _csv_chunks(rows, columns)
+        elif fmt == "ndjson":
+            text = _ndjson_chunks(rows)
+        else:
+            text = _json_chunks(rows, meta or {})
+        for chunk in text:
+            if chunk:
+                yield chunk.encode("utf-8")
+
+    return _gzip(chunks()) if compress else chunks()
+
+
+def arrow_schema(model, columns: List[str]):
+    """Arrow schema matching the SQLAlchemy column types of `model`."""
+    require_pyarrow()
+    fields = []
+    for name in columns:
+        column_type = model.__table__.columns[name].type
+        if isinstance(column_type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column_type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column_type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column_type, Float):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def record_batches(rows: Iterable[dict], schema, batch_rows: int = ROW_GROUP_ROWS):
+    """Group row dicts into Arrow record batches of at most `batch_rows` rows."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, batch_rows))
+        if not chunk:
+            return
+        yield pa.RecordBatch.from_pylist(chunk, schema=schema)
+
+
+def write_parquet(path: str, batches, schema) -> int:
+    """Write record batches to `path`, one row group per batch; returns the row count."""
+    written = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            written += batch.num_rows
+        if not written:
+            writer.write_table(schema.empty_table())
+    return written
+
+
+def parquet_file(model, start: datetime | None = None, rows: Iterable[dict] | None = None) -> str:
+    """
+    Export `model` rows from `start` on (or the given `rows`, with every
+    column and datetime values) into a temporary Parquet file and return its
+    path (the caller deletes it). The Parquet footer is only known at the
+    end, so the file is spooled to disk and served afterwards.
+    """
+    require_pyarrow()
+    columns = table_columns(model)
+    schema = arrow_schema(model, columns)
+    if rows is None:
+        rows = iter_rows(model, columns, start, iso_timestamps=False)
+    fd, path = tempfile.mkstemp(prefix=f"{model.__tablename__}_", suffix=".parquet")
+    os.close(fd)
+    try:
+        write_parquet(path, record_batches(rows, schema), schema)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting bytes for a generator to hand out."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self.chunks.append(chunk)
+        return len(chunk)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def ipc_stream(batches, schema) -> Iterator[bytes]:
+    """Record batches as an Arrow IPC stream, yielded as each batch is written."""
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def arrow_stream(model, start: datetime | None = None, rows: Iterable[dict] | None = None) -> Iterator[bytes]:
+    """`model` rows from `start` on (or the given `rows`, as for `parquet_file`) as an Arrow IPC stream."""
+    require_pyarrow()
+    columns = table_columns(model)
+    schema = arrow_schema(model, columns)
+    if rows is None:
+        rows = iter_rows(model, columns, start, iso_timestamps=False)
+    return ipc_stream(record_batches(rows, schema), schema)
@@ -0,0 +1,261 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.models.db_models import SensorReading, SensorRollupDay, SensorRollupHour, SensorRollupMinute
+
+logger = logging.getLogger("analytics_rollups")
+
+METRICS = ("pressure", "flow_rate", "acoustic_signal")
+
+# Simulated baseline flow (L/min); flow above it while a leak mode is active is lost water
+BASELINE_FLOW = 100.0
+# In a major burst the flow may drop below baseline downstream, but the loss at the
+# source is much higher; for the simulation it is measured above 20% of baseline.
+BURST_THRESHOLD_FLOW = BASELINE_FLOW * 0.2
+
+# Coarsest first; each resolution's bucket start and length
+RESOLUTIONS = (
+    (SensorRollupDay, lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0), timedelta(days=1)),
+    (SensorRollupHour, lambda ts: ts.replace(minute=0, second=0, microsecond=0), timedelta(hours=1)),
+    (SensorRollupMinute, lambda ts: ts.replace(second=0, microsecond=0), timedelta(minutes=1)),
+)
+ROLLUP_MODELS = tuple(model for model, _, _ in RESOLUTIONS)
+
+
+def water_loss_liters(flow_rate: float | None, mode: str | None) -> float:
+    """Litres lost during one reading (each reading stands for a 1 s sample)."""
+    if flow_rate is None or mode == "normal":
+        return 0.0
+    threshold = BURST_THRESHOLD_FLOW if mode == "major_burst" else BASELINE_FLOW
+    return max(0.0, flow_rate - threshold) / 60.0
+
+
+def water_loss_expression():
+    """SQL form of `water_loss_liters` over sensor_readings."""
+    threshold = case((SensorReading.mode == "major_burst", BURST_THRESHOLD_FLOW), else_=BASELINE_FLOW)
+    excess = case(
+        (SensorReading.mode == "normal", 0.0),
+        (SensorReading.flow_rate > threshold, SensorReading.flow_rate - threshold),
+        else_=0.0,
+    )
+    return excess / 60.0
+
+
+def _empty_totals() -> dict:
+    totals = {"count": 0, "loss_liters": 0.0}
+    for metric in METRICS:
+        totals.update({f"{metric}_sum": 0.0, f"{metric}_min": None, f"{metric}_max": None, f"{metric}_sumsq": 0.0})
+    return totals
+
+
+def _merge(into: dict, other: dict):
+    """Fold one set of totals into another (None means no values)."""
+    into["count"] += other["count"] or 0
+    into["loss_liters"] += other["loss_liters"] or 0.0
+    for metric in METRICS:
+        into[f"{metric}_sum"] += other[f"{metric}_sum"] or 0.0
+        into[f"{metric}_sumsq"] += other[f"{metric}_sumsq"] or 0.0
+        for bound, pick in (("min", min), ("max", max)):
+            key = f"{metric}_{bound}"
+            if other[key] is not None:
+                into[key] = other[key] if into[key] is None else pick(into[key], other[key])
+
+
+def aggregate_rows(rows: Iterable[dict]) -> Dict[type, Dict[Tuple[datetime, str], dict]]:
+    """Totals of raw reading dicts per rollup model and (bucket, mode)."""
+    buckets: Dict[type, Dict[Tuple[datetime, str], dict]] = {model: {} for model in ROLLUP_MODELS}
+    for row in rows:
+        timestamp = row["timestamp"]
+        if timestamp is None:
+            continue
+        mode = row["mode"]
+        single = {"count": 1, "loss_liters": water_loss_liters(row["flow_rate"], mode)}
+        for metric in METRICS:
+            value = row[metric]
+            single.update({
+                f"{metric}_sum": value or 0.0,
+                f"{metric}_min": value,
+                f"{metric}_max": value,
+                f"{metric}_sumsq": value * value if value is not None else 0.0,
+            })
+        for model, truncate, _ in RESOLUTIONS:
+            key = (truncate(timestamp), mode)
+            totals = buckets[model].get(key)
+            if totals is None:
+                totals = buckets[model][key] = _empty_totals()
+            _merge(totals, single)
+    return buckets
+
+
+def _upsert(db: Session, model, values: List[dict]):
+    """Add `values` into existing buckets, inserting the missing ones."""
+    postgres = db.get_bind().dialect.name == "postgresql"
+    if postgres:
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(model)
+    table, excluded = model.__table__.c, stmt.excluded
+    updates = {"count": table.count + excluded.count, "loss_liters": table.loss_liters + excluded.loss_liters}
+    for metric in METRICS:
+        for suffix in ("sum", "sumsq"):
+            key = f"{metric}_{suffix}"
+            updates[key] = table[key] + excluded[key]
+        for bound in ("min", "max"):
+            key = f"{metric}_{bound}"
+            # Two-argument min()/max() are scalar in SQLite; NULL-safe via coalesce
+            if postgres:
+                pick = func.least if bound == "min" else func.greatest
+            else:
+                pick = getattr(func, bound)
+            updates[key] = pick(func.coalesce(table[key], excluded[key]), func.coalesce(excluded[key], table[key]))
+    db.execute(stmt.on_conflict_do_update(index_elements=["bucket", "mode"], set_=updates), values)
+
+
+def apply_rows(db: Session, rows: Iterable[dict]) -> int:
+    """
+    Fold newly written readings into every rollup table, in the caller's
+    transaction; returns the number of buckets touched.
+    """
+    touched = 0
+    for model, buckets in aggregate_rows(rows).items():
+        if not buckets:
+            continue
+        values = [{"bucket": bucket, "mode": mode, **totals} for (bucket, mode), totals in buckets.items()]
+        _upsert(db, model, values)
+        touched += len(values)
+    return touched
+
+
+def rebuild_if_empty(db: Session, chunk_size: int = 5000) -> int:
+    """
+    Build the rollups from sensor_readings when they hold nothing yet (new
+    tables on an existing database). Runs as one transaction so a partial
+    rebuild is never left behind; returns the number of readings folded in.
+    """
+    if any(db.query(model.id).first() is not None for model in ROLLUP_MODELS):
+        return 0
+
+    columns = [SensorReading.id, SensorReading.timestamp, SensorReading.mode]
+    columns += [getattr(SensorReading, metric) for metric in METRICS]
+    last_id, folded = 0, 0
+    try:
+        while True:
+            rows = [
+                dict(row._mapping)
+                for row in db.execute(
+                    select(*columns).where(SensorReading.id > last_id).order_by(SensorReading.id).limit(chunk_size)
+                )
+            ]
+            if not rows:
+                break
+            apply_rows(db, rows)
+            last_id = rows[-1]["id"]
+            folded += len(rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if folded:
+        logger.info("Rebuilt sensor rollups from %s readings", folded)
+    return folded
+
+
+def _plan(start: datetime | None, end: datetime | None, level: int = 0) -> List[Tuple[type | None, datetime | None, datetime | None]]:
+    """
+    Cover [start, end) with the coarsest buckets that fit entirely inside it:
+    whole days from the day rollup, the remaining whole hours and minutes
+    from the finer rollups, and the sub-minute edges from raw readings
+    (`None` model). Open bounds are left open.
+    """
+    if level == len(RESOLUTIONS):
+        return [(None, start, end)]
+    model, truncate, step = RESOLUTIONS[level]
+    first = None
+    if start is not None:
+        first = truncate(start)
+        if first < start:
+            first += step
+    last = truncate(end if end is not None else datetime.now())
+    if first is not None and first >= last:
+        return _plan(start, end, level + 1)
+
+    segments = []
+    if start is not None and start < first:
+        segments += _plan(start, first, level + 1)
+    segments.append((model, first, last))
+    segments += _plan(last, end, level + 1)
+    return segments
+
+
+def _rollup_query(model, start, end):
+    columns = [
+        model.mode,
+        func.sum(model.count).label("count"),
+        func.sum(model.loss_liters).label("loss_liters"),
+    ]
+    for metric in METRICS:
+        columns += [
+            func.sum(getattr(model, f"{metric}_sum")).label(f"{metric}_sum"),
+            func.min(getattr(model, f"{metric}_min")).label(f"{metric}_min"),
+            func.max(getattr(model, f"{metric}_max")).label(f"{metric}_max"),
+            func.sum(getattr(model, f"{metric}_sumsq")).label(f"{metric}_sumsq"),
+        ]
+    stmt = select(*columns).group_by(model.mode)
+    if start is not None:
+        stmt = stmt.where(model.bucket >= start)
+    if end is not None:
+        stmt = stmt.where(model.bucket < end)
+    return stmt
+
+
+def _raw_query(start, end):
+    columns = [
+        SensorReading.mode,
+        func.count(SensorReading.id).label("count"),
+        func.sum(water_loss_expression()).label("loss_liters"),
+    ]
+    for metric in METRICS:
+        column = getattr(SensorReading, metric)
+        columns += [
+            func.sum(column).label(f"{metric}_sum"),
+            func.min(column).label(f"{metric}_min"),
+            func.max(column).label(f"{metric}_max"),
+            func.sum(column * column).label(f"{metric}_sumsq"),
+        ]
+    stmt = select(*columns).group_by(SensorReading.mode)
+    if start is not None:
+        stmt = stmt.where(SensorReading.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(SensorReading.timestamp < end)
+    return stmt
+
+
+def summarize(db: Session, start: datetime | None = None, end: datetime | None = None) -> Dict[str, dict]:
+    """
+    Sensor totals per mode over [start, end), answered from the coarsest
+    rollups that cover the range plus raw readings for the edges.
+    """
+    per_mode: Dict[str, dict] = {}
+    for model, seg_start, seg_end in _plan(start, end):
+        stmt = _raw_query(seg_start, seg_end) if model is None else _rollup_query(model, seg_start, seg_end)
+        for row in db.execute(stmt):
+            values = dict(row._mapping)
+            mode = values.pop("mode")
+            _merge(per_mode.setdefault(mode, _empty_totals()), values)
+    return per_mode
+
+
+def combine(per_mode: Dict[str, dict], exclude_modes: Iterable[str] = ()) -> dict:
+    """Totals across modes, skipping `exclude_modes`."""
+    totals = _empty_totals()
+    excluded = set(exclude_modes)
+    for mode, values in per_mode.items():
+        if mode not in excluded:
+            _merge(totals, values)
+    return totals
@@ -1,58 +1,51 @@
-from fastapi import APIRouter, Depends, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, select
 from datetime import datetime, timedelta
 import csv
 import io
 import json
+import os
+from app.analytics import export, rollups
+from app.analytics.archive import parquet_archive
+from app.database.retention import retention_engine
 from app.database.session import get_db
+from app.executors.pool import db_executor
+from app.localization.service import network_model
 from app.models.db_models import LeakAlert, SensorReading
 
 router = APIRouter()
 
+# $1.50 per 1000 liters
+COST_PER_LITER = 0.0015
+
+
 def _compute_summary(db: Session) -> dict:
-    # 1. Total incidents in last 30 days
+    """Dashboard totals for the last 30 days; water loss comes from the sensor rollups."""
     last_30_days = datetime.now() - timedelta(days=30)
-    total_alerts = db.query(LeakAlert).filter(LeakAlert.timestamp >= last_30_days).count()
-    
-    # 2. Critical incidents
-    critical_alerts = db.query(LeakAlert).filter(
-        LeakAlert.timestamp >= last_30_days,
-        LeakAlert.severity == "Critical"
-    ).count()
-
-    # 3. Estimated Water Loss (Aggregated)
-    # Calculation logic: sum (flow_rate - baseline) for intervals where mode != normal
-    # For simulation purposes, we'll assume baseline is 100 L/min
-    baseline_flow = 100.0
-    readings = db.query(SensorReading).filter(
-        SensorReading.timestamp >= last_30_days,
-        SensorReading.mode != "normal"
-    ).all()
-    
-    total_loss_liters = 0.0
-    for r in readings:
-        if r.mode == "major_burst":
-            # In major burst, flow rate might drop below 100 downstream, but the loss is likely much higher at the source.
-            # For the sake of a cool demo, let's assume loss is based on the burst flow spike.
-            loss = max(0, r.flow_rate - (baseline_flow * 0.2)) # Adjusted logic for simulation
-        else:
-            loss = max(0, r.flow_rate - baseline_flow)
-        
-        # Each reading represents 1 second in our simulation loop
-        total_loss_liters += (loss / 60) # Conversion from L/min to L/sec
-    
-    # 4. Estimated Financial Loss (e.g., $1.50 per 1000 liters)
-    cost_per_liter = 0.0015
-    financial_loss = total_loss_liters * cost_per_liter
 
+    alerts = db.execute(
+        select(
+            func.sum(case((LeakAlert.timestamp >= last_30_days, 1), else_=0)).label("total"),
+            func.sum(case(
+                (and_(LeakAlert.timestamp >= last_30_days, LeakAlert.severity == "Critical"), 1),
+                else_=0,
+            )).label("critical"),
+            # Severity average covers all history, as before
+            func.avg(LeakAlert.severity_score).label("avg_severity"),
+        )
+    ).one()
+    readings = rollups.combine(rollups.summarize(db, start=last_30_days), exclude_modes=("normal",))
+
+    total_loss_liters = readings["loss_liters"]
     return {
-        "total_incidents": total_alerts,
-        "critical_incidents": critical_alerts,
+        "total_incidents": int(alerts.total or 0),
+        "critical_incidents": int(alerts.critical or 0),
         "total_water_loss_liters": round(total_loss_liters, 2),
-        "total_financial_loss_usd": round(financial_loss, 2),
-        "avg_severity_score": round(float(db.query(func.avg(LeakAlert.severity_score)).scalar() or 0.0), 1),
+        "total_financial_loss_usd": round(total_loss_liters * COST_PER_LITER, 2),
+        "avg_severity_score": round(float(alerts.avg_severity or 0.0), 1),
     }
 
 
@@ -61,7 +54,7 @@ async def get_analytics_summary(db: Session = Depends(get_db)):
     """
     Get top-level metrics for the infrastructure dashboard.
     """
-    return {"summary": _compute_summary(db)}
+    return {"summary": await db_executor.run(_compute_summary, db)}
 
 
 @router.get("/export/monthly-summary")
@@ -69,7 +62,7 @@ async def export_monthly_summary(
     format: str = Query(default="json", pattern="^(json|csv)$"),
     db: Session = Depends(get_db),
 ):
-    summary = _compute_summary(db)
+    summary = await db_executor.run(_compute_summary, db)
     filename_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     if format == "csv":
@@ -96,62 +89,109 @@ async def export_monthly_summary(
     )
 
 
+TELEMETRY_COLUMNS = ["id", "timestamp", "pressure", "flow_rate", "acoustic_signal", "mode"]
+
+
 @router.get("/export/telemetry")
-async def export_telemetry_data(
+def export_telemetry_data(
     days: int = Query(default=30, ge=1, le=365),
-    format: str = Query(default="csv", pattern="^(json|csv)$"),
-    db: Session = Depends(get_db),
+    format: str = Query(default="csv", pattern="^(json|ndjson|csv)$"),
+    gzip: bool = Query(default=False, description="gzip-compress the file as it is streamed"),
 ):
+    """
+    Stream raw telemetry as CSV, NDJSON or JSON. Rows are read through a
+    server-side cursor and written out chunk by chunk, so memory use does not
+    depend on the range. Readings the archive job has moved out of the
+    database are read back from the archive.
+    """
+    _check_retained(SensorReading.__tablename__, days)
     start_date = datetime.now() - timedelta(days=days)
-    rows = (
-        db.query(SensorReading)
-        .filter(SensorReading.timestamp >= start_date)
-        .order_by(SensorReading.timestamp.asc())
-        .all()
+    filename_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"telemetry_{days}d_{filename_ts}.{format}" + (".gz" if gzip else "")
+
+    body = export.encode(
+        lambda: parquet_archive.history_rows(SensorReading.__tablename__, TELEMETRY_COLUMNS, start_date),
+        TELEMETRY_COLUMNS,
+        format,
+        compress=gzip,
+        meta={"days": days},
+    )
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
-    records = [
-        {
-            "id": r.id,
-            "timestamp": r.timestamp.isoformat() if r.timestamp else None,
-            "pressure": r.pressure,
-            "flow_rate": r.flow_rate,
-            "acoustic_signal": r.acoustic_signal,
-            "mode": r.mode,
-        }
-        for r in rows
-    ]
-    filename_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-    if format == "json":
-        content = json.dumps({"records": records, "count": len(records), "days": days}, indent=2)
-        return Response(
-            content=content,
-            media_type="application/json",
-            headers={
-                "Content-Disposition": f"attachment; filename=telemetry_{days}d_{filename_ts}.json"
-            },
+def _export_model(table: str):
+    model = export.EXPORT_TABLES.get(table)
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"Unknown table {table!r}; expected one of {sorted(export.EXPORT_TABLES)}")
+    if export.pa is None:
+        raise HTTPException(status_code=503, detail="Arrow/Parquet exports require the 'pyarrow' package")
+    return model
+
+
+def _check_retained(table: str, days: int):
+    """Reject ranges reaching past what retention has deleted for good."""
+    retained = retention_engine.retained_days(table)
+    if retained is not None and days > retained:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{table} history is kept for {retained} days; request at most {retained} days or enable RETENTION_ARCHIVE",
         )
 
-    buffer = io.StringIO()
-    fieldnames = ["id", "timestamp", "pressure", "flow_rate", "acoustic_signal", "mode"]
-    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(records)
-    content = buffer.getvalue()
-    return Response(
-        content=content,
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=telemetry_{days}d_{filename_ts}.csv"
-        },
+
+@router.get("/export/tables/{table}")
+def export_table(
+    table: str,
+    days: int = Query(default=30, ge=1, le=3650),
+    format: str = Query(default="parquet", pattern="^(parquet|arrow)$"),
+):
+    """
+    Export sensor_readings, water_quality_readings or leak_alerts as Parquet
+    (one row group per chunk read) or as an Arrow IPC stream, including rows
+    already moved to the archive.
+    """
+    model = _export_model(table)
+    _check_retained(table, days)
+    start_date = datetime.now() - timedelta(days=days)
+    rows = parquet_archive.history_rows(table, export.table_columns(model), start_date, iso_timestamps=False)
+    filename = f"{table}_{days}d_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+
+    if format == "arrow":
+        return StreamingResponse(export.arrow_stream(model, rows=rows), media_type=export.MEDIA_TYPES["arrow"], headers=headers)
+
+    path = export.parquet_file(model, rows=rows)
+    return FileResponse(
+        path,
+        media_type=export.MEDIA_TYPES["parquet"],
+        headers=headers,
+        background=BackgroundTask(os.remove, path),
     )
 
-@router.get("/trends")
-async def get_incident_trends(days: int = 7, db: Session = Depends(get_db)):
+
+@router.get("/archive/{table}")
+def query_archive(
+    table: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv|json|arrow)$"),
+):
     """
-    Get alert counts over time for charting.
+    Read rows the archive job has moved out of the database, filtered to
+    [start, end); only the date partitions in range are opened.
     """
+    model = _export_model(table)
+    if format == "arrow":
+        return StreamingResponse(parquet_archive.arrow_stream(table, start, end), media_type=export.MEDIA_TYPES["arrow"])
+    columns = export.table_columns(model)
+    body = export.encode(lambda: parquet_archive.iter_rows(table, start, end), columns, format, meta={"table": table})
+    return StreamingResponse(body, media_type=export.MEDIA_TYPES[format])
+
+
+def _query_incident_trends(db: Session, days: int) -> list[dict]:
     # SQLite-specific date grouping (adjust if using PostgreSQL)
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
@@ -170,41 +210,50 @@ async def get_incident_trends(days: int = 7, db: Session = Depends(get_db)):
         for r in results
     ]
 
-@router.get("/sensor-stats")
-async def get_sensor_stats(db: Session = Depends(get_db)):
+@router.get("/trends")
+async def get_incident_trends(days: int = 7, db: Session = Depends(get_db)):
     """
-    Detailed distribution of sensor values.
+    Get alert counts over time for charting.
     """
-    stats = db.query(
-        func.avg(SensorReading.pressure).label("avg_p"),
-        func.max(SensorReading.pressure).label("max_p"),
-        func.avg(SensorReading.flow_rate).label("avg_f"),
-        func.max(SensorReading.flow_rate).label("max_f")
-    ).first()
-    
+    return await db_executor.run(_query_incident_trends, db, days)
+
+def _query_sensor_stats(db: Session) -> dict:
+    # All history, read from the day rollups plus today's finer buckets
+    totals = rollups.combine(rollups.summarize(db))
+    count = totals["count"]
+
+    def avg(metric):
+        return totals[f"{metric}_sum"] / count if count else 0
+
     return {
-        "pressure": {"avg": round(stats.avg_p or 0, 2), "max": round(stats.max_p or 0, 2)},
-        "flow": {"avg": round(stats.avg_f or 0, 2), "max": round(stats.max_f or 0, 2)}
+        "pressure": {"avg": round(avg("pressure"), 2), "max": round(totals["pressure_max"] or 0, 2)},
+        "flow": {"avg": round(avg("flow_rate"), 2), "max": round(totals["flow_rate_max"] or 0, 2)}
     }
 
-@router.get("/risk-assessment")
-async def get_risk_assessment(db: Session = Depends(get_db)):
+@router.get("/sensor-stats")
+async def get_sensor_stats(db: Session = Depends(get_db)):
     """
-    Calculate a risk score for each network segment based on historical reliability.
+    Detailed distribution of sensor values.
     """
-    # Define segments
-    segments = [("Tank", "A"), ("A", "B"), ("A", "C"), ("C", "D")]
+    return await db_executor.run(_query_sensor_stats, db)
+
+def _compute_risk_assessment(db: Session) -> dict:
+    # Alerts store the localized segment as "<u>-<v>"; count them once per location
+    location_counts = dict(
+        db.query(LeakAlert.location, func.count(LeakAlert.id))
+        .filter(LeakAlert.location.isnot(None))
+        .group_by(LeakAlert.location)
+        .all()
+    )
     risk_data = {}
 
-    for u, v in segments:
+    for u, v in network_model.graph.edges():
         segment_id = f"{u}-{v}"
         
         # Count historical alerts for this specifically localized segment
-        # Filter by location string in SQLite
-        alert_count = db.query(LeakAlert).filter(
-            LeakAlert.location.contains(u),
-            LeakAlert.location.contains(v)
-        ).count()
+        alert_count = location_counts.get(segment_id, 0)
+        if u != v:
+            alert_count += location_counts.get(f"{v}-{u}", 0)
 
         # Risk Score = (Count * 25) + (Base Risk)
         # In real world, we'd look at pipe age, material, etc.
@@ -221,3 +270,10 @@ async def get_risk_assessment(db: Session = Depends(get_db)):
         }
 
     return risk_data
+
+@router.get("/risk-assessment")
+async def get_risk_assessment(db: Session = Depends(get_db)):
+    """
+    Calculate a risk score for each network segment based on historical reliability.
+    """
+    return await db_executor.run(_compute_risk_assessment, db)
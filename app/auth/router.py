@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.database.session import get_db
+from app.executors.pool import db_executor
 from app.models.db_models import User
 from app.auth.service import (
     authenticate_user, 
@@ -24,8 +25,7 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
-@router.post("/register", response_model=Token)
-async def register(user_in: UserCreate, db: Session = Depends(get_db)):
+def _register_user(db: Session, user_in: UserCreate) -> User:
     # Check if user exists
     user = db.query(User).filter(
         (User.username == user_in.username) | (User.email == user_in.email)
@@ -42,6 +42,11 @@ async def register(user_in: UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    return new_user
+
+@router.post("/register", response_model=Token)
+async def register(user_in: UserCreate, db: Session = Depends(get_db)):
+    new_user = await db_executor.run(_register_user, db, user_in)
     
     access_token = create_access_token(
         data={"sub": new_user.username},
@@ -49,10 +54,16 @@ async def register(user_in: UserCreate, db: Session = Depends(get_db)):
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+def _verify_login(db: Session, username: str, password: str) -> User | None:
+    user = db.query(User).filter(User.username == username).first()
+    if not user or not verify_password(password, user.hashed_password):
+        return None
+    return user
+
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await db_executor.run(_verify_login, db, form_data.username, form_data.password)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
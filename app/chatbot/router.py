@@ -4,11 +4,12 @@ from sqlalchemy.orm import Session
 from app.chatbot.models import ChatMessageRequest, ChatMessageResponse
 from app.chatbot.service import ops_chatbot_service
 from app.database.session import get_db
+from app.executors.pool import db_executor
 
 router = APIRouter()
 
 
 @router.post("/message", response_model=ChatMessageResponse)
 async def chat_message(payload: ChatMessageRequest, db: Session = Depends(get_db)):
-    return ops_chatbot_service.respond(payload.message, db)
+    return await db_executor.run(ops_chatbot_service.respond, payload.message, db)
 
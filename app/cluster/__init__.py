@@ -0,0 +1 @@
+"""Coordination between API worker processes."""
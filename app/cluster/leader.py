@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("leader_election")
+
+
+class LeaderElection:
+    """
+    Elects one leader among the worker processes sharing `lock_path`.
+
+    The leader holds an exclusive, non-blocking OS lock on the file (flock,
+    or msvcrt.locking on Windows) for as long as it lives. The OS releases
+    the lock when the process exits, however it exits, so a follower
+    retrying every `retry_interval` seconds takes over from a dead leader.
+    """
+
+    def __init__(self, lock_path: str, retry_interval: float = 5.0):
+        self.lock_path = lock_path
+        self.retry_interval = retry_interval
+        self._fd: int | None = None
+        self._elected_at: float | None = None
+        self._attempts = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock if it is free; returns whether this process is the leader."""
+        if self._fd is not None:
+            return True
+        self._attempts += 1
+        directory = os.path.dirname(self.lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        # Record the holder for operators; the lock itself is what counts
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        self._elected_at = time.time()
+        logger.info("Process %d elected leader (%s)", os.getpid(), self.lock_path)
+        return True
+
+    async def wait_until_leader(self):
+        while not self.try_acquire():
+            await asyncio.sleep(self.retry_interval)
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+            self._elected_at = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "lock_path": self.lock_path,
+            "is_leader": self.is_leader,
+            "elected_at": self._elected_at,
+            "attempts": self._attempts,
+            "retry_interval_seconds": self.retry_interval,
+        }
+
+
+leader_election = LeaderElection(
+    lock_path=os.getenv("LEADER_LOCK_PATH", "water_leak.leader.lock"),
+    retry_interval=float(os.getenv("LEADER_RETRY_INTERVAL_SECONDS", "5")),
+)
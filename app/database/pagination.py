@@ -0,0 +1,73 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+# Response header carrying the cursor of the next (older) page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque cursor for the position just after (older than) the given row."""
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of `encode_cursor`; raises ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def keyset_page(
+    query: Query,
+    model,
+    limit: int,
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    time_column: str = "timestamp",
+) -> Tuple[List, str | None]:
+    """
+    One page of `query`, newest first, ordered by (`time_column`, id).
+
+    Instead of OFFSET, the cursor holds the (time, id) of the last row
+    returned and the next page starts strictly after it, so every page is an
+    index range scan over the composite index on (`time_column`, id),
+    however deep. `start` (inclusive) and `end` (exclusive) bound the time
+    range. Returns the rows and the cursor of the next page, or None on the
+    last page. Raises HTTPException(400) for a malformed cursor.
+    """
+    column = getattr(model, time_column)
+    if cursor is not None:
+        try:
+            after_time, after_id = decode_cursor(cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        query = query.filter(or_(column < after_time, and_(column == after_time, model.id < after_id)))
+    if start is not None:
+        query = query.filter(column >= start)
+    if end is not None:
+        query = query.filter(column < end)
+
+    rows = query.order_by(column.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    last_time = getattr(last, time_column)
+    # Rows without a time sort last and cannot be resumed from
+    return rows, encode_cursor(last_time, last.id) if last_time is not None else None
+
+
+def set_next_cursor(response: Response, next_cursor: str | None):
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
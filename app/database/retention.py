@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import delete, select
+
+from app.analytics.archive import parquet_archive
+from app.analytics.export import EXPORT_TABLES
+from app.database.session import SessionLocal
+from app.executors.pool import ExecutorSaturatedError, db_executor
+from app.models.db_models import (
+    SensorReading,
+    SensorRollupDay,
+    SensorRollupHour,
+    SensorRollupMinute,
+    WaterQualityReadingRecord,
+)
+
+logger = logging.getLogger("retention")
+
+
+@dataclass
+class RetentionPolicy:
+    """Keep `keep_days` of `model` by `time_column`; 0 keeps everything."""
+    model: type
+    keep_days: int
+    time_column: str = "timestamp"
+    # Move rows to the Parquet archive instead of deleting them outright
+    archive: bool = False
+
+    @property
+    def table(self) -> str:
+        return self.model.__tablename__
+
+
+@dataclass
+class _TableStats:
+    pruned: int = 0
+    archived: int = 0
+    batches: int = 0
+    last_cutoff: str | None = None
+    last_error: str | None = None
+    max_batch_seconds: float = 0.0
+    errors: int = 0
+
+
+class RetentionEngine:
+    """
+    Deletes rows older than each policy's horizon in batches of `batch_size`,
+    each in its own short transaction with a `pause` between batches, so
+    writers (the telemetry flush in particular) are never locked out for
+    long. Tables with `archive` set are moved to the Parquet archive first
+    (which also works batch by batch).
+
+    Raw readings are meant to be kept for fewer days than the rollups that
+    summarize them: the default keeps 35 days of raw rows and minute
+    rollups (the dashboard summary covers 30), a year of hourly rollups and
+    the daily rollups forever. Water-quality readings have no rollups, so
+    they are kept unless a horizon is configured for them.
+    """
+
+    def __init__(
+        self,
+        policies: List[RetentionPolicy],
+        batch_size: int = 1000,
+        pause: float = 0.05,
+        interval: float = 3600.0,
+    ):
+        for policy in policies:
+            if policy.archive and policy.table not in EXPORT_TABLES:
+                raise ValueError(f"Table {policy.table!r} cannot be archived")
+        self.policies = policies
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self._stats: Dict[str, _TableStats] = {policy.table: _TableStats() for policy in policies}
+        self._running = False
+        self._runs = 0
+        self._last_run_at: float | None = None
+        self._last_run_seconds = 0.0
+
+    def retained_days(self, table: str) -> int | None:
+        """
+        Days of `table` history still readable from the database or the
+        archive, or None when nothing is dropped for good.
+        """
+        policy = next((policy for policy in self.policies if policy.table == table), None)
+        if policy is None or policy.keep_days <= 0 or policy.archive:
+            return None
+        # Rows the archive job moves out before their horizon are never deleted here
+        if parquet_archive.enabled and table in parquet_archive.tables and parquet_archive.after_days <= policy.keep_days:
+            return None
+        return policy.keep_days
+
+    def cutoff(self, policy: RetentionPolicy) -> datetime:
+        return datetime.now() - timedelta(days=policy.keep_days)
+
+    def prune_batch(self, policy: RetentionPolicy, cutoff: datetime) -> int:
+        """Delete up to `batch_size` of the oldest expired rows; returns how many."""
+        model = policy.model
+        column = getattr(model, policy.time_column)
+        stats = self._stats[policy.table]
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            ids = db.execute(
+                select(model.id).where(column < cutoff).order_by(column, model.id).limit(self.batch_size)
+            ).scalars().all()
+            if ids:
+                db.execute(delete(model).where(model.id.in_(ids)))
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        if ids:
+            stats.pruned += len(ids)
+            stats.batches += 1
+            stats.max_batch_seconds = max(stats.max_batch_seconds, time.perf_counter() - started)
+        return len(ids)
+
+    def _archive(self, policy: RetentionPolicy, cutoff: datetime) -> int:
+        moved = parquet_archive.archive_table(policy.table, cutoff)
+        self._stats[policy.table].archived += moved
+        return moved
+
+    async def _apply(self, policy: RetentionPolicy):
+        cutoff = self.cutoff(policy)
+        stats = self._stats[policy.table]
+        stats.last_cutoff = cutoff.isoformat()
+        try:
+            if policy.archive:
+                await db_executor.run(self._archive, policy, cutoff)
+            # One executor job per batch, so other database work interleaves
+            while await db_executor.run(self.prune_batch, policy, cutoff) >= self.batch_size:
+                await asyncio.sleep(self.pause)
+            stats.last_error = None
+        except ExecutorSaturatedError as exc:
+            logger.warning("Retention of %s deferred: %s", policy.table, exc)
+        except Exception as exc:
+            stats.errors += 1
+            stats.last_error = str(exc)
+            logger.error("Retention of %s failed: %s", policy.table, exc)
+
+    async def run_once(self):
+        """Apply every policy once."""
+        started = time.perf_counter()
+        for policy in self.policies:
+            if policy.keep_days > 0:
+                await self._apply(policy)
+        self._runs += 1
+        self._last_run_at = time.time()
+        self._last_run_seconds = time.perf_counter() - started
+
+    async def run(self):
+        """Retention loop, every `interval` seconds."""
+        if not any(policy.keep_days > 0 for policy in self.policies):
+            return
+        self._running = True
+        try:
+            while True:
+                await self.run_once()
+                await asyncio.sleep(self.interval)
+        finally:
+            self._running = False
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "batch_size": self.batch_size,
+            "pause_seconds": self.pause,
+            "interval_seconds": self.interval,
+            "runs": self._runs,
+            "last_run_at": self._last_run_at,
+            "last_run_seconds": round(self._last_run_seconds, 6),
+            "tables": {
+                policy.table: {
+                    "keep_days": policy.keep_days,
+                    "archive": policy.archive,
+                    **asdict(self._stats[policy.table]),
+                    "max_batch_seconds": round(self._stats[policy.table].max_batch_seconds, 6),
+                }
+                for policy in self.policies
+            },
+            "rows_pruned": sum(stats.pruned for stats in self._stats.values()),
+            "rows_archived": sum(stats.archived for stats in self._stats.values()),
+        }
+
+
+_archive_raw = os.getenv("RETENTION_ARCHIVE", "false").lower() in ("1", "true", "yes")
+
+retention_engine = RetentionEngine(
+    policies=[
+        RetentionPolicy(SensorReading, int(os.getenv("RETENTION_SENSOR_READINGS_DAYS", "35")), archive=_archive_raw),
+        RetentionPolicy(
+            WaterQualityReadingRecord,
+            int(os.getenv("RETENTION_WATER_QUALITY_DAYS", "0")),
+            archive=_archive_raw,
+        ),
+        RetentionPolicy(SensorRollupMinute, int(os.getenv("RETENTION_ROLLUP_MINUTE_DAYS", "35")), time_column="bucket"),
+        RetentionPolicy(SensorRollupHour, int(os.getenv("RETENTION_ROLLUP_HOUR_DAYS", "365")), time_column="bucket"),
+        RetentionPolicy(SensorRollupDay, int(os.getenv("RETENTION_ROLLUP_DAY_DAYS", "0")), time_column="bucket"),
+    ],
+    batch_size=int(os.getenv("RETENTION_BATCH_SIZE", "1000")),
+    pause=float(os.getenv("RETENTION_PAUSE_SECONDS", "0.05")),
+    interval=float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600")),
+)
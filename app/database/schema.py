@@ -0,0 +1,27 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from app.database.session import Base
+
+
+def ensure_schema(engine: Engine):
+    """
+    Create missing tables, then add columns and indexes that were introduced
+    after an existing database file was created (`create_all` alone never
+    alters tables that already exist).
+    """
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
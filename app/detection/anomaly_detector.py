@@ -1,59 +1,117 @@
-import pandas as pd
+import logging
 import numpy as np
 from sklearn.ensemble import IsolationForest
 from typing import List, Tuple
 from .models import FeatureVector, DetectionResult
+from .fleet import FEATURE_COLUMNS
+from .model_registry import ModelRegistry, model_registry
 from datetime import datetime
 
+logger = logging.getLogger("anomaly_detector")
+
 class AnomalyDetector:
-    def __init__(self):
-        self.model = IsolationForest(contamination=0.05, random_state=42)
-        self.is_trained = False
-        
-    def train(self, historical_data: List[FeatureVector]):
+    def __init__(self, registry: ModelRegistry | None = None):
+        self.registry = registry
+        # The fitted model and its metadata are swapped as one tuple so a
+        # concurrent predict_batch always sees a consistent pair.
+        self._active: tuple[IsolationForest, dict] | None = None
+
+    @staticmethod
+    def _new_model() -> IsolationForest:
+        return IsolationForest(contamination=0.05, random_state=42)
+
+    @property
+    def model(self) -> IsolationForest | None:
+        return self._active[0] if self._active else None
+
+    @property
+    def is_trained(self) -> bool:
+        return self._active is not None
+
+    @property
+    def model_info(self) -> dict | None:
+        return dict(self._active[1]) if self._active else None
+
+    def train(self, historical_data: List[FeatureVector], persist: bool = True) -> dict | None:
         """
         Train the Isolation Forest model on normal historical data.
+
+        A fresh forest is fitted off to the side and swapped in only once
+        fitting is complete, so detections running meanwhile keep scoring
+        against the previous model. The new model is then saved to the
+        registry as the active version.
         """
         if not historical_data:
-            return
-        
-        df = self._prepare_data(historical_data)
-        self.model.fit(df)
-        self.is_trained = True
-        
+            return None
+
+        model = self._new_model()
+        model.fit(self.to_matrix(historical_data))
+        metadata = {
+            "version": None,
+            "trained_at": datetime.now().isoformat(),
+            "training_samples": len(historical_data),
+        }
+        if persist and self.registry is not None:
+            try:
+                metadata = self.registry.save(model, len(historical_data))
+            except OSError as e:
+                logger.error("Failed to persist trained model: %s", e)
+        self._active = (model, metadata)
+        return metadata
+
+    def load(self, version: int | None = None) -> dict | None:
+        """
+        Hot-swap to a stored model version (default: the registry's active one).
+        Returns the loaded metadata, or None when nothing is stored.
+        """
+        if self.registry is None:
+            return None
+        loaded = self.registry.load(version)
+        if loaded is None:
+            return None
+        model, metadata = loaded
+        if version is not None:
+            self.registry.set_active(version)
+        self._active = (model, metadata)
+        return metadata
+
     def predict(self, features: FeatureVector) -> Tuple[bool, float]:
         """
         Predict if the given feature vector is an anomaly.
         Returns: (is_anomaly, anomaly_score)
         """
-        if not self.is_trained:
+        is_anomaly, score = self.predict_batch(self.to_matrix([features]))
+        return bool(is_anomaly[0]), float(score[0])
+
+    def predict_batch(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score an (N, 5) feature matrix (columns in FEATURE_COLUMNS order).
+        Returns: (is_anomaly, anomaly_score) arrays of length N.
+
+        Both outputs come from a single `score_samples` traversal of the forest:
+        `decision_function` is `score_samples - offset_` and `predict` labels
+        rows with a negative decision value as anomalies.
+        """
+        n = matrix.shape[0]
+        active = self._active
+        if active is None or n == 0:
             # If not trained, we can't make reliable predictions
-            # In a real app, we'd load a pre-trained model
-            return False, 0.0
-            
-        df = self._prepare_data([features])
-        prediction = self.model.predict(df) # -1 for anomaly, 1 for normal
-        score = self.model.decision_function(df) # Lower is more anomalous
-        
-        is_anomaly = True if prediction[0] == -1 else False
+            return np.zeros(n, dtype=bool), np.zeros(n, dtype=np.float64)
+
+        model = active[0]
+        decision = model.score_samples(matrix) - model.offset_ # Lower is more anomalous
+        is_anomaly = decision < 0
         # Normalize score for easier consumption (0 to 1, where 1 is highly anomalous)
-        # Decision function returns values where negative is anomalous.
-        normalized_score = float(abs(min(0, score[0])) * 5) # Heuristic normalization
-        
-        return is_anomaly, min(1.0, normalized_score)
-
-    def _prepare_data(self, data: List[FeatureVector]) -> pd.DataFrame:
-        """Convert list of FeatureVector to pandas DataFrame for sklearn."""
-        records = []
-        for f in data:
-            records.append({
-                "avg_pressure": f.avg_pressure,
-                "pressure_drop_rate": f.pressure_drop_rate,
-                "avg_flow": f.avg_flow,
-                "flow_std_dev": f.flow_std_dev,
-                "acoustic_peak": f.acoustic_peak
-            })
-        return pd.DataFrame(records)
+        normalized = np.minimum(1.0, np.abs(np.minimum(0.0, decision)) * 5) # Heuristic normalization
+        return is_anomaly, normalized
+
+    @staticmethod
+    def to_matrix(data: List[FeatureVector]) -> np.ndarray:
+        """Convert list of FeatureVector to an (N, 5) float64 matrix for sklearn."""
+        return np.array(
+            [[getattr(f, column) for column in FEATURE_COLUMNS] for f in data],
+            dtype=np.float64,
+        ).reshape(len(data), len(FEATURE_COLUMNS))
 
 # Global detector instance
-detector = AnomalyDetector()
+detector = AnomalyDetector(registry=model_registry)
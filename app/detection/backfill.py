@@ -0,0 +1,380 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import and_, func, insert, or_, select
+
+from app.database.session import SessionLocal
+from app.detection.anomaly_detector import detector
+from app.detection.fleet import to_datetime
+from app.detection.scoring import SeverityScorer
+from app.models.db_models import BackfillCheckpoint, LeakAlert, SensorReading
+from app.simulation.models import DEFAULT_SENSOR_ID
+
+logger = logging.getLogger("detection_backfill")
+
+# Readings stored before per-sensor ids existed belong to the default sensor
+_SENSOR_ID = func.coalesce(SensorReading.sensor_id, DEFAULT_SENSOR_ID)
+
+
+def window_features(values: np.ndarray) -> np.ndarray:
+    """
+    Features of full windows given as a (N, 3, window) array of
+    pressure/flow/acoustic samples, returned as an (N, 5) matrix in
+    FEATURE_COLUMNS order with the same rounding as the live extractor.
+    """
+    window = values.shape[2]
+    pressure, flow, acoustic = values[:, 0, :], values[:, 1, :], values[:, 2, :]
+    if window > 1:
+        pressure_drop_rate = (pressure[:, 0] - pressure[:, -1]) / window
+        flow_std_dev = flow.std(axis=1, ddof=1)
+    else:
+        pressure_drop_rate = np.zeros(len(values))
+        flow_std_dev = np.zeros(len(values))
+    return np.column_stack([
+        np.round(pressure.mean(axis=1), 3),
+        np.round(pressure_drop_rate, 4),
+        np.round(flow.mean(axis=1), 2),
+        np.round(flow_std_dev, 3),
+        np.round(acoustic.max(axis=1), 2),
+    ])
+
+
+@dataclass
+class _SensorState:
+    """Samples carried between chunks so windows can span chunk boundaries."""
+    values: np.ndarray      # (<= window - 1, 3)
+    timestamps: np.ndarray  # (<= window - 1,) datetime64[us]
+    seen: int               # readings of this sensor consumed so far
+
+
+class BackfillRunner:
+    """
+    Runs the anomaly detector over readings already stored in `sensor_readings`.
+
+    Rows are read in (timestamp, id) order one keyset-bounded chunk at a time,
+    so memory stays proportional to `chunk_size` however large the table is.
+    Each chunk is split per sensor, joined to the tail of that sensor's
+    previous chunk, turned into sliding windows with NumPy stride tricks and
+    scored with one model call. Leak windows are bulk-inserted as `LeakAlert`
+    rows in the same transaction that advances the job's checkpoint, so an
+    interrupted job resumes exactly where its last committed chunk ended.
+    """
+
+    def __init__(self, chunk_size: int = 20000):
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._progress: dict[str, dict] = {}
+        self._cancelled: set[str] = set()
+
+    def progress(self, job_name: str) -> dict | None:
+        """In-memory progress of a job run by this process, else its stored checkpoint."""
+        with self._lock:
+            if job_name in self._progress:
+                return dict(self._progress[job_name])
+        db = SessionLocal()
+        try:
+            checkpoint = db.query(BackfillCheckpoint).filter(BackfillCheckpoint.job_name == job_name).first()
+            return self._checkpoint_dict(checkpoint) if checkpoint else None
+        finally:
+            db.close()
+
+    def is_running(self, job_name: str) -> bool:
+        with self._lock:
+            return self._progress.get(job_name, {}).get("status") == "running"
+
+    def cancel(self, job_name: str) -> bool:
+        with self._lock:
+            if self._progress.get(job_name, {}).get("status") != "running":
+                return False
+            self._cancelled.add(job_name)
+            return True
+
+    def run(
+        self,
+        job_name: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        window_size: int = 60,
+        step: int = 1,
+        resume: bool = True,
+    ) -> dict:
+        """
+        Run (or resume) a backfill job to completion and return its final progress.
+        A resumed job keeps the range, window size and step it was started with.
+        """
+        if not detector.is_trained:
+            raise RuntimeError("Anomaly detector is not trained")
+        if window_size < 1 or step < 1:
+            raise ValueError("window_size and step must be positive")
+
+        db = SessionLocal()
+        try:
+            checkpoint = db.query(BackfillCheckpoint).filter(BackfillCheckpoint.job_name == job_name).first()
+            if checkpoint is not None and not resume:
+                db.delete(checkpoint)
+                db.flush()
+                checkpoint = None
+            if checkpoint is None:
+                checkpoint = BackfillCheckpoint(
+                    job_name=job_name,
+                    range_start=start,
+                    range_end=end,
+                    window_size=window_size,
+                    step=step,
+                    rows_processed=0,
+                    windows_scored=0,
+                    alerts_written=0,
+                )
+                db.add(checkpoint)
+            elif checkpoint.status == "completed":
+                return self._checkpoint_dict(checkpoint)
+            checkpoint.status = "running"
+            checkpoint.error = None
+            db.commit()
+
+            progress = self._checkpoint_dict(checkpoint)
+            progress["total_rows"] = db.query(func.count(SensorReading.id)).filter(*self._range_filters(checkpoint)).scalar()
+            progress["started_at"] = datetime.now().isoformat()
+            progress["rows_per_second"] = 0.0
+            with self._lock:
+                self._progress[job_name] = progress
+                self._cancelled.discard(job_name)
+
+            try:
+                self._run_chunks(db, checkpoint)
+            except Exception as e:
+                db.rollback()
+                checkpoint.status = "failed"
+                checkpoint.error = str(e)
+                db.commit()
+                logger.error("Backfill %s failed: %s", job_name, e)
+            else:
+                with self._lock:
+                    cancelled = job_name in self._cancelled
+                    self._cancelled.discard(job_name)
+                checkpoint.status = "cancelled" if cancelled else "completed"
+                db.commit()
+                logger.info(
+                    "Backfill %s %s: %s rows, %s windows, %s alerts",
+                    job_name, checkpoint.status, checkpoint.rows_processed,
+                    checkpoint.windows_scored, checkpoint.alerts_written,
+                )
+            return self._update_progress(checkpoint)
+        finally:
+            db.close()
+
+    def _run_chunks(self, db, checkpoint: BackfillCheckpoint):
+        window, step = checkpoint.window_size, checkpoint.step
+        states = self._restore_states(db, checkpoint)
+        started = time.perf_counter()
+        rows_this_run = 0
+
+        while True:
+            with self._lock:
+                if checkpoint.job_name in self._cancelled:
+                    return
+            query = (
+                select(
+                    SensorReading.id,
+                    SensorReading.timestamp,
+                    SensorReading.pressure,
+                    SensorReading.flow_rate,
+                    SensorReading.acoustic_signal,
+                    _SENSOR_ID,
+                )
+                .where(*self._range_filters(checkpoint))
+                .order_by(SensorReading.timestamp, SensorReading.id)
+                .limit(self.chunk_size)
+            )
+            if checkpoint.last_reading_id is not None:
+                query = query.where(self._after(checkpoint.last_timestamp, checkpoint.last_reading_id))
+            rows = db.execute(query).all()
+            if not rows:
+                return
+
+            alerts, windows_scored = self._score_chunk(rows, states, window, step, checkpoint.job_name)
+            if alerts:
+                db.execute(insert(LeakAlert), alerts)
+            checkpoint.last_timestamp = rows[-1][1]
+            checkpoint.last_reading_id = rows[-1][0]
+            checkpoint.rows_processed += len(rows)
+            checkpoint.windows_scored += windows_scored
+            checkpoint.alerts_written += len(alerts)
+            db.commit()
+
+            rows_this_run += len(rows)
+            elapsed = time.perf_counter() - started
+            progress = self._update_progress(checkpoint, rows_per_second=rows_this_run / elapsed if elapsed else 0.0)
+            logger.info(
+                "Backfill %s: %s/%s rows, %s alerts",
+                checkpoint.job_name, progress["rows_processed"], progress.get("total_rows"), progress["alerts_written"],
+            )
+
+    def _score_chunk(self, rows, states: dict[str, _SensorState], window: int, step: int, job_name: str):
+        ids, timestamps, pressure, flow, acoustic, sensor_ids = zip(*rows)
+        values = np.column_stack([
+            np.array(pressure, dtype=np.float64),
+            np.array(flow, dtype=np.float64),
+            np.array(acoustic, dtype=np.float64),
+        ])
+        stamps = np.array(timestamps, dtype="datetime64[us]")
+        sensors = np.array(sensor_ids, dtype=object)
+
+        # Incomplete rows cannot be scored; skip them rather than poison a window
+        complete = ~np.isnan(values).any(axis=1)
+        values, stamps, sensors = values[complete], stamps[complete], sensors[complete]
+        if not len(values):
+            return [], 0
+
+        unique_ids, inverse = np.unique(sensors, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")  # keeps timestamp order within a sensor
+        bounds = np.cumsum(np.bincount(inverse, minlength=len(unique_ids)))
+
+        matrices, starts, ends, owners = [], [], [], []
+        begin = 0
+        for sensor_index, sensor_id in enumerate(unique_ids):
+            rows_idx = order[begin:bounds[sensor_index]]
+            begin = bounds[sensor_index]
+
+            state = states.get(sensor_id)
+            if state is None:
+                state = _SensorState(np.empty((0, 3)), np.empty(0, dtype="datetime64[us]"), 0)
+            series = np.concatenate([state.values, values[rows_idx]])
+            series_ts = np.concatenate([state.timestamps, stamps[rows_idx]])
+            first_global = state.seen - len(state.values)
+
+            if len(series) >= window:
+                # Window k ends at series index k + window - 1; score every
+                # `step`-th window counted from the sensor's first full window.
+                end_global = first_global + np.arange(len(series) - window + 1) + window - 1
+                selected = np.flatnonzero((end_global - (window - 1)) % step == 0)
+                if len(selected):
+                    windows = sliding_window_view(series, window, axis=0)[selected]
+                    matrices.append(window_features(windows))
+                    starts.append(series_ts[selected])
+                    ends.append(series_ts[selected + window - 1])
+                    owners.extend([sensor_id] * len(selected))
+
+            keep = window - 1
+            states[sensor_id] = _SensorState(
+                series[len(series) - keep:] if keep else series[:0],
+                series_ts[len(series_ts) - keep:] if keep else series_ts[:0],
+                state.seen + len(rows_idx),
+            )
+
+        if not matrices:
+            return [], 0
+
+        matrix = np.vstack(matrices)
+        window_start = np.concatenate(starts)
+        window_end = np.concatenate(ends)
+        is_anomaly, confidence = detector.predict_batch(matrix)
+        severity_scores, severity_labels = SeverityScorer.calculate_batch(matrix)
+
+        alerts = []
+        for i in np.flatnonzero(is_anomaly):
+            started_at, ended_at = to_datetime(window_start[i]), to_datetime(window_end[i])
+            alerts.append({
+                "timestamp": ended_at,
+                "is_leak": True,
+                "confidence": float(confidence[i]),
+                "severity_score": float(severity_scores[i]),
+                "severity": str(severity_labels[i]),
+                "location": None,
+                "analysis": f"Historical backfill '{job_name}': anomalous {window}-sample window {started_at.isoformat()} to {ended_at.isoformat()}.",
+                "avg_pressure": float(matrix[i, 0]),
+                "avg_flow": float(matrix[i, 2]),
+                "acoustic_peak": float(matrix[i, 4]),
+                "sensor_id": owners[i],
+            })
+        return alerts, len(matrix)
+
+    def _restore_states(self, db, checkpoint: BackfillCheckpoint) -> dict[str, _SensorState]:
+        """Rebuild per-sensor tails and counters from rows before the checkpoint."""
+        if checkpoint.last_reading_id is None:
+            return {}
+        consumed = [
+            *self._range_filters(checkpoint),
+            ~self._after(checkpoint.last_timestamp, checkpoint.last_reading_id),
+            SensorReading.pressure.isnot(None),
+            SensorReading.flow_rate.isnot(None),
+            SensorReading.acoustic_signal.isnot(None),
+        ]
+        counts = db.execute(
+            select(_SENSOR_ID, func.count(SensorReading.id)).where(*consumed).group_by(_SENSOR_ID)
+        ).all()
+
+        states = {}
+        keep = checkpoint.window_size - 1
+        for sensor_id, seen in counts:
+            tail = []
+            if keep:
+                tail = db.execute(
+                    select(
+                        SensorReading.timestamp,
+                        SensorReading.pressure,
+                        SensorReading.flow_rate,
+                        SensorReading.acoustic_signal,
+                    )
+                    .where(*consumed, _SENSOR_ID == sensor_id)
+                    .order_by(SensorReading.timestamp.desc(), SensorReading.id.desc())
+                    .limit(keep)
+                ).all()[::-1]
+            states[sensor_id] = _SensorState(
+                np.array([row[1:] for row in tail], dtype=np.float64).reshape(len(tail), 3),
+                np.array([row[0] for row in tail], dtype="datetime64[us]"),
+                int(seen),
+            )
+        return states
+
+    @staticmethod
+    def _range_filters(checkpoint: BackfillCheckpoint) -> list:
+        filters = []
+        if checkpoint.range_start is not None:
+            filters.append(SensorReading.timestamp >= checkpoint.range_start)
+        if checkpoint.range_end is not None:
+            filters.append(SensorReading.timestamp <= checkpoint.range_end)
+        return filters
+
+    @staticmethod
+    def _after(timestamp: datetime, reading_id: int):
+        return or_(
+            SensorReading.timestamp > timestamp,
+            and_(SensorReading.timestamp == timestamp, SensorReading.id > reading_id),
+        )
+
+    def _update_progress(self, checkpoint: BackfillCheckpoint, **extra) -> dict:
+        with self._lock:
+            progress = self._progress.setdefault(checkpoint.job_name, {})
+            progress.update(self._checkpoint_dict(checkpoint))
+            progress.update(extra)
+            total = progress.get("total_rows")
+            progress["percent_complete"] = round(100.0 * progress["rows_processed"] / total, 2) if total else 100.0
+            return dict(progress)
+
+    @staticmethod
+    def _checkpoint_dict(checkpoint: BackfillCheckpoint) -> dict:
+        return {
+            "job_name": checkpoint.job_name,
+            "status": checkpoint.status,
+            "range_start": checkpoint.range_start,
+            "range_end": checkpoint.range_end,
+            "window_size": checkpoint.window_size,
+            "step": checkpoint.step,
+            "last_timestamp": checkpoint.last_timestamp,
+            "last_reading_id": checkpoint.last_reading_id,
+            "rows_processed": checkpoint.rows_processed,
+            "windows_scored": checkpoint.windows_scored,
+            "alerts_written": checkpoint.alerts_written,
+            "error": checkpoint.error,
+            "updated_at": checkpoint.updated_at,
+        }
+
+
+backfill_runner = BackfillRunner(chunk_size=int(os.getenv("BACKFILL_CHUNK_SIZE", "20000")))
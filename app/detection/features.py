@@ -1,5 +1,10 @@
+import math
 import statistics
-from typing import List
+import sys
+from collections import deque
+from datetime import datetime
+from fractions import Fraction
+from typing import Deque, List
 from .models import FeatureVector
 from app.simulation.models import SensorData
 
@@ -38,5 +43,109 @@ class FeatureExtractor:
             sample_count=len(data)
         )
 
+class RollingFeatureAccumulator:
+    """
+    Sliding-window equivalent of `FeatureExtractor.extract_from_window`.
+
+    Each `push` updates running sums of pressure, flow and flow squared and a
+    monotonic deque of acoustic maximum candidates, so a reading costs O(1)
+    regardless of window length. The sums are kept as exact fractions, the same
+    arithmetic `statistics.mean`/`statistics.stdev` use, so evicting samples
+    never accumulates rounding error and the emitted features are identical.
+    """
+
+    def __init__(self, window_size: int):
+        if window_size < 1:
+            raise ValueError("window_size must be positive")
+        self.window_size = window_size
+        # (timestamp, pressure, flow, acoustic) for each sample in the window
+        self._window: Deque[tuple[datetime, Fraction, Fraction, float]] = deque()
+        # (sequence number, acoustic) pairs with strictly decreasing acoustic values
+        self._acoustic_peaks: Deque[tuple[int, float]] = deque()
+        self._pushed = 0
+        self._pressure_sum = Fraction(0)
+        self._flow_sum = Fraction(0)
+        self._flow_sq_sum = Fraction(0)
+
+    def __len__(self) -> int:
+        return len(self._window)
+
+    def clear(self):
+        self._window.clear()
+        self._acoustic_peaks.clear()
+        self._pressure_sum = Fraction(0)
+        self._flow_sum = Fraction(0)
+        self._flow_sq_sum = Fraction(0)
+
+    def push(self, reading: SensorData):
+        if len(self._window) == self.window_size:
+            self._evict()
+
+        pressure = Fraction(reading.pressure)
+        flow = Fraction(reading.flow_rate)
+        acoustic = reading.acoustic_signal
+        self._window.append((reading.timestamp, pressure, flow, acoustic))
+        self._pressure_sum += pressure
+        self._flow_sum += flow
+        self._flow_sq_sum += flow * flow
+
+        while self._acoustic_peaks and self._acoustic_peaks[-1][1] <= acoustic:
+            self._acoustic_peaks.pop()
+        self._acoustic_peaks.append((self._pushed, acoustic))
+        self._pushed += 1
+
+    def _evict(self):
+        _, pressure, flow, _ = self._window.popleft()
+        self._pressure_sum -= pressure
+        self._flow_sum -= flow
+        self._flow_sq_sum -= flow * flow
+
+        oldest_seq = self._pushed - len(self._window) - 1
+        if self._acoustic_peaks[0][0] == oldest_seq:
+            self._acoustic_peaks.popleft()
+
+    def features(self) -> FeatureVector:
+        if not self._window:
+            raise ValueError("Data window is empty")
+
+        n = len(self._window)
+        first, last = self._window[0], self._window[-1]
+        if n > 1:
+            pressure_drop_rate = float(first[1] - last[1]) / n
+            sum_sq_dev = (n * self._flow_sq_sum - self._flow_sum * self._flow_sum) / n
+            flow_std_dev = _sqrt_of_fraction(sum_sq_dev / (n - 1))
+        else:
+            pressure_drop_rate = 0.0
+            flow_std_dev = 0.0
+
+        return FeatureVector(
+            window_start=first[0],
+            window_end=last[0],
+            avg_pressure=round(float(self._pressure_sum / n), 3),
+            pressure_drop_rate=round(pressure_drop_rate, 4),
+            avg_flow=round(float(self._flow_sum / n), 2),
+            flow_std_dev=round(flow_std_dev, 3),
+            acoustic_peak=round(self._acoustic_peaks[0][1], 2),
+            sample_count=n
+        )
+
+
+_SQRT_BIT_WIDTH = 2 * sys.float_info.mant_dig + 3
+
+
+def _sqrt_of_fraction(value: Fraction) -> float:
+    """Correctly rounded square root of a non-negative fraction (as in `statistics.stdev`)."""
+    n, m = value.numerator, value.denominator
+
+    def isqrt_round_to_odd(n: int, m: int) -> int:
+        a = math.isqrt(n // m)
+        return a | (a * a * m != n)
+
+    q = (n.bit_length() - m.bit_length() - _SQRT_BIT_WIDTH) // 2
+    if q >= 0:
+        return (isqrt_round_to_odd(n, m << 2 * q) << q) / 1
+    return isqrt_round_to_odd(n << -2 * q, m) / (1 << -q)
+
+
 # Global extractor instance
 extractor = FeatureExtractor()
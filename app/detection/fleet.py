@@ -0,0 +1,148 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+
+import numpy as np
+
+from app.detection.features import RollingFeatureAccumulator
+from app.simulation.models import SensorData
+
+# Column order shared by feature matrices, the detector and the severity scorer
+FEATURE_COLUMNS = [
+    "avg_pressure",
+    "pressure_drop_rate",
+    "avg_flow",
+    "flow_std_dev",
+    "acoustic_peak",
+]
+
+
+@dataclass
+class FleetFeatures:
+    """Features for every sensor evaluated in one pass; row i belongs to sensor_ids[i]."""
+    sensor_ids: list[str]
+    matrix: np.ndarray          # (N, 5) in FEATURE_COLUMNS order
+    window_start: np.ndarray    # (N,) datetime64[us]
+    window_end: np.ndarray      # (N,) datetime64[us]
+    sample_count: np.ndarray    # (N,) int64
+
+    def __len__(self) -> int:
+        return len(self.sensor_ids)
+
+
+class SensorWindowStore:
+    """
+    Per-sensor sliding windows, one `RollingFeatureAccumulator` per sensor.
+
+    Sensor `i` owns accumulator `i` and slot `i` of the sample/hop counter
+    arrays; slots are added on first sight of a sensor id and the counter
+    capacity doubles as the fleet grows. Each reading updates its sensor's
+    running sums in O(1), so evaluating a sensor costs O(1) whatever the
+    window length and yields exactly what `FeatureExtractor.extract_from_window`
+    gives for the same window; the due-sensor selection stays vectorized.
+    """
+
+    def __init__(self, window_size: int, initial_capacity: int = 64):
+        if window_size < 1:
+            raise ValueError("window_size must be positive")
+        self.window_size = window_size
+        self._lock = threading.Lock()
+        self._index: dict[str, int] = {}
+        self._sensor_ids: list[str] = []
+        self._windows: list[RollingFeatureAccumulator] = []
+        self._allocate(max(1, initial_capacity))
+
+    def _allocate(self, capacity: int):
+        self._count = np.zeros(capacity, dtype=np.int64)  # valid samples in window
+        self._since_taken = np.zeros(capacity, dtype=np.int64)  # readings since last take_due
+
+    def _grow(self):
+        old = (self._count, self._since_taken)
+        size = old[0].shape[0]
+        self._allocate(size * 2)
+        self._count[:size] = old[0]
+        self._since_taken[:size] = old[1]
+
+    def _row_for(self, sensor_id: str) -> int:
+        row = self._index.get(sensor_id)
+        if row is None:
+            row = len(self._sensor_ids)
+            if row == self._count.shape[0]:
+                self._grow()
+            self._index[sensor_id] = row
+            self._sensor_ids.append(sensor_id)
+            self._windows.append(RollingFeatureAccumulator(self.window_size))
+        return row
+
+    @property
+    def sensor_ids(self) -> list[str]:
+        return list(self._sensor_ids)
+
+    def __len__(self) -> int:
+        return len(self._sensor_ids)
+
+    def sample_count(self, sensor_id: str) -> int:
+        row = self._index.get(sensor_id)
+        return 0 if row is None else int(self._count[row])
+
+    def append(self, reading: SensorData):
+        with self._lock:
+            row = self._row_for(reading.sensor_id)
+            window = self._windows[row]
+            window.push(reading)
+            self._count[row] = len(window)
+            self._since_taken[row] += 1
+
+    def extend(self, readings: Iterable[SensorData]):
+        for reading in readings:
+            self.append(reading)
+
+    def take_due(self, hop: int, min_samples: int) -> list[str]:
+        """
+        Sensors holding at least `min_samples` readings that have received
+        `hop` or more readings since they were last returned; their hop
+        counters are reset.
+        """
+        with self._lock:
+            n_sensors = len(self._sensor_ids)
+            rows = np.flatnonzero(
+                (self._count[:n_sensors] >= min_samples) & (self._since_taken[:n_sensors] >= hop)
+            )
+            self._since_taken[rows] = 0
+            return [self._sensor_ids[r] for r in rows]
+
+    def compute_features(self, min_samples: int = 5, sensor_ids: list[str] | None = None) -> FleetFeatures:
+        """
+        `FeatureExtractor.extract_from_window` for every sensor (or the given
+        subset) holding at least `min_samples` readings, read from the running
+        accumulators and stacked into one matrix for batch scoring.
+        """
+        with self._lock:
+            n_sensors = len(self._sensor_ids)
+            if sensor_ids is None:
+                rows = np.flatnonzero(self._count[:n_sensors] >= min_samples)
+            else:
+                rows = np.array(
+                    [self._index[s] for s in sensor_ids if s in self._index and self._count[self._index[s]] >= min_samples],
+                    dtype=np.int64,
+                )
+            ids = [self._sensor_ids[r] for r in rows]
+            features = [self._windows[r].features() for r in rows]
+
+        matrix = np.array(
+            [[getattr(vector, column) for column in FEATURE_COLUMNS] for vector in features],
+            dtype=np.float64,
+        ) if features else np.empty((0, len(FEATURE_COLUMNS)))
+
+        return FleetFeatures(
+            sensor_ids=ids,
+            matrix=matrix,
+            window_start=np.array([vector.window_start.replace(tzinfo=None) for vector in features], dtype="datetime64[us]"),
+            window_end=np.array([vector.window_end.replace(tzinfo=None) for vector in features], dtype="datetime64[us]"),
+            sample_count=np.array([vector.sample_count for vector in features], dtype=np.int64),
+        )
+
+
+def to_datetime(value: np.datetime64) -> datetime:
+    return value.astype("datetime64[us]").item()
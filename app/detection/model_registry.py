@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+
+
+class ModelRegistry:
+    """
+    Versioned on-disk store for trained detector models.
+
+    Each version is a joblib artifact `model_v<N>.joblib` plus a
+    `model_v<N>.json` metadata sidecar; `active.json` names the version served
+    at startup. Every file is written to a temporary name and moved into place
+    with `os.replace`, so a crash mid-save never leaves a truncated artifact
+    that the next startup would try to load.
+    """
+
+    def __init__(self, root: Path, keep_versions: int = 10):
+        self.root = Path(root)
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+
+    def _artifact_path(self, version: int) -> Path:
+        return self.root / f"model_v{version}.joblib"
+
+    def _metadata_path(self, version: int) -> Path:
+        return self.root / f"model_v{version}.json"
+
+    def _atomic_write(self, path: Path, write):
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                write(handle)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    def _write_json(self, path: Path, payload: dict):
+        self._atomic_write(path, lambda handle: handle.write(json.dumps(payload, indent=2).encode("utf-8")))
+
+    def list_versions(self) -> list[dict]:
+        """Metadata of every stored version, newest first, flagging the active one."""
+        if not self.root.exists():
+            return []
+        active = self.active_version()
+        versions = []
+        for path in self.root.glob("model_v*.json"):
+            try:
+                metadata = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            metadata["active"] = metadata.get("version") == active
+            versions.append(metadata)
+        return sorted(versions, key=lambda m: m["version"], reverse=True)
+
+    def active_version(self) -> int | None:
+        path = self.root / "active.json"
+        if not path.exists():
+            return None
+        try:
+            return int(json.loads(path.read_text(encoding="utf-8"))["version"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, model, sample_count: int, activate: bool = True) -> dict:
+        with self._lock:
+            existing = [m["version"] for m in self.list_versions()]
+            version = max(existing, default=0) + 1
+            metadata = {
+                "version": version,
+                "model_type": type(model).__name__,
+                "trained_at": datetime.now().isoformat(),
+                "training_samples": sample_count,
+                "artifact": self._artifact_path(version).name,
+            }
+            self._atomic_write(self._artifact_path(version), lambda handle: joblib.dump(model, handle))
+            self._write_json(self._metadata_path(version), metadata)
+            if activate:
+                self._write_json(self.root / "active.json", {"version": version})
+            self._prune()
+        return metadata
+
+    def load(self, version: int | None = None):
+        """Load a version (default: the active one). Returns (model, metadata) or None."""
+        if version is None:
+            version = self.active_version()
+        if version is None or not self._artifact_path(version).exists():
+            return None
+        metadata = json.loads(self._metadata_path(version).read_text(encoding="utf-8"))
+        return joblib.load(self._artifact_path(version)), metadata
+
+    def set_active(self, version: int):
+        if not self._artifact_path(version).exists():
+            raise FileNotFoundError(f"Model version {version} not found")
+        with self._lock:
+            self._write_json(self.root / "active.json", {"version": version})
+
+    def _prune(self):
+        """Drop the oldest versions beyond `keep_versions`, never the active one."""
+        active = self.active_version()
+        versions = [m["version"] for m in self.list_versions()]
+        for version in versions[self.keep_versions:]:
+            if version == active:
+                continue
+            self._artifact_path(version).unlink(missing_ok=True)
+            self._metadata_path(version).unlink(missing_ok=True)
+
+
+model_registry = ModelRegistry(
+    root=Path(os.getenv("DETECTION_MODEL_DIR", "app/detection/artifacts")),
+    keep_versions=int(os.getenv("DETECTION_MODEL_KEEP_VERSIONS", "10")),
+)
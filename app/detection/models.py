@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List
+from typing import List, Optional
+from app.simulation.models import DEFAULT_SENSOR_ID
 
 class FeatureVector(BaseModel):
     window_start: datetime
@@ -19,3 +20,23 @@ class DetectionResult(BaseModel):
     severity: str # "Minor", "Moderate", "Critical"
     features: FeatureVector
     timestamp: datetime
+    sensor_id: str = DEFAULT_SENSOR_ID
+
+class BatchScore(BaseModel):
+    is_leak: bool
+    confidence: float
+    severity_score: float
+    severity: str
+
+class BatchDetectionResponse(BaseModel):
+    count: int
+    model_trained: bool
+    results: List[BatchScore]
+
+class BackfillRequest(BaseModel):
+    job_name: str = "default"
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    window_size: int = Field(60, ge=1)
+    step: int = Field(1, ge=1)
+    resume: bool = True
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from typing import List, Dict
-from .models import FeatureVector, DetectionResult
+from .models import BackfillRequest, BatchDetectionResponse, BatchScore, FeatureVector, DetectionResult
 from .service import detection_service
 from .features import extractor
-from app.simulation.models import SensorData
+from app.executors.pool import db_executor
+from app.simulation.models import DEFAULT_SENSOR_ID, SensorData
 
 router = APIRouter()
 
@@ -20,23 +21,100 @@ async def extract_features(data: List[SensorData]):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/detect", response_model=DetectionResult)
-async def detect_anomalies():
+async def detect_anomalies(sensor_id: str = DEFAULT_SENSOR_ID):
     """
-    Run anomaly detection on the current buffered data.
+    Run anomaly detection on the current buffered data of one sensor.
     """
-    result = detection_service.run_detection()
+    result = detection_service.run_detection(sensor_id)
     if not result:
         raise HTTPException(status_code=400, detail="Insufficient data for detection.")
     return result
 
+@router.post("/detect-batch", response_model=BatchDetectionResponse)
+async def detect_batch(features: List[FeatureVector]):
+    """
+    Score many feature vectors with a single model call; results follow input order.
+    """
+    from app.detection.anomaly_detector import detector
+    from app.detection.scoring import SeverityScorer
+
+    matrix = detector.to_matrix(features)
+    is_anomaly, confidence = detector.predict_batch(matrix)
+    severity_scores, severity_labels = SeverityScorer.calculate_batch(matrix)
+    results = [
+        BatchScore(is_leak=leak, confidence=conf, severity_score=score, severity=label)
+        for leak, conf, score, label in zip(
+            is_anomaly.tolist(), confidence.tolist(), severity_scores.tolist(), severity_labels.tolist()
+        )
+    ]
+    return BatchDetectionResponse(count=len(results), model_trained=detector.is_trained, results=results)
+
+@router.post("/ingest")
+async def ingest_readings(readings: List[SensorData]):
+    """
+    Ingest readings from any number of sensors; each reading is routed to the
+    window of its `sensor_id` and queued for persistence.
+    """
+    from app.telemetry.writer import telemetry_writer
+
+    detection_service.add_readings(readings)
+    for reading in readings:
+        telemetry_writer.enqueue_sensor_reading(reading)
+    return {"ingested": len(readings), "tracked_sensors": len(detection_service.windows)}
+
+@router.get("/detect-fleet", response_model=List[DetectionResult])
+async def detect_fleet(leaks_only: bool = False):
+    """
+    Run anomaly detection for every tracked sensor in a single vectorized pass.
+    """
+    return detection_service.run_fleet_detection(leaks_only=leaks_only)
+
+@router.get("/incidents")
+async def open_incidents():
+    """
+    Leak incidents currently open, one per affected sensor.
+    """
+    from app.detection.scheduler import detection_scheduler
+    return [incident.to_dict() for incident in detection_scheduler.tracker.open_incidents()]
+
 @router.post("/train")
 async def train_model(data: List[FeatureVector]):
     """
     Train the Isolation Forest model with a provided set of normal historical features.
     """
     from app.detection.anomaly_detector import detector
-    detector.train(data)
-    return {"message": "Model trained successfully", "sample_count": len(data)}
+    # Fitting and saving the model would otherwise stall the event loop
+    metadata = await db_executor.run(detector.train, data)
+    return {
+        "message": "Model trained successfully",
+        "sample_count": len(data),
+        "version": metadata["version"] if metadata else None,
+    }
+
+@router.get("/models")
+async def list_models():
+    """
+    List stored model versions with their training sample counts.
+    """
+    from app.detection.anomaly_detector import detector
+    return {
+        "loaded": detector.model_info,
+        "versions": detector.registry.list_versions() if detector.registry else [],
+    }
+
+@router.post("/models/{version}/activate")
+async def activate_model(version: int):
+    """
+    Hot-swap the serving model to a stored version without pausing detection.
+    """
+    from app.detection.anomaly_detector import detector
+    try:
+        metadata = await db_executor.run(detector.load, version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if metadata is None:
+        raise HTTPException(status_code=404, detail=f"Model version {version} not found")
+    return {"message": "Model activated", "model": metadata}
 
 @router.post("/train-simulated")
 async def train_with_simulation(background_tasks: BackgroundTasks):
@@ -65,3 +143,52 @@ async def train_with_simulation(background_tasks: BackgroundTasks):
         
     background_tasks.add_task(background_train)
     return {"message": "Simulated training started in background"}
+
+@router.post("/backfill", status_code=202)
+async def start_backfill(request: BackfillRequest, background_tasks: BackgroundTasks):
+    """
+    Run the detector over stored sensor readings in the background, writing
+    leak alerts in bulk. Re-posting an unfinished job resumes from its checkpoint.
+    """
+    from app.detection.anomaly_detector import detector
+    from app.detection.backfill import backfill_runner
+
+    if not detector.is_trained:
+        raise HTTPException(status_code=400, detail="Model not trained. Train the detector before running a backfill.")
+    if backfill_runner.is_running(request.job_name):
+        raise HTTPException(status_code=409, detail=f"Backfill job '{request.job_name}' is already running")
+
+    background_tasks.add_task(
+        backfill_runner.run,
+        request.job_name,
+        start=request.start,
+        end=request.end,
+        window_size=request.window_size,
+        step=request.step,
+        resume=request.resume,
+    )
+    return {"message": "Backfill started in background", "job_name": request.job_name}
+
+@router.get("/backfill/{job_name}")
+async def backfill_progress(job_name: str):
+    """
+    Progress of a backfill job, from memory while running or from its checkpoint.
+    """
+    from app.detection.backfill import backfill_runner
+    from app.executors.pool import db_executor
+
+    progress = await db_executor.run(backfill_runner.progress, job_name)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Backfill job '{job_name}' not found")
+    return progress
+
+@router.post("/backfill/{job_name}/cancel")
+async def cancel_backfill(job_name: str):
+    """
+    Stop a running backfill after its current chunk; it can be resumed later.
+    """
+    from app.detection.backfill import backfill_runner
+
+    if not backfill_runner.cancel(job_name):
+        raise HTTPException(status_code=404, detail=f"No running backfill job '{job_name}'")
+    return {"message": "Backfill cancellation requested", "job_name": job_name}
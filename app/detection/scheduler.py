@@ -0,0 +1,177 @@
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List
+
+from app.detection.models import DetectionResult
+from app.detection.service import DetectionService, detection_service
+
+_SEVERITY_RANK = {"Minor": 0, "Moderate": 1, "Critical": 2}
+
+
+@dataclass
+class Incident:
+    """One leak event on one sensor, from first anomalous window until it clears."""
+    sensor_id: str
+    opened_at: datetime
+    last_detected_at: datetime
+    last_evaluated_at: datetime
+    severity: str
+    severity_score: float
+    confidence: float
+    detection_count: int = 1
+    clear_streak: int = 0
+    alert_id: int | None = None
+    # Localized segment ("u-v") of the opening detection
+    location: str | None = None
+    closed_at: datetime | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "sensor_id": self.sensor_id,
+            "alert_id": self.alert_id,
+            "location": self.location,
+            "opened_at": self.opened_at,
+            "last_detected_at": self.last_detected_at,
+            "severity": self.severity,
+            "severity_score": self.severity_score,
+            "confidence": self.confidence,
+            "detection_count": self.detection_count,
+            "closed_at": self.closed_at,
+        }
+
+
+@dataclass
+class IncidentEvent:
+    kind: str  # "opened", "updated", "closed"
+    incident: Incident
+    result: DetectionResult | None = None
+
+
+class IncidentTracker:
+    """
+    Coalesces per-sensor detections into incidents.
+
+    The first anomalous window on a sensor opens an incident; later anomalous
+    windows only update it in memory, emitting an "updated" event when the
+    severity class escalates. The incident closes after `clear_after`
+    consecutive clean evaluations, or once the sensor has not been evaluated
+    for `idle_timeout` seconds.
+    """
+
+    def __init__(self, clear_after: int = 3, idle_timeout: float = 300.0):
+        self.clear_after = clear_after
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._open: dict[str, Incident] = {}
+
+    def observe(self, results: List[DetectionResult], now: datetime | None = None) -> List[IncidentEvent]:
+        now = now or datetime.now()
+        events = []
+        with self._lock:
+            for result in results:
+                incident = self._open.get(result.sensor_id)
+                if incident is not None:
+                    incident.last_evaluated_at = now
+                if result.is_leak:
+                    if incident is None:
+                        incident = Incident(
+                            sensor_id=result.sensor_id,
+                            opened_at=result.timestamp,
+                            last_detected_at=result.timestamp,
+                            last_evaluated_at=now,
+                            severity=result.severity,
+                            severity_score=result.severity_score,
+                            confidence=result.confidence,
+                        )
+                        self._open[result.sensor_id] = incident
+                        events.append(IncidentEvent("opened", incident, result))
+                        continue
+                    incident.detection_count += 1
+                    incident.clear_streak = 0
+                    incident.last_detected_at = result.timestamp
+                    incident.confidence = max(incident.confidence, result.confidence)
+                    escalated = _SEVERITY_RANK.get(result.severity, 0) > _SEVERITY_RANK.get(incident.severity, 0)
+                    if result.severity_score > incident.severity_score:
+                        incident.severity_score = result.severity_score
+                    if escalated:
+                        incident.severity = result.severity
+                        events.append(IncidentEvent("updated", incident, result))
+                elif incident is not None:
+                    incident.clear_streak += 1
+                    if incident.clear_streak >= self.clear_after:
+                        events.append(self._close(incident, now, result))
+
+            cutoff = now - timedelta(seconds=self.idle_timeout)
+            for incident in list(self._open.values()):
+                if incident.last_evaluated_at < cutoff:
+                    events.append(self._close(incident, now))
+        return events
+
+    def _close(self, incident: Incident, now: datetime, result: DetectionResult | None = None) -> IncidentEvent:
+        incident.closed_at = now
+        del self._open[incident.sensor_id]
+        return IncidentEvent("closed", incident, result)
+
+    def open_incidents(self) -> List[Incident]:
+        with self._lock:
+            return list(self._open.values())
+
+
+class DetectionScheduler:
+    """
+    Decides which sensors to score on each collector tick.
+
+    A sensor is evaluated once its window is full and then every `hop_size`
+    new readings, so model calls, localization and alert writes scale with
+    the hop rate instead of the ingest rate. Results are fed through an
+    IncidentTracker, and only incident transitions are returned.
+    """
+
+    def __init__(self, service: DetectionService, hop_size: int, tracker: IncidentTracker):
+        if hop_size < 1:
+            raise ValueError("hop_size must be positive")
+        self.service = service
+        self.hop_size = hop_size
+        self.tracker = tracker
+        self._ticks = 0
+        self._evaluations = 0
+        self._event_counts = {"opened": 0, "updated": 0, "closed": 0}
+
+    @property
+    def window_length(self) -> int:
+        return self.service.window_size
+
+    def run_due(self) -> List[IncidentEvent]:
+        self._ticks += 1
+        due = self.service.windows.take_due(self.hop_size, self.window_length)
+        results = self.service.run_fleet_detection(min_samples=self.window_length, sensor_ids=due) if due else []
+        self._evaluations += len(results)
+
+        events = self.tracker.observe(results)
+        for event in events:
+            self._event_counts[event.kind] += 1
+        return events
+
+    def stats(self) -> dict:
+        return {
+            "window_length": self.window_length,
+            "hop_size": self.hop_size,
+            "clear_after": self.tracker.clear_after,
+            "idle_timeout_seconds": self.tracker.idle_timeout,
+            "ticks": self._ticks,
+            "evaluations": self._evaluations,
+            "open_incidents": len(self.tracker.open_incidents()),
+            "incident_events": dict(self._event_counts),
+        }
+
+
+detection_scheduler = DetectionScheduler(
+    detection_service,
+    hop_size=int(os.getenv("DETECTION_HOP_SIZE", "5")),
+    tracker=IncidentTracker(
+        clear_after=int(os.getenv("DETECTION_INCIDENT_CLEAR_AFTER", "3")),
+        idle_timeout=float(os.getenv("DETECTION_INCIDENT_IDLE_TIMEOUT_SECONDS", "300")),
+    ),
+)
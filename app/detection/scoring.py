@@ -1,3 +1,4 @@
+import numpy as np
 from .models import FeatureVector
 
 class SeverityScorer:
@@ -36,3 +37,21 @@ class SeverityScorer:
             classification = "Critical"
             
         return score, classification
+
+    @staticmethod
+    def calculate_batch(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized `calculate` over an (N, 5) feature matrix in FEATURE_COLUMNS order.
+        Returns: (scores, classifications) arrays of length N.
+        """
+        avg_pressure, flow_std_dev, acoustic_peak = matrix[:, 0], matrix[:, 3], matrix[:, 4]
+
+        pressure_drop_pct = np.maximum(0, (SeverityScorer.BASE_PRESSURE - avg_pressure) / SeverityScorer.BASE_PRESSURE) * 100
+        flow_dev_pct = np.minimum(100, (flow_std_dev / SeverityScorer.BASE_FLOW) * 100)
+        acoustic_intensity = np.minimum(100, (acoustic_peak / SeverityScorer.MAX_ACOUSTIC) * 100)
+
+        score = (pressure_drop_pct * 0.5) + (flow_dev_pct * 0.3) + (acoustic_intensity * 0.2)
+        score = np.round(np.minimum(100, score), 2)
+
+        classification = np.where(score < 30, "Minor", np.where(score < 60, "Moderate", "Critical"))
+        return score, classification
@@ -1,44 +1,91 @@
+import os
 from datetime import datetime, timedelta
-from typing import List, Deque
-from collections import deque
-from app.simulation.models import SensorData
-from app.detection.features import extractor
+from typing import Dict, Iterable, List
+from app.simulation.models import DEFAULT_SENSOR_ID, SensorData
 from app.detection.anomaly_detector import detector
+from app.detection.fleet import SensorWindowStore, to_datetime
 from app.detection.scoring import SeverityScorer
 from .models import FeatureVector, DetectionResult
 
 class DetectionService:
-    def __init__(self, window_size_seconds: int = 60):
+    def __init__(self, window_size_seconds: int = 60, min_samples: int = 5):
         self.window_size = window_size_seconds
-        self.buffer: Deque[SensorData] = deque(maxlen=window_size_seconds)
+        self.min_samples = min_samples
+        self.windows = SensorWindowStore(window_size_seconds)
         self.is_monitoring = True
-        
+
+    def sample_count(self, sensor_id: str = DEFAULT_SENSOR_ID) -> int:
+        return self.windows.sample_count(sensor_id)
+
     def add_reading(self, reading: SensorData):
-        self.buffer.append(reading)
-        
-    def get_features(self) -> FeatureVector | None:
-        if len(self.buffer) < 5: 
-            return None
-        return extractor.extract_from_window(list(self.buffer))
+        self.windows.append(reading)
+
+    def add_readings(self, readings: Iterable[SensorData]):
+        self.windows.extend(readings)
+
+    def latest_pressures(self) -> Dict[str, float]:
+        """Average window pressure of every sensor holding at least one reading."""
+        fleet = self.windows.compute_features(min_samples=1)
+        return dict(zip(fleet.sensor_ids, fleet.matrix[:, 0].tolist()))
 
-    def run_detection(self) -> DetectionResult | None:
-        features = self.get_features()
-        if not features:
+    def get_features(self, sensor_id: str = DEFAULT_SENSOR_ID) -> FeatureVector | None:
+        fleet = self.windows.compute_features(self.min_samples, sensor_ids=[sensor_id])
+        if not len(fleet):
             return None
-            
-        is_anomaly, confidence = detector.predict(features)
-        
-        # Calculate calculated severity score and standard classification
-        severity_score, severity_label = SeverityScorer.calculate(features)
-            
-        return DetectionResult(
-            is_leak=is_anomaly,
-            confidence=confidence,
-            severity_score=severity_score,
-            severity=severity_label,
-            features=features,
-            timestamp=datetime.now()
+        return self._feature_vector(fleet, 0)
+
+    def run_detection(self, sensor_id: str = DEFAULT_SENSOR_ID) -> DetectionResult | None:
+        results = self.run_fleet_detection(sensor_ids=[sensor_id])
+        return results[0] if results else None
+
+    def run_fleet_detection(
+        self,
+        min_samples: int | None = None,
+        sensor_ids: List[str] | None = None,
+        leaks_only: bool = False,
+    ) -> List[DetectionResult]:
+        """
+        Score every sensor with at least `min_samples` readings in a single
+        vectorized pass: one feature computation, one model call and one
+        severity calculation for the whole fleet.
+        """
+        fleet = self.windows.compute_features(min_samples or self.min_samples, sensor_ids=sensor_ids)
+        if not len(fleet):
+            return []
+
+        is_anomaly, confidence = detector.predict_batch(fleet.matrix)
+        severity_scores, severity_labels = SeverityScorer.calculate_batch(fleet.matrix)
+        now = datetime.now()
+
+        rows = is_anomaly.nonzero()[0] if leaks_only else range(len(fleet))
+        return [
+            DetectionResult(
+                is_leak=bool(is_anomaly[i]),
+                confidence=float(confidence[i]),
+                severity_score=float(severity_scores[i]),
+                severity=str(severity_labels[i]),
+                features=self._feature_vector(fleet, i),
+                timestamp=now,
+                sensor_id=fleet.sensor_ids[i],
+            )
+            for i in rows
+        ]
+
+    @staticmethod
+    def _feature_vector(fleet, i: int) -> FeatureVector:
+        avg_pressure, pressure_drop_rate, avg_flow, flow_std_dev, acoustic_peak = fleet.matrix[i].tolist()
+        return FeatureVector(
+            window_start=to_datetime(fleet.window_start[i]),
+            window_end=to_datetime(fleet.window_end[i]),
+            avg_pressure=avg_pressure,
+            pressure_drop_rate=pressure_drop_rate,
+            avg_flow=avg_flow,
+            flow_std_dev=flow_std_dev,
+            acoustic_peak=acoustic_peak,
+            sample_count=int(fleet.sample_count[i]),
         )
 
 # Global detection service instance
-detection_service = DetectionService()
+detection_service = DetectionService(
+    window_size_seconds=int(os.getenv("DETECTION_WINDOW_SIZE", "60")),
+)
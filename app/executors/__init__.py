@@ -0,0 +1 @@
+"""Bounded thread pools for blocking I/O."""
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger("executors")
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when a pool's wait queue is full and new work is rejected."""
+
+
+class BlockingExecutor:
+    """
+    Named thread pool for blocking calls (SQLAlchemy sessions, SMTP) made from
+    async code. At most `max_workers` calls run concurrently and at most
+    `max_queue` more may wait; beyond that work is rejected instead of piling
+    up behind a stalled dependency.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Schedule `fn` on the pool and return its concurrent future."""
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                raise ExecutorSaturatedError(
+                    f"{self.name} pool saturated ({self.max_workers} active, {self._pending} queued)"
+                )
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=f"{self.name}-pool"
+                )
+            executor = self._executor
+            self._pending += 1
+            self._submitted += 1
+
+        queued_at = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                self._pending -= 1
+                self._active += 1
+                waited = started - queued_at
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+                    self._total_run += time.perf_counter() - started
+
+        future = executor.submit(call)
+        future.add_done_callback(self._on_cancelled)
+        return future
+
+    def _on_cancelled(self, future: Future):
+        if future.cancelled():
+            # Cancelled while still queued, so `call` never ran.
+            with self._lock:
+                self._pending -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn` on the pool and await its result."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def spawn(self, fn, *args, **kwargs):
+        """Fire-and-forget variant of `run`; failures and rejections are logged."""
+        try:
+            future = self.submit(fn, *args, **kwargs)
+        except ExecutorSaturatedError as exc:
+            logger.error("Dropped %s: %s", getattr(fn, "__name__", fn), exc)
+            return
+        future.add_done_callback(self._log_failure)
+
+    def _log_failure(self, future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("%s pool task failed: %s", self.name, future.exception())
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads; a later submit starts a fresh pool."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._pending,
+                "saturation": round(self._active / self.max_workers, 4),
+                "queue_utilization": round(self._pending / self.max_queue, 4) if self.max_queue else 0.0,
+                "submitted": self._submitted,
+                "completed": completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / completed * 1000, 3) if completed else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+                "avg_run_ms": round(self._total_run / completed * 1000, 3) if completed else 0.0,
+            }
+
+
+db_executor = BlockingExecutor(
+    "db",
+    max_workers=int(os.getenv("DB_POOL_WORKERS", "8")),
+    max_queue=int(os.getenv("DB_POOL_MAX_QUEUE", "256")),
+)
+notification_executor = BlockingExecutor(
+    "notifications",
+    max_workers=int(os.getenv("NOTIFICATION_POOL_WORKERS", "2")),
+    max_queue=int(os.getenv("NOTIFICATION_POOL_MAX_QUEUE", "128")),
+)
+
+executors = [db_executor, notification_executor]
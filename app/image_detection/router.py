@@ -1,10 +1,13 @@
 import json
+from datetime import datetime
 from PIL import UnidentifiedImageError
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
 from sqlalchemy.orm import Session
 
+from app.database.pagination import keyset_page, set_next_cursor
 from app.database.session import get_db
+from app.executors.pool import db_executor
 from app.image_detection.models import (
     LeakImageDetectionResponse,
     LeakImagePredictionHistoryItem,
@@ -15,6 +18,11 @@ from app.models.db_models import LeakImagePrediction
 router = APIRouter()
 
 
+def _save_prediction(db: Session, history_row: LeakImagePrediction):
+    db.add(history_row)
+    db.commit()
+
+
 @router.post("/upload-leak-image", response_model=LeakImageDetectionResponse)
 async def upload_leak_image(
     file: UploadFile = File(...),
@@ -44,8 +52,7 @@ async def upload_leak_image(
         recommended_solution=result.recommended_solution,
         detections_json=result.detections_json,
     )
-    db.add(history_row)
-    db.commit()
+    await db_executor.run(_save_prediction, db, history_row)
 
     return LeakImageDetectionResponse(
         leak_type=result.leak_type,
@@ -57,14 +64,23 @@ async def upload_leak_image(
     )
 
 
+def _query_leak_image_history(
+    db: Session, limit: int, cursor, start, end
+) -> tuple[list[LeakImagePrediction], str | None]:
+    return keyset_page(db.query(LeakImagePrediction), LeakImagePrediction, limit, cursor, start, end)
+
+
 @router.get("/leak-image-history", response_model=list[LeakImagePredictionHistoryItem])
-async def get_leak_image_history(limit: int = 20, db: Session = Depends(get_db)):
-    rows = (
-        db.query(LeakImagePrediction)
-        .order_by(LeakImagePrediction.timestamp.desc())
-        .limit(limit)
-        .all()
-    )
+async def get_leak_image_history(
+    response: Response,
+    limit: int = Query(default=20, ge=1, le=1000),
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: Session = Depends(get_db),
+):
+    rows, next_cursor = await db_executor.run(_query_leak_image_history, db, limit, cursor, start, end)
+    set_next_cursor(response, next_cursor)
 
     # Normalize legacy/invalid rows defensively.
     history = []
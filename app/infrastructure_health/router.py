@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from app.database.session import get_db
+from app.executors.pool import db_executor
 from app.models.db_models import LeakAlert, LeakImagePrediction
 from app.simulation.service import simulator_engine
 from app.water_quality.models import WaterQualityAssessmentInput, WaterCondition
@@ -131,8 +132,8 @@ def _water_quality_module_health() -> dict:
 
 @router.get("/health")
 async def get_unified_infrastructure_health(db: Session = Depends(get_db)):
-    leak = _leak_module_health(db)
-    image = _image_module_health(db)
+    leak = await db_executor.run(_leak_module_health, db)
+    image = await db_executor.run(_image_module_health, db)
     water = _water_quality_module_health()
 
     module_scores = [leak["health_score"], image["health_score"], water["health_score"]]
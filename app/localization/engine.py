@@ -0,0 +1,274 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import networkx as nx
+import numpy as np
+
+DEFAULT_DROP_THRESHOLD = 0.5
+# Node types whose head is held fixed (sources) in the hydraulic model
+FIXED_HEAD_TYPES = {"reservoir", "tank"}
+
+
+@dataclass(frozen=True)
+class CompiledTopology:
+    """
+    Array form of the network graph.
+
+    Edge `e` runs from node `source[e]` to node `target[e]` (indices into
+    `node_ids`) with a normal pressure drop of `threshold[e]`. `indptr` /
+    `indices` / `edge_of` form a CSR adjacency list: the neighbours of node
+    `n` are `indices[indptr[n]:indptr[n + 1]]`, reached over edges
+    `edge_of[indptr[n]:indptr[n + 1]]`. `conductance[e]` is the edge's
+    linearized hydraulic conductance and `fixed[n]` marks fixed-head nodes
+    (reservoirs and tanks), both used by sensitivity localization.
+    """
+    version: int
+    node_ids: List[str]
+    node_index: Dict[str, int]
+    source: np.ndarray
+    target: np.ndarray
+    threshold: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    edge_of: np.ndarray
+    conductance: np.ndarray
+    fixed: np.ndarray
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.source)
+
+    def edge(self, e: int) -> Tuple[str, str]:
+        return self.node_ids[self.source[e]], self.node_ids[self.target[e]]
+
+    def neighbors(self, node: str) -> List[str]:
+        n = self.node_index[node]
+        return [self.node_ids[i] for i in self.indices[self.indptr[n]:self.indptr[n + 1]]]
+
+
+def _segment_threshold(thresholds: dict, u, v, default: float) -> float:
+    # Explicit membership checks: a configured threshold of 0.0 is a real value
+    if (u, v) in thresholds:
+        return thresholds[(u, v)]
+    if (v, u) in thresholds:
+        return thresholds[(v, u)]
+    return default
+
+
+def compile_topology(
+    graph: nx.Graph,
+    thresholds: Dict[Tuple[str, str], float],
+    version: int = 0,
+    default_threshold: float = DEFAULT_DROP_THRESHOLD,
+) -> CompiledTopology:
+    """
+    Compile a graph and per-segment drop thresholds (keyed in either
+    orientation) into edge-index and CSR arrays. Edge order follows
+    `graph.edges()`, which is also the orientation pressure drops are
+    measured in. Conductance is taken as 1 / the edge's `length` attribute
+    and fixed-head nodes from a node `type` attribute of "reservoir" or "tank".
+    """
+    node_ids = list(graph.nodes())
+    node_index = {node: i for i, node in enumerate(node_ids)}
+    edges = list(graph.edges())
+
+    source = np.fromiter((node_index[u] for u, _ in edges), dtype=np.int64, count=len(edges))
+    target = np.fromiter((node_index[v] for _, v in edges), dtype=np.int64, count=len(edges))
+    threshold = np.fromiter(
+        (_segment_threshold(thresholds, u, v, default_threshold) for u, v in edges),
+        dtype=np.float64,
+        count=len(edges),
+    )
+    conductance = np.fromiter(
+        (1.0 / length if length else 1.0 for length in (data.get("length") for _, _, data in graph.edges(data=True))),
+        dtype=np.float64,
+        count=len(edges),
+    )
+    fixed = np.fromiter(
+        (graph.nodes[node].get("type") in FIXED_HEAD_TYPES for node in node_ids),
+        dtype=bool,
+        count=len(node_ids),
+    )
+    return compile_arrays(
+        node_ids, source, target, threshold,
+        version=version, node_index=node_index, conductance=conductance, fixed=fixed,
+    )
+
+
+def compile_arrays(
+    node_ids: List[str],
+    source: np.ndarray,
+    target: np.ndarray,
+    threshold: np.ndarray,
+    version: int = 0,
+    node_index: Dict[str, int] | None = None,
+    conductance: np.ndarray | None = None,
+    fixed: np.ndarray | None = None,
+) -> CompiledTopology:
+    """
+    Build the CSR adjacency for edges already given as node-index arrays.
+    Conductance defaults to 1 per edge and no node is fixed-head.
+    """
+    source = np.asarray(source, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    edge_ids = np.arange(len(source), dtype=np.int64)
+    rows = np.concatenate([source, target])
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(node_ids)), out=indptr[1:])
+
+    return CompiledTopology(
+        version=version,
+        node_ids=node_ids,
+        node_index=node_index if node_index is not None else {node: i for i, node in enumerate(node_ids)},
+        source=source,
+        target=target,
+        threshold=np.asarray(threshold, dtype=np.float64),
+        indptr=indptr,
+        indices=np.concatenate([target, source])[order],
+        edge_of=np.concatenate([edge_ids, edge_ids])[order],
+        conductance=np.ones(len(source)) if conductance is None else np.asarray(conductance, dtype=np.float64),
+        fixed=np.zeros(len(node_ids), dtype=bool) if fixed is None else np.asarray(fixed, dtype=bool),
+    )
+
+
+class LocalizationEngine:
+    """
+    Vectorized pressure-gradient localization over a compiled topology.
+
+    Node pressures are scattered into a dense vector (NaN for unmeasured
+    nodes) and every edge's deviation `P[source] - P[target] - threshold` is
+    computed in one array expression. The compiled topology is replaced as a
+    whole by `load`, so a reload never exposes a half-built network to
+    concurrent callers.
+    """
+
+    def __init__(self, graph: nx.Graph, thresholds: Dict[Tuple[str, str], float]):
+        self._lock = threading.Lock()
+        self._topology = compile_topology(graph, thresholds)
+
+    @property
+    def topology(self) -> CompiledTopology:
+        return self._topology
+
+    def load(self, graph: nx.Graph, thresholds: Dict[Tuple[str, str], float]) -> CompiledTopology:
+        """Compile a new topology and swap it in; returns the new topology."""
+        with self._lock:
+            self._topology = compile_topology(graph, thresholds, version=self._topology.version + 1)
+        return self._topology
+
+    def load_arrays(
+        self,
+        node_ids: List[str],
+        source: np.ndarray,
+        target: np.ndarray,
+        threshold: np.ndarray,
+        conductance: np.ndarray | None = None,
+        fixed: np.ndarray | None = None,
+    ) -> CompiledTopology:
+        """Like `load`, for networks already in edge-index form (e.g. parsed EPANET pipes)."""
+        with self._lock:
+            self._topology = compile_arrays(
+                node_ids, source, target, threshold,
+                version=self._topology.version + 1, conductance=conductance, fixed=fixed,
+            )
+        return self._topology
+
+    @staticmethod
+    def pressure_vector(topology: CompiledTopology, pressures: Dict[str, float]) -> np.ndarray:
+        values = np.full(topology.node_count, np.nan)
+        index = topology.node_index
+        positions = np.fromiter((index.get(node, -1) for node in pressures), dtype=np.int64, count=len(pressures))
+        readings = np.fromiter(pressures.values(), dtype=np.float64, count=len(pressures))
+        known = positions >= 0
+        values[positions[known]] = readings[known]
+        return values
+
+    @staticmethod
+    def deviations(topology: CompiledTopology, values: np.ndarray) -> np.ndarray:
+        """
+        Deviation of every edge's pressure drop from its threshold. `values`
+        is (nodes,) or (snapshots, nodes); edges with an unmeasured endpoint
+        get NaN.
+        """
+        return values[..., topology.source] - values[..., topology.target] - topology.threshold
+
+    @staticmethod
+    def top_k(deviation: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indices of the `k` edges with the largest positive deviation, largest
+        first; ties keep edge order.
+        """
+        candidates = np.flatnonzero(deviation > 0)
+        if len(candidates) > k:
+            values = deviation[candidates]
+            kth_largest = np.partition(values, len(values) - k)[len(values) - k]
+            above = candidates[values > kth_largest]
+            tied = candidates[values == kth_largest][:k - len(above)]
+            candidates = np.concatenate([above, tied])
+        return candidates[np.lexsort((candidates, -deviation[candidates]))]
+
+    @staticmethod
+    def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row-wise `top_k` over a (snapshots, edges) score matrix. Returns flat
+        (rows, columns) arrays ordered by row, then rank; ties keep column
+        order, and NaN or non-positive scores are never selected.
+        """
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+        positive = scores > 0
+        if scores.shape[1] > k:
+            kth_largest = np.partition(scores, scores.shape[1] - k, axis=1)[:, scores.shape[1] - k, None]
+            above = scores > kth_largest
+            tied = scores == kth_largest
+            room = k - above.sum(axis=1, keepdims=True)
+            selected = positive & (above | (tied & (np.cumsum(tied, axis=1) <= room)))
+        else:
+            selected = positive
+        rows, columns = np.nonzero(selected)
+        order = np.lexsort((columns, -scores[rows, columns], rows))
+        return rows[order], columns[order]
+
+    @staticmethod
+    def column_positions(topology: CompiledTopology, node_ids: List[str]) -> np.ndarray:
+        """Column of each topology node in a snapshot matrix over `node_ids` (-1 if absent)."""
+        columns = np.full(topology.node_count, -1, dtype=np.int64)
+        index = topology.node_index
+        for column, node in enumerate(node_ids):
+            position = index.get(node)
+            if position is not None:
+                columns[position] = column
+        return columns
+
+    def localize_batch(
+        self, node_ids: List[str], matrix: np.ndarray, k: int = 1
+    ) -> Tuple[CompiledTopology, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        `localize` for every row of a (snapshots, len(node_ids)) pressure
+        matrix at once. Only edges with both endpoints among the columns are
+        evaluated. Returns (topology, rows, edge_indices, deviations) as flat
+        arrays ordered by snapshot, then rank.
+        """
+        topology = self._topology
+        columns = self.column_positions(topology, node_ids)
+        source_col, target_col = columns[topology.source], columns[topology.target]
+        measured = np.flatnonzero((source_col >= 0) & (target_col >= 0))
+        deviation = matrix[:, source_col[measured]] - matrix[:, target_col[measured]] - topology.threshold[measured]
+        rows, picked = self.top_k_rows(deviation, k)
+        return topology, rows, measured[picked], deviation[rows, picked]
+
+    def localize(self, pressures: Dict[str, float], k: int = 1) -> Tuple[CompiledTopology, np.ndarray, np.ndarray]:
+        """
+        Returns (topology, edge_indices, deviations) for the top-k suspected
+        segments, evaluated against a single topology snapshot.
+        """
+        topology = self._topology
+        deviation = self.deviations(topology, self.pressure_vector(topology, pressures))
+        edges = self.top_k(deviation, k)
+        return topology, edges, deviation[edges]
+
@@ -0,0 +1,274 @@
+import hashlib
+import io
+import logging
+import math
+import os
+import tempfile
+from array import array
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Tuple
+
+import networkx as nx
+import numpy as np
+
+logger = logging.getLogger("epanet")
+
+# Bump when the parsed layout or threshold model changes so stale caches are ignored
+CACHE_FORMAT_VERSION = 2
+
+_NODE_SECTIONS = {"JUNCTIONS": "junction", "RESERVOIRS": "reservoir", "TANKS": "tank"}
+# Flow units whose lengths are in feet and diameters in inches; all others are SI (m / mm)
+_US_FLOW_UNITS = {"CFS", "GPM", "MGD", "IMGD", "AFD"}
+
+# Normal-drop model: Hazen-Williams head loss at a nominal velocity, plus headroom
+NOMINAL_VELOCITY = 1.0       # m/s
+THRESHOLD_HEADROOM = 1.5
+MIN_DROP_THRESHOLD = 0.05    # bar
+DEFAULT_HW_ROUGHNESS = 100.0
+BAR_PER_METRE_HEAD = 0.0980665
+
+
+@dataclass
+class NetworkDefinition:
+    """
+    Parsed EPANET network in column form. Node arrays are indexed by node
+    position; `source[p]` / `target[p]` are the start and end node positions
+    of pipe `p`. Lengths and diameters are in metres, thresholds in bar, and
+    coordinates are the file's X/Y (NaN where a node has none).
+    """
+    node_ids: np.ndarray
+    node_types: np.ndarray
+    elevation: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    pipe_ids: np.ndarray
+    source: np.ndarray
+    target: np.ndarray
+    length: np.ndarray
+    diameter: np.ndarray
+    roughness: np.ndarray
+    threshold: np.ndarray
+    conductance: np.ndarray
+
+    @property
+    def fixed(self) -> np.ndarray:
+        """Fixed-head nodes (reservoirs and tanks)."""
+        return np.isin(self.node_types, ["reservoir", "tank"])
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def pipe_count(self) -> int:
+        return len(self.pipe_ids)
+
+    def to_graph(self) -> nx.Graph:
+        graph = nx.Graph()
+        node_ids = self.node_ids.tolist()
+        graph.add_nodes_from((node, {"type": node_type}) for node, node_type in zip(node_ids, self.node_types.tolist()))
+        graph.add_edges_from(
+            (node_ids[u], node_ids[v], {"id": pipe, "length": length})
+            for u, v, pipe, length in zip(
+                self.source.tolist(), self.target.tolist(), self.pipe_ids.tolist(), self.length.tolist()
+            )
+        )
+        return graph
+
+    def node_coords(self) -> Dict[str, List[float]]:
+        """[lat, lon] per node, reading X as longitude and Y as latitude."""
+        has_coords = ~(np.isnan(self.x) | np.isnan(self.y))
+        return {
+            node: [lat, lon]
+            for node, lon, lat in zip(
+                self.node_ids[has_coords].tolist(), self.x[has_coords].tolist(), self.y[has_coords].tolist()
+            )
+        }
+
+    def drop_thresholds(self) -> Dict[Tuple[str, str], float]:
+        node_ids = self.node_ids.tolist()
+        return {
+            (node_ids[u], node_ids[v]): threshold
+            for u, v, threshold in zip(self.source.tolist(), self.target.tolist(), self.threshold.tolist())
+        }
+
+    def save(self, path: Path):
+        """Write as an uncompressed .npz, atomically, so loading is a few array reads."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                np.savez(handle, **{field.name: getattr(self, field.name) for field in fields(self)})
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> "NetworkDefinition":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{field.name: data[field.name] for field in fields(cls)})
+
+
+def parse_inp(lines: Iterable[str]) -> NetworkDefinition:
+    """
+    Single pass over the lines of an EPANET .inp file, reading the
+    JUNCTIONS, RESERVOIRS, TANKS, PIPES, COORDINATES and OPTIONS sections.
+    Values accumulate in typed arrays, so memory is proportional to the
+    network, not to the file. Pipes that reference an undeclared node add it
+    as type "unknown".
+    """
+    index: Dict[str, int] = {}
+    node_ids: List[str] = []
+    node_types: List[str] = []
+    elevation = array("d")
+    x = array("d")
+    y = array("d")
+    pipe_ids: List[str] = []
+    source = array("q")
+    target = array("q")
+    length = array("d")
+    diameter = array("d")
+    roughness = array("d")
+    flow_units = "GPM"  # EPANET default
+    headloss = "H-W"
+
+    def node(node_id: str, node_type: str, elev: float) -> int:
+        position = index.get(node_id)
+        if position is None:
+            position = index[node_id] = len(node_ids)
+            node_ids.append(node_id)
+            node_types.append(node_type)
+            elevation.append(elev)
+            x.append(math.nan)
+            y.append(math.nan)
+        elif node_type != "unknown":
+            node_types[position] = node_type
+            elevation[position] = elev
+        return position
+
+    section = None
+    for raw in lines:
+        line = raw.split(";", 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith("["):
+            section = line.strip("[]").strip().upper()
+            continue
+        parts = line.split()
+        if section in _NODE_SECTIONS:
+            node(parts[0], _NODE_SECTIONS[section], float(parts[1]) if len(parts) > 1 else math.nan)
+        elif section == "PIPES" and len(parts) >= 5:
+            pipe_ids.append(parts[0])
+            source.append(node(parts[1], "unknown", math.nan))
+            target.append(node(parts[2], "unknown", math.nan))
+            length.append(float(parts[3]))
+            diameter.append(float(parts[4]))
+            roughness.append(float(parts[5]) if len(parts) > 5 else DEFAULT_HW_ROUGHNESS)
+        elif section == "COORDINATES" and len(parts) >= 3:
+            position = node(parts[0], "unknown", math.nan)
+            x[position] = float(parts[1])
+            y[position] = float(parts[2])
+        elif section == "OPTIONS" and len(parts) >= 2:
+            key = parts[0].upper()
+            if key == "UNITS":
+                flow_units = parts[1].upper()
+            elif key == "HEADLOSS":
+                headloss = parts[1].upper()
+
+    us_units = flow_units in _US_FLOW_UNITS
+    length_m = np.frombuffer(length, dtype=np.float64) * (0.3048 if us_units else 1.0)
+    diameter_m = np.frombuffer(diameter, dtype=np.float64) * (0.0254 if us_units else 0.001)
+    roughness_arr = np.frombuffer(roughness, dtype=np.float64).copy()
+    # Darcy-Weisbach / Chezy-Manning roughness values are not H-W coefficients
+    hw_roughness = roughness_arr if headloss == "H-W" else np.full(len(roughness_arr), DEFAULT_HW_ROUGHNESS)
+
+    return NetworkDefinition(
+        node_ids=np.array(node_ids, dtype=str),
+        node_types=np.array(node_types, dtype=str),
+        elevation=np.frombuffer(elevation, dtype=np.float64).copy(),
+        x=np.frombuffer(x, dtype=np.float64).copy(),
+        y=np.frombuffer(y, dtype=np.float64).copy(),
+        pipe_ids=np.array(pipe_ids, dtype=str),
+        source=np.frombuffer(source, dtype=np.int64).copy(),
+        target=np.frombuffer(target, dtype=np.int64).copy(),
+        length=length_m,
+        diameter=diameter_m,
+        roughness=roughness_arr,
+        threshold=drop_thresholds(length_m, diameter_m, hw_roughness),
+        conductance=linearized_conductance(length_m, diameter_m, hw_roughness),
+    )
+
+
+def _nominal_head_loss(length: np.ndarray, diameter: np.ndarray, roughness: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(flow m3/s, Hazen-Williams head loss m) at NOMINAL_VELOCITY."""
+    flow = NOMINAL_VELOCITY * math.pi * diameter ** 2 / 4
+    head_loss = 10.67 * length * flow ** 1.852 / (roughness ** 1.852 * diameter ** 4.87)
+    return flow, head_loss
+
+
+def linearized_conductance(length: np.ndarray, diameter: np.ndarray, roughness: np.ndarray) -> np.ndarray:
+    """
+    dQ/dP (m3/s per bar) of the Hazen-Williams relation linearized at
+    NOMINAL_VELOCITY; degenerate pipes fall back to the median conductance.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        flow, head_loss = _nominal_head_loss(length, diameter, roughness)
+        conductance = flow / (1.852 * head_loss * BAR_PER_METRE_HEAD)
+    valid = np.isfinite(conductance) & (conductance > 0)
+    fallback = float(np.median(conductance[valid])) if valid.any() else 1.0
+    return np.where(valid, conductance, fallback)
+
+
+def drop_thresholds(length: np.ndarray, diameter: np.ndarray, roughness: np.ndarray) -> np.ndarray:
+    """
+    Normal pressure drop (bar) per pipe: Hazen-Williams head loss at
+    NOMINAL_VELOCITY times THRESHOLD_HEADROOM, floored at MIN_DROP_THRESHOLD.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        _, head_loss = _nominal_head_loss(length, diameter, roughness)
+    threshold = np.nan_to_num(head_loss * BAR_PER_METRE_HEAD * THRESHOLD_HEADROOM, nan=MIN_DROP_THRESHOLD, posinf=MIN_DROP_THRESHOLD)
+    return np.maximum(threshold, MIN_DROP_THRESHOLD)
+
+
+def file_digest(stream: BinaryIO, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_network(stream: BinaryIO, cache_dir: Path | None = None) -> Tuple[NetworkDefinition, bool]:
+    """
+    Load a network from a seekable binary .inp stream, using the binary
+    cache keyed by the content hash when present. Returns (network, from_cache).
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = Path(cache_dir) / f"{file_digest(stream)}.v{CACHE_FORMAT_VERSION}.npz"
+        stream.seek(0)
+        if cache_path.exists():
+            try:
+                return NetworkDefinition.load(cache_path), True
+            except (OSError, ValueError, KeyError):
+                pass
+
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+    try:
+        network = parse_inp(text)
+    finally:
+        text.detach()
+
+    if cache_path is not None:
+        try:
+            network.save(cache_path)
+        except OSError as e:
+            logger.warning("Could not write network cache %s: %s", cache_path, e)
+    return network, False
+
+
+def load_inp(path: str | Path, cache_dir: Path | None = None) -> Tuple[NetworkDefinition, bool]:
+    with open(path, "rb") as stream:
+        return load_network(stream, cache_dir)
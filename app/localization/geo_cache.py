@@ -0,0 +1,219 @@
+import gzip
+import hashlib
+import json
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # optional: br responses are offered only when installed
+    brotli = None
+
+_JSON_SEPARATORS = (",", ":")
+_COLLECTION_PREFIX = b'{"type":"FeatureCollection","features":['
+_COLLECTION_SUFFIX = b"]}"
+# Subset responses smaller than this are not worth compressing on the fly
+MIN_COMPRESS_BYTES = 1024
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, separators=_JSON_SEPARATORS).encode("utf-8")
+
+
+@dataclass(frozen=True)
+class EncodedBody:
+    """A response body serialized once, with precompressed variants and an ETag."""
+    identity: bytes
+    gzip: bytes
+    br: bytes | None
+    etag: str
+
+    @classmethod
+    def build(cls, body: bytes, tag: str) -> "EncodedBody":
+        return cls(
+            identity=body,
+            gzip=gzip.compress(body, compresslevel=6),
+            br=brotli.compress(body) if brotli is not None else None,
+            etag=f'"{tag}-{hashlib.sha1(body).hexdigest()[:16]}"',
+        )
+
+
+class GridIndex:
+    """
+    Uniform-grid spatial index over feature bounding boxes.
+
+    Every feature is registered in each cell its bbox overlaps; cell contents
+    are stored CSR-style (`cell_ptr`, `cell_items`) with cells numbered
+    row-major, so the candidates of one grid row of a query are a single
+    contiguous slice. Features overlapping more than `max_cells_per_feature`
+    cells (long mains) are kept in a short overflow list checked on every
+    query instead of being copied into each cell. Candidates are then
+    filtered exactly against the boxes.
+    """
+
+    def __init__(
+        self,
+        bounds: np.ndarray,
+        target_per_cell: int = 4,
+        max_cells_per_axis: int = 1024,
+        max_cells_per_feature: int = 64,
+    ):
+        # bounds: (N, 4) min_x, min_y, max_x, max_y
+        self.bounds = bounds
+        count = len(bounds)
+        if count:
+            self.origin_x, self.origin_y = bounds[:, 0].min(), bounds[:, 1].min()
+            extent_x = max(bounds[:, 2].max() - self.origin_x, 1e-9)
+            extent_y = max(bounds[:, 3].max() - self.origin_y, 1e-9)
+        else:
+            self.origin_x = self.origin_y = 0.0
+            extent_x = extent_y = 1.0
+        self.cells = int(min(max_cells_per_axis, max(1, math.ceil(math.sqrt(count / target_per_cell)))))
+        self.cell_w = extent_x / self.cells
+        self.cell_h = extent_y / self.cells
+
+        cx0, cy0 = self._cell(bounds[:, 0], bounds[:, 1])
+        cx1, cy1 = self._cell(bounds[:, 2], bounds[:, 3])
+        span_x = cx1 - cx0 + 1
+        per_feature = span_x * (cy1 - cy0 + 1)
+        oversized = per_feature > max_cells_per_feature
+        self.overflow = np.flatnonzero(oversized)
+        per_feature = np.where(oversized, 0, per_feature)
+        feature = np.repeat(np.arange(count), per_feature)
+        local = np.arange(per_feature.sum()) - np.repeat(np.cumsum(per_feature) - per_feature, per_feature)
+        span = np.repeat(span_x, per_feature)
+        cell = (np.repeat(cy0, per_feature) + local // span) * self.cells + np.repeat(cx0, per_feature) + local % span
+
+        order = np.argsort(cell, kind="stable")
+        self.cell_items = feature[order]
+        self.cell_ptr = np.zeros(self.cells * self.cells + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell, minlength=self.cells * self.cells), out=self.cell_ptr[1:])
+
+    def _cell(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        cx = np.clip(np.floor((np.asarray(x) - self.origin_x) / self.cell_w), 0, self.cells - 1).astype(np.int64)
+        cy = np.clip(np.floor((np.asarray(y) - self.origin_y) / self.cell_h), 0, self.cells - 1).astype(np.int64)
+        return cx, cy
+
+    def query(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        """Indices (ascending) of features whose bbox intersects the query box."""
+        if not len(self.bounds):
+            return np.empty(0, dtype=np.int64)
+        (qx0, qx1), (qy0, qy1) = self._cell([min_x, max_x], [min_y, max_y])
+        slices = [
+            self.cell_items[self.cell_ptr[row * self.cells + qx0]:self.cell_ptr[row * self.cells + qx1 + 1]]
+            for row in range(qy0, qy1 + 1)
+        ]
+        candidates = np.unique(np.concatenate([*slices, self.overflow]))
+        box = self.bounds[candidates]
+        hit = (box[:, 0] <= max_x) & (box[:, 2] >= min_x) & (box[:, 1] <= max_y) & (box[:, 3] >= min_y)
+        return candidates[hit]
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: int
+    geo_json: EncodedBody
+    graph: EncodedBody
+    fragments: List[bytes]
+    index: GridIndex
+
+
+class NetworkGeoCache:
+    """
+    Pre-serialized network payloads for the map.
+
+    The GeoJSON FeatureCollection and the `/graph` listing are serialized once
+    per topology version and kept with gzip (and brotli, when installed)
+    variants and an ETag. A new topology version invalidates the snapshot,
+    which is rebuilt on the next request. Bounding-box requests reuse the
+    per-feature JSON fragments selected through a grid index instead of
+    re-serializing features.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._snapshot: _Snapshot | None = None
+
+    def snapshot(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.model.topology_version:
+            return snapshot
+        with self._lock:
+            # Version, graph and coordinates are taken together, so a reload in
+            # progress cannot get old data cached under the new version
+            version, graph, node_coords = self.model.topology_state()
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = self._build(version, graph, node_coords)
+            return self._snapshot
+
+    def _build(self, version: int, graph, node_coords) -> _Snapshot:
+        features = self.model.build_geo_json(graph, node_coords)["features"]
+        fragments = [_dumps(feature) for feature in features]
+        bounds = np.array([_feature_bounds(feature) for feature in features], dtype=np.float64).reshape(len(features), 4)
+        return _Snapshot(
+            version=version,
+            geo_json=EncodedBody.build(_collection(fragments), f"geo-{version}"),
+            graph=EncodedBody.build(
+                _dumps({"nodes": list(graph.nodes()), "edges": list(graph.edges())}), f"graph-{version}"
+            ),
+            fragments=fragments,
+            index=GridIndex(bounds),
+        )
+
+    def geo_json(self) -> EncodedBody:
+        return self.snapshot().geo_json
+
+    def graph(self) -> EncodedBody:
+        return self.snapshot().graph
+
+    def geo_json_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> Tuple[bytes, str]:
+        """Serialized FeatureCollection of features intersecting the box, and its ETag."""
+        snapshot = self.snapshot()
+        hits = snapshot.index.query(min_lon, min_lat, max_lon, max_lat)
+        body = _collection([snapshot.fragments[i] for i in hits.tolist()])
+        bbox = ",".join(repr(value) for value in (min_lon, min_lat, max_lon, max_lat))
+        tag = hashlib.sha1(bbox.encode("utf-8")).hexdigest()[:12]
+        return body, f'"geo-{snapshot.version}-{tag}-{hashlib.sha1(body).hexdigest()[:16]}"'
+
+
+def _collection(fragments: List[bytes]) -> bytes:
+    return _COLLECTION_PREFIX + b",".join(fragments) + _COLLECTION_SUFFIX
+
+
+def _feature_bounds(feature: dict) -> Tuple[float, float, float, float]:
+    geometry = feature["geometry"]
+    points = [geometry["coordinates"]] if geometry["type"] == "Point" else geometry["coordinates"]
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def negotiate_encoding(accept_encoding: str | None, available: Dict[str, bool]) -> str:
+    """Pick "br", "gzip" or "identity" from an Accept-Encoding header."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            accepted[token.lower()] = quality
+    for encoding in ("br", "gzip"):
+        if available.get(encoding) and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
@@ -1,11 +1,76 @@
-from pydantic import BaseModel
-from typing import List, Tuple
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional, Tuple
 
 class LocalizationRequest(BaseModel):
     # node_id -> pressure_reading
     node_pressures: dict[str, float]
+    # Number of ranked candidate segments to return
+    top_k: int = Field(1, ge=1, le=100)
+    # "gradient" compares per-segment drops with thresholds; "sensitivity"
+    # correlates the residual against baseline with precomputed leak signatures
+    mode: Literal["gradient", "sensitivity"] = "gradient"
+    # node_id -> leak-free pressure; defaults to the stored network baseline
+    baseline_pressures: Optional[dict[str, float]] = None
+
+class SegmentCandidate(BaseModel):
+    segment: Tuple[str, str]
+    pressure_drop: Optional[float] = None
+    deviation: Optional[float] = None
+    # Residual / signature correlation (sensitivity mode only)
+    correlation: Optional[float] = None
+    confidence: float
 
 class LocalizationResult(BaseModel):
     suspected_segment: Tuple[str, str] | None
     confidence: float
     analysis: str
+    candidates: List[SegmentCandidate] = []
+
+class BatchLocalizationRequest(BaseModel):
+    # Column order of `pressures`
+    node_ids: List[str]
+    # snapshots x nodes; null marks an unmeasured node
+    pressures: List[List[Optional[float]]]
+    top_k: int = Field(1, ge=1, le=100)
+    mode: Literal["gradient", "sensitivity"] = "gradient"
+    baseline_pressures: Optional[dict[str, float]] = None
+
+class BatchLocalizationResult(BaseModel):
+    """
+    Columnar candidates: entry i is the `rank[i]`-th candidate of snapshot
+    `snapshot[i]`, on segment `segments[segment[i]]`. Snapshots without a
+    candidate have no entries. `score` is the threshold deviation (gradient
+    mode) or the signature correlation (sensitivity mode).
+    """
+    mode: str
+    snapshot_count: int
+    segments: List[Tuple[str, str]]
+    snapshot: List[int]
+    rank: List[int]
+    segment: List[int]
+    score: List[float]
+    confidence: List[float]
+    # Gradient mode only
+    pressure_drop: Optional[List[float]] = None
+
+class NetworkNode(BaseModel):
+    id: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    # "junction", "reservoir" or "tank"; reservoirs and tanks are fixed-head sources
+    type: str = "junction"
+
+class NetworkSegment(BaseModel):
+    source: str
+    target: str
+    length: Optional[float] = None
+    # Normal pressure drop (bar); the engine default applies when omitted
+    drop_threshold: Optional[float] = None
+
+class BaselineUpdate(BaseModel):
+    # node_id -> leak-free pressure (bar) used by sensitivity localization
+    node_pressures: dict[str, float]
+
+class TopologyUpdate(BaseModel):
+    nodes: List[NetworkNode] = []
+    segments: List[NetworkSegment]
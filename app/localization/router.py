@@ -1,33 +1,161 @@
-from fastapi import APIRouter, HTTPException
-from .models import LocalizationRequest, LocalizationResult
+import gzip
+import networkx as nx
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import Response
+from .geo_cache import MIN_COMPRESS_BYTES, EncodedBody, NetworkGeoCache, brotli, etag_matches, negotiate_encoding
+from .models import BaselineUpdate, BatchLocalizationRequest, BatchLocalizationResult, LocalizationRequest, LocalizationResult, TopologyUpdate
 from .service import network_model
 
 router = APIRouter()
+geo_cache = NetworkGeoCache(network_model)
+
+def _cached_response(request: Request, body: EncodedBody) -> Response:
+    """Serve a pre-serialized body, honouring If-None-Match and Accept-Encoding."""
+    headers = {"ETag": body.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), body.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), {"br": body.br is not None, "gzip": True})
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    content = {"br": body.br, "gzip": body.gzip}.get(encoding, body.identity)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+def _bbox_response(request: Request, content: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if len(content) >= MIN_COMPRESS_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"), {"br": brotli is not None, "gzip": True})
+        if encoding == "br":
+            content = brotli.compress(content, quality=5)
+        elif encoding == "gzip":
+            content = gzip.compress(content, compresslevel=6)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
 
 @router.post("/analyze", response_model=LocalizationResult)
-async def analyze_network(request: LocalizationRequest):
+def analyze_network(request: LocalizationRequest):
     """
     Perform leak localization based on pressure readings from different nodes in the network.
     Expected nodes: Tank, A, B, C, D.
     """
     try:
-        return network_model.localize_leak(request.node_pressures)
+        return network_model.localize_leak(
+            request.node_pressures,
+            top_k=request.top_k,
+            mode=request.mode,
+            baseline=request.baseline_pressures,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/analyze/batch", response_model=BatchLocalizationResult)
+def analyze_network_batch(request: BatchLocalizationRequest):
+    """
+    Localize many pressure snapshots (rows of `pressures`, columns in
+    `node_ids` order) in a single vectorized pass. Candidates come back as
+    parallel arrays rather than one object per snapshot.
+    """
+    if any(len(row) != len(request.node_ids) for row in request.pressures):
+        raise HTTPException(status_code=400, detail="Every pressure row must have one value per node id")
+    try:
+        return network_model.localize_batch(
+            request.node_ids,
+            request.pressures,
+            top_k=request.top_k,
+            mode=request.mode,
+            baseline=request.baseline_pressures,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/baseline")
+async def replace_baseline(update: BaselineUpdate):
+    """
+    Replace the leak-free node pressures that sensitivity localization
+    measures residuals against.
+    """
+    matched = network_model.set_baseline(update.node_pressures)
+    return {"message": "Baseline updated", "node_count": len(update.node_pressures), "matched_nodes": matched}
+
 @router.get("/graph")
-async def get_network_graph():
+def get_network_graph(request: Request):
     """
     Returns the network topology (nodes and edges).
+    Served from a per-topology cache with ETag and gzip/br support.
     """
-    return {
-        "nodes": list(network_model.graph.nodes()),
-        "edges": list(network_model.graph.edges())
-    }
+    return _cached_response(request, geo_cache.graph())
 
 @router.get("/geo-json")
-async def get_network_geo_json():
+def get_network_geo_json(
+    request: Request,
+    bbox: str | None = Query(None, description="min_lon,min_lat,max_lon,max_lat; only features intersecting it are returned"),
+):
     """
     Returns the network topology in GeoJSON format.
+    Served from a per-topology cache with ETag and gzip/br support.
+    """
+    if bbox is None:
+        return _cached_response(request, geo_cache.geo_json())
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox minimums must not exceed maximums")
+    return _bbox_response(request, *geo_cache.geo_json_bbox(min_lon, min_lat, max_lon, max_lat))
+
+@router.get("/topology")
+async def get_topology_summary():
     """
-    return network_model.get_geo_json()
+    Returns the version and size of the compiled topology used for localization.
+    """
+    topology = network_model.engine.topology
+    return {
+        "version": topology.version,
+        "node_count": topology.node_count,
+        "edge_count": topology.edge_count,
+    }
+
+@router.put("/topology")
+def replace_topology(update: TopologyUpdate):
+    """
+    Replace the network topology at runtime; localization switches to the
+    new graph as soon as it has been compiled.
+    """
+    graph = nx.Graph()
+    node_coords = {}
+    for node in update.nodes:
+        graph.add_node(node.id, type=node.type)
+        if node.lat is not None and node.lon is not None:
+            node_coords[node.id] = [node.lat, node.lon]
+
+    drop_thresholds = {}
+    for segment in update.segments:
+        graph.add_edge(segment.source, segment.target, length=segment.length)
+        if segment.drop_threshold is not None:
+            drop_thresholds[(segment.source, segment.target)] = segment.drop_threshold
+
+    version = network_model.load_topology(graph, drop_thresholds, node_coords)
+    return {
+        "message": "Topology reloaded",
+        "version": version,
+        "node_count": graph.number_of_nodes(),
+        "edge_count": graph.number_of_edges(),
+    }
+
+@router.post("/topology/inp")
+def upload_inp_topology(file: UploadFile = File(...)):
+    """
+    Replace the network topology with an EPANET .inp file (JUNCTIONS,
+    RESERVOIRS, TANKS, PIPES and COORDINATES sections). Previously seen files
+    are served from the binary parse cache.
+    """
+    try:
+        summary = network_model.load_inp_stream(file.file)
+    except (ValueError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid .inp file: {e}")
+    return {"message": "Topology reloaded", **summary}
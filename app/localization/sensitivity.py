@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.sparse import coo_matrix, identity
+from scipy.sparse.linalg import splu
+
+from .engine import CompiledTopology, LocalizationEngine
+
+logger = logging.getLogger("sensitivity_localization")
+
+# Bump when the signature model changes so stale cached matrices are ignored
+SIGNATURE_FORMAT_VERSION = 1
+# Signatures are stored single-precision: correlation ranking does not need
+# more, and the mat-vec over the matrix is memory-bandwidth bound
+SIGNATURE_DTYPE = np.float32
+# Grounding added to every node so networks without a fixed-head node (or
+# with isolated parts) still give a non-singular system
+_GROUNDING = 1e-9
+
+
+@dataclass(frozen=True)
+class SignatureSet:
+    """
+    Leak signatures of every edge as seen by a fixed set of monitored nodes.
+
+    Row `e` of `matrix` is the pressure change (bar per unit leak flow) at each
+    monitored node caused by a leak at the midpoint of edge `e`. `normalized`
+    holds the same rows centered across nodes and scaled to unit length, so
+    correlating against a full residual vector is a single mat-vec product.
+    Both arrays are memory-mapped from the cache directory.
+    """
+    key: str
+    topology_version: int
+    sensor_ids: List[str]
+    sensor_position: Dict[str, int]
+    matrix: np.ndarray
+    normalized: np.ndarray
+
+
+def compute_signatures(topology: CompiledTopology, sensor_nodes: np.ndarray) -> np.ndarray:
+    """
+    Linear (steady-state, linearized-headloss) sensitivity of node pressures
+    to a leak on each edge, restricted to `sensor_nodes`.
+
+    With weighted Laplacian L over free (non fixed-head) nodes, a leak q at
+    node n changes pressures by -q L^-1 e_n. L is symmetric, so one sparse
+    LU factorization and one solve per monitored node give every edge's
+    signature: the average of its two endpoints' responses.
+    """
+    n = topology.node_count
+    free = ~topology.fixed
+    free_nodes = np.flatnonzero(free)
+    free_position = np.full(n, -1, dtype=np.int64)
+    free_position[free_nodes] = np.arange(len(free_nodes))
+
+    source, target, g = topology.source, topology.target, topology.conductance
+    laplacian = coo_matrix(
+        (np.concatenate([g, g, -g, -g]), (np.concatenate([source, target, source, target]), np.concatenate([source, target, target, source]))),
+        shape=(n, n),
+    ).tocsc()
+    reduced = laplacian[free_nodes][:, free_nodes]
+    scale = float(np.mean(g)) if len(g) else 1.0
+    system = (reduced + identity(len(free_nodes), format="csc") * (_GROUNDING * scale)).tocsc()
+
+    responses = np.zeros((n, len(sensor_nodes)))
+    free_sensors = np.flatnonzero(free[sensor_nodes])
+    if len(free_nodes) and len(free_sensors):
+        rhs = np.zeros((len(free_nodes), len(free_sensors)))
+        rhs[free_position[sensor_nodes[free_sensors]], np.arange(len(free_sensors))] = 1.0
+        solution = splu(system).solve(rhs)
+        responses[np.ix_(free_nodes, free_sensors)] = solution
+
+    return -(responses[source] + responses[target]) / 2.0
+
+
+def _center_normalize(matrix: np.ndarray) -> np.ndarray:
+    centered = matrix - matrix.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    return np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0).astype(SIGNATURE_DTYPE)
+
+
+class SensitivityLocalizer:
+    """
+    Ranks candidate edges by Pearson correlation between an observed
+    pressure residual (observed minus baseline, over monitored nodes) and
+    each edge's precomputed leak signature.
+
+    Signature sets are computed once per (topology, monitored nodes) pair,
+    saved as .npy files keyed by a hash of both, and served memory-mapped; a
+    few recent sets are kept open.
+    """
+
+    def __init__(self, cache_dir: Path, max_sensors: int = 2000, max_open_sets: int = 4):
+        self.cache_dir = Path(cache_dir)
+        self.max_sensors = max_sensors
+        self.max_open_sets = max_open_sets
+        self._lock = threading.Lock()
+        self._sets: "OrderedDict[str, SignatureSet]" = OrderedDict()
+        # (topology version, sensor ids) -> content key, to skip re-hashing the topology
+        self._keys: Dict[Tuple[int, Tuple[str, ...]], str] = {}
+
+    def signatures(self, topology: CompiledTopology, sensor_ids: List[str]) -> SignatureSet:
+        sensor_ids = sorted(node for node in sensor_ids if node in topology.node_index)
+        if len(sensor_ids) > self.max_sensors:
+            raise ValueError(f"At most {self.max_sensors} monitored nodes are supported, got {len(sensor_ids)}")
+        memo = (topology.version, tuple(sensor_ids))
+        key = self._keys.get(memo)
+        with self._lock:
+            if key is None:
+                key = self._key(topology, sensor_ids)
+                self._keys = {k: v for k, v in self._keys.items() if k[0] == topology.version}
+                self._keys[memo] = key
+            cached = self._sets.get(key)
+            if cached is not None:
+                self._sets.move_to_end(key)
+                return cached
+            signature_set = self._load_or_build(key, topology, sensor_ids)
+            self._sets[key] = signature_set
+            while len(self._sets) > self.max_open_sets:
+                self._sets.popitem(last=False)
+            return signature_set
+
+    def _load_or_build(self, key: str, topology: CompiledTopology, sensor_ids: List[str]) -> SignatureSet:
+        matrix_path = self.cache_dir / f"signatures-{key}.npy"
+        normalized_path = self.cache_dir / f"signatures-{key}-normalized.npy"
+        if not (matrix_path.exists() and normalized_path.exists()):
+            sensor_nodes = np.array([topology.node_index[node] for node in sensor_ids], dtype=np.int64)
+            matrix = compute_signatures(topology, sensor_nodes).astype(SIGNATURE_DTYPE)
+            try:
+                self._save(matrix_path, matrix)
+                self._save(normalized_path, _center_normalize(matrix))
+            except OSError as e:
+                logger.warning("Could not write signature cache %s: %s", matrix_path, e)
+                return SignatureSet(key, topology.version, sensor_ids, self._positions(sensor_ids), matrix, _center_normalize(matrix))
+        return SignatureSet(
+            key=key,
+            topology_version=topology.version,
+            sensor_ids=sensor_ids,
+            sensor_position=self._positions(sensor_ids),
+            matrix=np.load(matrix_path, mmap_mode="r"),
+            normalized=np.load(normalized_path, mmap_mode="r"),
+        )
+
+    def _save(self, path: Path, array: np.ndarray):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                np.save(handle, array)
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    @staticmethod
+    def _positions(sensor_ids: List[str]) -> Dict[str, int]:
+        return {node: i for i, node in enumerate(sensor_ids)}
+
+    @staticmethod
+    def _key(topology: CompiledTopology, sensor_ids: List[str]) -> str:
+        digest = hashlib.sha256(f"v{SIGNATURE_FORMAT_VERSION}".encode())
+        digest.update("\x00".join(topology.node_ids).encode("utf-8"))
+        for array in (topology.source, topology.target, topology.conductance, topology.fixed):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update("\x00".join(sensor_ids).encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    @staticmethod
+    def residuals(
+        signature_set: SignatureSet,
+        pressures: Dict[str, float],
+        baseline: Dict[str, float],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions, residuals) for monitored nodes present in both mappings."""
+        position = signature_set.sensor_position
+        observed = [(position[node], value - baseline[node]) for node, value in pressures.items() if node in position and node in baseline]
+        if not observed:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions, residual = zip(*observed)
+        return np.array(positions, dtype=np.int64), np.array(residual, dtype=np.float64)
+
+    @staticmethod
+    def correlate(signature_set: SignatureSet, positions: np.ndarray, residual: np.ndarray) -> np.ndarray:
+        """
+        Correlation of the residual with every edge's signature. `residual`
+        is (m,) or (snapshots, m) over the monitored nodes at `positions`.
+        """
+        centered = residual - residual.mean(axis=-1, keepdims=True)
+        norms = np.linalg.norm(centered, axis=-1, keepdims=True)
+        unit = np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0).astype(SIGNATURE_DTYPE)
+        if len(positions) == len(signature_set.sensor_ids) and np.array_equal(positions, np.arange(len(positions))):
+            return unit @ signature_set.normalized.T
+        return unit @ _center_normalize(np.asarray(signature_set.matrix[:, positions], dtype=np.float64)).T
+
+    def localize(
+        self,
+        topology: CompiledTopology,
+        pressures: Dict[str, float],
+        baseline: Dict[str, float],
+        k: int = 1,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(edge_indices, correlations) of the top-k positively correlated edges."""
+        signature_set = self.signatures(topology, list(baseline))
+        positions, residual = self.residuals(signature_set, pressures, baseline)
+        if len(positions) < 3:
+            raise ValueError("Sensitivity localization needs pressures and baselines for at least 3 monitored nodes")
+        order = np.argsort(positions)
+        scores = self.correlate(signature_set, positions[order], residual[order])
+        edges = LocalizationEngine.top_k(scores, k)
+        return edges, scores[edges]
+
+    def localize_batch(
+        self,
+        topology: CompiledTopology,
+        node_ids: List[str],
+        matrix: np.ndarray,
+        baseline: Dict[str, float],
+        k: int = 1,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        `localize` for every row of a (snapshots, len(node_ids)) pressure
+        matrix in one matrix product. Returns flat (rows, edge_indices,
+        correlations) ordered by snapshot, then rank.
+        """
+        signature_set = self.signatures(topology, list(baseline))
+        column_of = {node: column for column, node in enumerate(node_ids)}
+        monitored = [(position, column_of[node]) for node, position in signature_set.sensor_position.items() if node in column_of]
+        if len(monitored) < 3:
+            raise ValueError("Sensitivity localization needs pressures and baselines for at least 3 monitored nodes")
+        positions = np.array([position for position, _ in monitored], dtype=np.int64)
+        columns = np.array([column for _, column in monitored], dtype=np.int64)
+        reference = np.array([baseline[signature_set.sensor_ids[position]] for position in positions.tolist()])
+        residual = matrix[:, columns] - reference
+        if np.isnan(residual).any():
+            raise ValueError("Sensitivity localization needs a pressure for every monitored node in every snapshot")
+        scores = self.correlate(signature_set, positions, residual)
+        rows, edges = LocalizationEngine.top_k_rows(scores, k)
+        return rows, edges, scores[rows, edges]
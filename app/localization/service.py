@@ -1,13 +1,30 @@
+import os
+import threading
 import networkx as nx
-from typing import Dict, Tuple, List
-from .models import LocalizationResult
+import numpy as np
+from pathlib import Path
+from typing import BinaryIO, Dict, Tuple, List
+from .engine import LocalizationEngine
+from .epanet import NetworkDefinition, load_inp, load_network
+from .models import BatchLocalizationResult, LocalizationResult, SegmentCandidate
+from .sensitivity import SensitivityLocalizer
+
+# Optional EPANET network loaded at startup instead of the built-in demo network
+NETWORK_INP_PATH = os.getenv("NETWORK_INP_PATH")
+NETWORK_CACHE_DIR = Path(os.getenv("NETWORK_CACHE_DIR", "app/localization/cache"))
+SENSITIVITY_MAX_SENSORS = int(os.getenv("SENSITIVITY_MAX_SENSORS", "2000"))
 
 class WaterNetworkModel:
     def __init__(self):
-        self.graph = nx.Graph()
+        self._lock = threading.Lock()
+        # Set when the topology came from an EPANET file; the networkx graph and
+        # threshold dict are then derived on first use, since localization only
+        # needs the compiled arrays
+        self._network: NetworkDefinition | None = None
+        self._graph = nx.Graph()
         self._initialize_network()
         # Normal pressure drop thresholds per segment (heuristic)
-        self.drop_thresholds = {
+        self._drop_thresholds = {
             ("Tank", "A"): 0.5,
             ("A", "B"): 0.3,
             ("A", "C"): 0.3,
@@ -22,6 +39,100 @@ class WaterNetworkModel:
             "C": [18.5210, 73.8610],
             "D": [18.5195, 73.8635]
         }
+        # Leak-free pressures per monitored node, the reference for sensitivity
+        # localization residuals
+        self.baseline_pressures = {"Tank": 5.5, "A": 5.0, "B": 4.6, "C": 4.6, "D": 4.3}
+        self.engine = LocalizationEngine(self.graph, self.drop_thresholds)
+        self.sensitivity = SensitivityLocalizer(NETWORK_CACHE_DIR, max_sensors=SENSITIVITY_MAX_SENSORS)
+
+    @property
+    def graph(self) -> nx.Graph:
+        if self._graph is None:
+            with self._lock:
+                if self._graph is None:
+                    self._graph = self._network.to_graph()
+        return self._graph
+
+    @property
+    def drop_thresholds(self) -> Dict[Tuple[str, str], float]:
+        if self._drop_thresholds is None:
+            with self._lock:
+                if self._drop_thresholds is None:
+                    self._drop_thresholds = self._network.drop_thresholds()
+        return self._drop_thresholds
+
+    @property
+    def topology_version(self) -> int:
+        return self.engine.topology.version
+
+    def topology_state(self) -> Tuple[int, nx.Graph, Dict[str, List[float]]]:
+        """
+        The topology version with the graph and node coordinates of that same
+        version. Reloads bump the version before swapping the graph and
+        coordinates, so reading them separately can pair a new version with
+        old data; here all three are read under the reload lock.
+        """
+        with self._lock:
+            if self._graph is None:
+                self._graph = self._network.to_graph()
+            return self.topology_version, self._graph, self.node_coords
+
+    def load_topology(
+        self,
+        graph: nx.Graph,
+        drop_thresholds: Dict[Tuple[str, str], float],
+        node_coords: Dict[str, List[float]],
+    ) -> int:
+        """
+        Replace the network without restarting: compile the new graph first,
+        then swap graph, thresholds and coordinates. Returns the new topology version.
+        """
+        with self._lock:
+            topology = self.engine.load(graph, drop_thresholds)
+            self._network = None
+            self._graph = graph
+            self._drop_thresholds = drop_thresholds
+            self.node_coords = node_coords
+            self.baseline_pressures = {}
+        return topology.version
+
+    def load_network(self, network: NetworkDefinition) -> int:
+        """Replace the topology with a parsed EPANET network; returns the new version."""
+        node_coords = network.node_coords()
+        with self._lock:
+            topology = self.engine.load_arrays(
+                network.node_ids.tolist(), network.source, network.target, network.threshold,
+                conductance=network.conductance, fixed=network.fixed,
+            )
+            self._network = network
+            self._graph = None
+            self._drop_thresholds = None
+            self.node_coords = node_coords
+            self.baseline_pressures = {}
+        return topology.version
+
+    def set_baseline(self, pressures: Dict[str, float]) -> int:
+        """Replace the leak-free baseline; returns how many of its nodes are in the topology."""
+        self.baseline_pressures = dict(pressures)
+        node_index = self.engine.topology.node_index
+        return sum(1 for node in pressures if node in node_index)
+
+    def load_inp(self, path: str | Path) -> dict:
+        network, from_cache = load_inp(path, NETWORK_CACHE_DIR)
+        return self._loaded_summary(network, from_cache, self.load_network(network))
+
+    def load_inp_stream(self, stream: BinaryIO) -> dict:
+        network, from_cache = load_network(stream, NETWORK_CACHE_DIR)
+        return self._loaded_summary(network, from_cache, self.load_network(network))
+
+    @staticmethod
+    def _loaded_summary(network: NetworkDefinition, from_cache: bool, version: int) -> dict:
+        return {
+            "version": version,
+            "node_count": network.node_count,
+            "edge_count": network.pipe_count,
+            "from_cache": from_cache,
+        }
 
     def _initialize_network(self):
         """
@@ -31,42 +142,51 @@ class WaterNetworkModel:
         A -> C
         C -> D
         """
+        self.graph.add_node("Tank", type="tank")
         self.graph.add_edge("Tank", "A", length=100)
         self.graph.add_edge("A", "B", length=50)
         self.graph.add_edge("A", "C", length=80)
         self.graph.add_edge("C", "D", length=40)
 
-    def localize_leak(self, pressures: Dict[str, float]) -> LocalizationResult:
+    def localize_leak(
+        self,
+        pressures: Dict[str, float],
+        top_k: int = 1,
+        mode: str = "gradient",
+        baseline: Dict[str, float] | None = None,
+    ) -> LocalizationResult:
         """
         Analyzes pressure gradients to find anomalies.
         If the drop between two connected nodes exceeds the threshold,
-        a leak is likely on that segment.
+        a leak is likely on that segment. Segments are ranked by how far
+        their drop exceeds the threshold; the best `top_k` are returned.
+        With mode="sensitivity" segments are instead ranked by how well
+        their leak signature matches the residual against `baseline`.
         """
-        max_deviation = 0.0
-        suspected_edge = None
-        
-        for u, v in self.graph.edges():
-            if u in pressures and v in pressures:
-                # Calculate actual drop
-                # Assuming flow direction Tank -> A -> ...
-                # So P[u] should be > P[v]
-                actual_drop = pressures[u] - pressures[v]
-                
-                # Get threshold (handle bidirectional keys)
-                threshold = self.drop_thresholds.get((u, v)) or self.drop_thresholds.get((v, u), 0.5)
-                
-                deviation = actual_drop - threshold
-                if deviation > max_deviation:
-                    max_deviation = deviation
-                    suspected_edge = (u, v)
-
-        if suspected_edge:
-            # Heuristic confidence based on deviation magnitude
-            confidence = min(0.95, 0.5 + (max_deviation / 2.0))
+        if mode == "sensitivity":
+            return self._localize_by_sensitivity(pressures, top_k, baseline)
+
+        topology, edges, deviations = self.engine.localize(pressures, top_k)
+        drops = deviations + topology.threshold[edges]
+        # Heuristic confidence based on deviation magnitude
+        confidences = [round(min(0.95, 0.5 + (deviation / 2.0)), 2) for deviation in deviations.tolist()]
+        candidates = [
+            SegmentCandidate(
+                segment=topology.edge(edge),
+                pressure_drop=round(drop, 4),
+                deviation=round(deviation, 4),
+                confidence=confidence,
+            )
+            for edge, drop, deviation, confidence in zip(edges.tolist(), drops.tolist(), deviations.tolist(), confidences)
+        ]
+
+        if candidates:
+            best = candidates[0]
             return LocalizationResult(
-                suspected_segment=suspected_edge,
-                confidence=round(confidence, 2),
-                analysis=f"Significant pressure drop of {round(max_deviation + threshold, 2)} bar detected between {suspected_edge[0]} and {suspected_edge[1]}."
+                suspected_segment=best.segment,
+                confidence=best.confidence,
+                analysis=f"Significant pressure drop of {round(float(drops[0]), 2)} bar detected between {best.segment[0]} and {best.segment[1]}.",
+                candidates=candidates
             )
             
         return LocalizationResult(
@@ -75,14 +195,117 @@ class WaterNetworkModel:
             analysis="Pressure gradients appear normal across all modeled segments."
         )
 
+    def localize_from_sensors(self, sensor_pressures: Dict[str, float]) -> LocalizationResult:
+        """
+        Localize from live sensor pressures keyed by sensor id. Only sensors
+        whose id is a node of the loaded network count; residuals against the
+        baseline are used when at least 3 of them have one, pressure
+        gradients otherwise. Without node-level readings nothing is localized.
+        """
+        node_index = self.engine.topology.node_index
+        pressures = {node: value for node, value in sensor_pressures.items() if node in node_index}
+        baseline = self.baseline_pressures
+        if sum(1 for node in pressures if node in baseline) >= 3:
+            try:
+                return self._localize_by_sensitivity(pressures, 1, None)
+            except ValueError:
+                pass  # e.g. more monitored nodes than signatures are kept for
+        if len(pressures) >= 2:
+            return self.localize_leak(pressures)
+        return LocalizationResult(
+            suspected_segment=None,
+            confidence=0.0,
+            analysis="Not localized: fewer than two pressure sensors map to nodes of the loaded network."
+        )
+
+    def _localize_by_sensitivity(
+        self,
+        pressures: Dict[str, float],
+        top_k: int,
+        baseline: Dict[str, float] | None,
+    ) -> LocalizationResult:
+        topology = self.engine.topology
+        edges, correlations = self.sensitivity.localize(
+            topology, pressures, self.baseline_pressures if baseline is None else baseline, top_k
+        )
+        candidates = [
+            SegmentCandidate(
+                segment=topology.edge(edge),
+                correlation=round(correlation, 4),
+                confidence=round(min(0.95, correlation), 2),
+            )
+            for edge, correlation in zip(edges.tolist(), correlations.tolist())
+        ]
+
+        if candidates:
+            best = candidates[0]
+            return LocalizationResult(
+                suspected_segment=best.segment,
+                confidence=best.confidence,
+                analysis=f"Pressure residual pattern best matches a leak on {best.segment[0]}-{best.segment[1]} (correlation {best.correlation}).",
+                candidates=candidates
+            )
+
+        return LocalizationResult(
+            suspected_segment=None,
+            confidence=0.0,
+            analysis="Pressure residuals do not match any modeled leak signature."
+        )
+
+    def localize_batch(
+        self,
+        node_ids: List[str],
+        pressures: List[List[float | None]],
+        top_k: int = 1,
+        mode: str = "gradient",
+        baseline: Dict[str, float] | None = None,
+    ) -> BatchLocalizationResult:
+        """
+        Localize every snapshot (row) of a pressure matrix in one vectorized
+        pass; scores and confidences match `localize_leak` per snapshot.
+        """
+        matrix = np.array(pressures, dtype=np.float64).reshape(len(pressures), len(node_ids))
+        pressure_drop = None
+        if mode == "sensitivity":
+            topology = self.engine.topology
+            rows, edges, scores = self.sensitivity.localize_batch(
+                topology, node_ids, matrix, self.baseline_pressures if baseline is None else baseline, top_k
+            )
+            confidence = np.minimum(0.95, scores.astype(np.float64))
+        else:
+            topology, rows, edges, scores = self.engine.localize_batch(node_ids, matrix, top_k)
+            confidence = np.minimum(0.95, 0.5 + scores / 2.0)
+            pressure_drop = np.round(scores + topology.threshold[edges], 4).tolist()
+
+        # Rank within snapshot: rows are grouped, so subtract each group's start
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.empty(0, dtype=np.int64)
+        rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        distinct, segment = np.unique(edges, return_inverse=True)
+        return BatchLocalizationResult(
+            mode=mode,
+            snapshot_count=len(matrix),
+            segments=[topology.edge(edge) for edge in distinct.tolist()],
+            snapshot=rows.tolist(),
+            rank=rank.tolist(),
+            segment=segment.tolist(),
+            score=np.round(scores.astype(np.float64), 4).tolist(),
+            confidence=np.round(confidence, 2).tolist(),
+            pressure_drop=pressure_drop,
+        )
+
     def get_geo_json(self) -> dict:
         """
         Returns the network as a geo-aware structure for the frontend.
         """
+        _, graph, node_coords = self.topology_state()
+        return self.build_geo_json(graph, node_coords)
+
+    @staticmethod
+    def build_geo_json(graph: nx.Graph, node_coords: Dict[str, List[float]]) -> dict:
         features = []
         
         # Nodes as Points
-        for node, coords in self.node_coords.items():
+        for node, coords in node_coords.items():
             features.append({
                 "type": "Feature",
                 "geometry": {"type": "Point", "coordinates": [coords[1], coords[0]]},
@@ -90,14 +313,16 @@ class WaterNetworkModel:
             })
             
         # Edges as LineStrings
-        for u, v in self.graph.edges():
+        for u, v in graph.edges():
+            if u not in node_coords or v not in node_coords:
+                continue
             features.append({
                 "type": "Feature",
                 "geometry": {
                     "type": "LineString", 
                     "coordinates": [
-                        [self.node_coords[u][1], self.node_coords[u][0]],
-                        [self.node_coords[v][1], self.node_coords[v][0]]
+                        [node_coords[u][1], node_coords[u][0]],
+                        [node_coords[v][1], node_coords[v][0]]
                     ]
                 },
                 "properties": {"segment": f"{u}-{v}"}
@@ -1,7 +1,8 @@
 import asyncio
 from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from app.simulation.router import router as simulation_router
 from app.detection.router import router as detection_router
 from app.localization.router import router as localization_router
@@ -13,38 +14,31 @@ from app.image_detection.router import router as image_detection_router
 from app.water_quality.router import router as water_quality_router
 from app.infrastructure_health.router import router as infrastructure_health_router
 from app.chatbot.router import router as chatbot_router
+from app.monitoring.router import router as monitoring_router
 
 # Import services for background processing
 from app.simulation.service import simulator_engine
 from app.detection.service import detection_service
-from app.localization.service import network_model
+from app.detection.anomaly_detector import detector
+from app.detection.scheduler import detection_scheduler
+from app.localization.service import NETWORK_INP_PATH, network_model
 from app.alerts.manager import manager
+from app.cluster.leader import leader_election
 from app.notifications.service import notification_manager
 from app.water_quality.service import water_quality_service
 from app.water_quality.models import WaterQualityAssessmentInput
-from app.database.session import SessionLocal, engine, Base
-from app.models.db_models import LeakAlert, SensorReading, WaterQualityReadingRecord
+from app.analytics import rollups
+from app.analytics.archive import parquet_archive
+from app.telemetry.writer import telemetry_writer
+from app.executors.pool import ExecutorSaturatedError, db_executor, executors, notification_executor
+from app.database.session import SessionLocal, engine
+from app.database.schema import ensure_schema
+from app.database.retention import retention_engine
+from app.models.db_models import LeakAlert
 
 last_water_quality_alert_at: dict[str, datetime] = {}
 WATER_QUALITY_ALERT_COOLDOWN_SECONDS = 300
 
-def save_reading_to_db(reading):
-    db = SessionLocal()
-    try:
-        db_reading = SensorReading(
-            timestamp=reading.timestamp,
-            pressure=reading.pressure,
-            flow_rate=reading.flow_rate,
-            acoustic_signal=reading.acoustic_signal,
-            mode=reading.mode
-        )
-        db.add(db_reading)
-        db.commit()
-    except Exception as e:
-        print(f"Error saving reading to DB: {e}")
-    finally:
-        db.close()
-
 def save_alert_to_db(result, loc_result):
     db = SessionLocal()
     try:
@@ -58,7 +52,11 @@ def save_alert_to_db(result, loc_result):
             analysis=loc_result.analysis,
             avg_pressure=result.features.avg_pressure,
             avg_flow=result.features.avg_flow,
-            acoustic_peak=result.features.acoustic_peak
+            acoustic_peak=result.features.acoustic_peak,
+            sensor_id=result.sensor_id,
+            incident_status="open",
+            detection_count=1,
+            last_detected_at=result.timestamp
         )
         db.add(db_alert)
         db.commit()
@@ -70,76 +68,108 @@ def save_alert_to_db(result, loc_result):
     finally:
         db.close()
 
-def save_water_quality_to_db(reading):
+def update_incident_in_db(incident):
     db = SessionLocal()
     try:
-        db_reading = WaterQualityReadingRecord(
-            timestamp=reading.timestamp,
-            pipeline_id=reading.pipeline_id,
-            ph=reading.ph,
-            turbidity=reading.turbidity,
-            tds=reading.tds,
-            temperature=reading.temperature,
-            dissolved_oxygen=reading.dissolved_oxygen,
-            mode=reading.mode.value,
-        )
-        db.add(db_reading)
+        db_alert = db.query(LeakAlert).filter(LeakAlert.id == incident.alert_id).first()
+        if db_alert is None:
+            return None
+        db_alert.severity = incident.severity
+        db_alert.severity_score = incident.severity_score
+        db_alert.confidence = incident.confidence
+        db_alert.detection_count = incident.detection_count
+        db_alert.last_detected_at = incident.last_detected_at
+        if incident.closed_at is not None:
+            db_alert.incident_status = "closed"
+            db_alert.closed_at = incident.closed_at
         db.commit()
+        return db_alert.id
     except Exception as e:
-        print(f"Error saving water quality reading to DB: {e}")
+        print(f"Error updating incident in DB: {e}")
+        return None
     finally:
         db.close()
 
+async def handle_leak_result(result):
+    """
+    Localize, persist, broadcast and notify for a single leak detection.
+    Returns (alert id, location) of the stored alert.
+    """
+    # Localize from the sensors placed on network nodes (sensor id == node id)
+    loc_result = network_model.localize_from_sensors(detection_service.latest_pressures())
+    
+    # Save alert to DB
+    try:
+        saved_alert = await db_executor.run(save_alert_to_db, result, loc_result)
+    except ExecutorSaturatedError as e:
+        print(f"Error saving alert to DB: {e}")
+        saved_alert = None
+    
+    # Broadcast alert via WebSocket
+    location_str = f"{loc_result.suspected_segment[0]}-{loc_result.suspected_segment[1]}" if loc_result.suspected_segment else "Unknown"
+    alert_payload = {
+        "id": saved_alert.id if saved_alert else None,
+        "event": "LEAK_DETECTED",
+        "sensor_id": result.sensor_id,
+        "severity": result.severity,
+        "severity_score": result.severity_score,
+        "confidence": result.confidence,
+        "location": location_str,
+        "analysis": loc_result.analysis,
+        "timestamp": result.timestamp.isoformat()
+    }
+    await manager.broadcast(alert_payload)
+    
+    # Trigger External Notification (Email/SMS)
+    notification_executor.spawn(
+        notification_manager.send_leak_alert,
+        severity=result.severity,
+        location=str(loc_result.suspected_segment) if loc_result.suspected_segment else "Multiple Segments",
+        analysis=loc_result.analysis
+    )
+    return (saved_alert.id if saved_alert else None), location_str
+
+async def handle_incident_event(event):
+    """Open, escalate or resolve a leak incident; only openings notify externally."""
+    incident = event.incident
+    if event.kind == "opened":
+        incident.alert_id, incident.location = await handle_leak_result(event.result)
+        return
+
+    if incident.alert_id is not None:
+        try:
+            await db_executor.run(update_incident_in_db, incident)
+        except ExecutorSaturatedError as e:
+            print(f"Error updating incident in DB: {e}")
+
+    await manager.broadcast({
+        "id": incident.alert_id,
+        "event": "LEAK_UPDATED" if event.kind == "updated" else "LEAK_RESOLVED",
+        "sensor_id": incident.sensor_id,
+        "location": incident.location or "Unknown",
+        "severity": incident.severity,
+        "severity_score": incident.severity_score,
+        "confidence": incident.confidence,
+        "detection_count": incident.detection_count,
+        "opened_at": incident.opened_at.isoformat(),
+        "timestamp": (incident.closed_at or incident.last_detected_at).isoformat()
+    })
+
 async def sensor_data_collector():
     """Background task to collect data, run detection, and broadcast alerts."""
     while True:
         # 1. Generate new reading
         reading = simulator_engine.generate_next_reading()
         
-        # Save reading to DB (optional: might want to do this in batches if high frequency)
-        save_reading_to_db(reading)
+        # Queue reading for the next bulk write
+        telemetry_writer.enqueue_sensor_reading(reading)
         
-        # 2. Add to detection buffer
+        # 2. Add to detection windows (readings posted to /detection/ingest land here too)
         detection_service.add_reading(reading)
         
-        # 3. Periodically run detection (every 5 seconds to avoid noise)
-        if len(detection_service.buffer) >= 60:
-            result = detection_service.run_detection()
-            
-            if result and result.is_leak:
-                # 4. Attempt localization if leak detected
-                node_pressures = {
-                    "Tank": result.features.avg_pressure + 0.5,
-                    "A": result.features.avg_pressure,
-                    "B": result.features.avg_pressure - 0.4,
-                    "C": result.features.avg_pressure - 0.4,
-                    "D": result.features.avg_pressure - 0.7
-                }
-                loc_result = network_model.localize_leak(node_pressures)
-                
-                # Save alert to DB
-                saved_alert = save_alert_to_db(result, loc_result)
-                
-                # 5. Broadcast alert via WebSocket
-                location_str = f"{loc_result.suspected_segment[0]}-{loc_result.suspected_segment[1]}" if loc_result.suspected_segment else "Unknown"
-                alert_payload = {
-                    "id": saved_alert.id if saved_alert else None,
-                    "event": "LEAK_DETECTED",
-                    "severity": result.severity,
-                    "severity_score": result.severity_score,
-                    "confidence": result.confidence,
-                    "location": location_str,
-                    "analysis": loc_result.analysis,
-                    "timestamp": result.timestamp.isoformat()
-                }
-                await manager.broadcast(alert_payload)
-                
-                # 6. Trigger External Notification (Email/SMS)
-                notification_manager.send_leak_alert(
-                    severity=result.severity,
-                    location=str(loc_result.suspected_segment) if loc_result.suspected_segment else "Multiple Segments",
-                    analysis=loc_result.analysis
-                )
+        # 3. Score sensors whose hop is due and coalesce results into incidents
+        for event in detection_scheduler.run_due():
+            await handle_incident_event(event)
         
         await asyncio.sleep(1)
 
@@ -147,7 +177,7 @@ async def water_quality_data_collector():
     """Background task to generate and persist water quality readings every 5 seconds."""
     while True:
         reading = water_quality_service.generate_next_reading()
-        save_water_quality_to_db(reading)
+        telemetry_writer.enqueue_water_quality_reading(reading)
 
         payload = WaterQualityAssessmentInput(
             ph=reading.ph,
@@ -171,36 +201,106 @@ async def water_quality_data_collector():
                 last_sent is not None
                 and (now - last_sent).total_seconds() < WATER_QUALITY_ALERT_COOLDOWN_SECONDS
             )
+            alert_payload = water_quality_service.build_dashboard_alert(
+                prediction=prediction,
+                reasons=reasons,
+            )
 
+            # The dashboard is throttled here; SMS/email are coalesced by the digest engine
             if not is_in_cooldown:
-                alert_payload = water_quality_service.build_dashboard_alert(
-                    prediction=prediction,
-                    reasons=reasons,
-                )
                 await manager.broadcast(alert_payload)
-                notification_manager.send_water_quality_alert(
-                    severity=alert_payload["severity"],
-                    pipeline_id=alert_payload["location"],
-                    ai_prediction=alert_payload["ai_prediction"],
-                    wqi_score=alert_payload["wqi_score"],
-                    analysis=alert_payload["analysis"],
-                )
                 last_water_quality_alert_at[pipeline_key] = now
+            notification_executor.spawn(
+                notification_manager.send_water_quality_alert,
+                severity=alert_payload["severity"],
+                pipeline_id=alert_payload["location"],
+                ai_prediction=alert_payload["ai_prediction"],
+                wqi_score=alert_payload["wqi_score"],
+                analysis=alert_payload["analysis"],
+            )
 
         await asyncio.sleep(5)
 
+def _rebuild_rollups() -> int:
+    db = SessionLocal()
+    try:
+        return rollups.rebuild_if_empty(db)
+    finally:
+        db.close()
+
+async def run_collectors():
+    await asyncio.gather(sensor_data_collector(), water_quality_data_collector())
+
+async def run_leader_jobs():
+    """
+    Run the notification outbox drain and the archive and retention jobs in
+    the elected worker only; other workers keep serving HTTP and WebSocket
+    clients (and queueing emails) and take over if the leader exits.
+
+    The simulators/collectors also run only here when the alert pub/sub
+    backend is shared between workers (Redis). With the in-process backend an
+    alert only reaches the clients of the worker that broadcast it, so every
+    worker runs its own collectors instead (see lifespan).
+    """
+    await leader_election.wait_until_leader()
+    # Rollup tables added to an existing database start out empty
+    try:
+        rebuilt = await db_executor.run(_rebuild_rollups)
+        if rebuilt:
+            print(f"Rebuilt analytics rollups from {rebuilt} sensor readings")
+    except Exception as e:
+        print(f"Error rebuilding analytics rollups: {e}")
+    jobs = [notification_manager.outbox.run(), parquet_archive.run(), retention_engine.run()]
+    if manager.backend.shared:
+        print("Worker elected leader; starting collectors")
+        jobs.append(run_collectors())
+    else:
+        print("Worker elected leader; starting outbox, archive and retention jobs")
+    await asyncio.gather(*jobs)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize database tables
-    Base.metadata.create_all(bind=engine)
+    ensure_schema(engine)
+
+    # Load the configured EPANET network (cached parse after the first start)
+    if NETWORK_INP_PATH:
+        try:
+            loaded_network = await asyncio.to_thread(network_model.load_inp, NETWORK_INP_PATH)
+            print(f"Loaded network {NETWORK_INP_PATH}: {loaded_network}")
+        except Exception as e:
+            print(f"Error loading network {NETWORK_INP_PATH}: {e}")
+
+    # Warm-load the last trained detector so detection works immediately
+    try:
+        loaded = detector.load()
+        if loaded:
+            print(f"Loaded anomaly detector model v{loaded['version']}")
+    except Exception as e:
+        print(f"Error loading anomaly detector model: {e}")
     
-    # Start background collector
-    task = asyncio.create_task(sensor_data_collector())
-    quality_task = asyncio.create_task(water_quality_data_collector())
+    # Connect the alert pub/sub backend, then start background collectors
+    await manager.start()
+    writer_task = asyncio.create_task(telemetry_writer.run())
+    leader_task = asyncio.create_task(run_leader_jobs())
+    # Without a shared backend each worker's clients only see its own alerts
+    collectors_task = None if manager.backend.shared else asyncio.create_task(run_collectors())
+    # Every worker sends notifications, so every worker closes its digest windows
+    digest_task = asyncio.create_task(notification_manager.digest.run())
     yield
     # Cleanup
-    task.cancel()
-    quality_task.cancel()
+    tasks = [task for task in (leader_task, collectors_task, writer_task, digest_task) if task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    leader_election.release()
+    await manager.close()
+    # Persist whatever the collectors queued before shutdown
+    telemetry_writer.flush()
+    # Queue held digests; the outbox delivers them on the next start
+    notification_manager.digest.flush_all()
+    for executor in executors:
+        executor.shutdown(wait=True)
 
 app = FastAPI(
     title="Water Leak Detection API",
@@ -209,6 +309,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.exception_handler(ExecutorSaturatedError)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturatedError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon():
     from fastapi.responses import Response
@@ -235,6 +339,7 @@ app.include_router(water_quality_router, prefix="/api/v1/water-quality", tags=["
 app.include_router(water_quality_router, prefix="/water-quality", tags=["Water Quality"])
 app.include_router(infrastructure_health_router, prefix="/api/v1/infrastructure", tags=["Infrastructure Health"])
 app.include_router(chatbot_router, prefix="/api/v1/chatbot", tags=["Chatbot"])
+app.include_router(monitoring_router, prefix="/api/v1/monitoring", tags=["Monitoring"])
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel
+from app.database.pagination import keyset_page, set_next_cursor
 from app.database.session import get_db
 from app.models.db_models import MaintenanceTicket, LeakAlert
 from app.alerts.manager import manager
+from app.executors.pool import db_executor, notification_executor
 from app.notifications.service import notification_manager
 
 router = APIRouter()
@@ -19,8 +21,7 @@ class TicketUpdate(BaseModel):
     status: str # In Progress, Resolved
     notes: Optional[str] = None
 
-@router.post("/")
-async def create_ticket(ticket: TicketCreate, db: Session = Depends(get_db)):
+def _create_ticket(db: Session, ticket: TicketCreate):
     db_alert = db.query(LeakAlert).filter(LeakAlert.id == ticket.alert_id).first()
     if not db_alert:
         raise HTTPException(status_code=404, detail="Referenced alert not found")
@@ -45,12 +46,34 @@ async def create_ticket(ticket: TicketCreate, db: Session = Depends(get_db)):
     db.refresh(db_ticket)
     return db_ticket
 
+@router.post("/")
+async def create_ticket(ticket: TicketCreate, db: Session = Depends(get_db)):
+    return await db_executor.run(_create_ticket, db, ticket)
+
+def _list_tickets(db: Session, limit: int, cursor, start, end):
+    return keyset_page(
+        db.query(MaintenanceTicket), MaintenanceTicket, limit, cursor, start, end, time_column="created_at"
+    )
+
 @router.get("/")
-async def get_tickets(db: Session = Depends(get_db)):
-    return db.query(MaintenanceTicket).all()
+async def get_tickets(
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: Session = Depends(get_db),
+):
+    """
+    List tickets, newest first; `start`/`end` filter on creation time. Pass the
+    X-Next-Cursor response header back as `cursor` for the next page.
+    """
+    tickets, next_cursor = await db_executor.run(_list_tickets, db, limit, cursor, start, end)
+    set_next_cursor(response, next_cursor)
+    return tickets
 
-@router.patch("/{ticket_id}")
-async def update_ticket(ticket_id: int, update: TicketUpdate, db: Session = Depends(get_db)):
+def _update_ticket(db: Session, ticket_id: int, update: TicketUpdate):
+    """Apply the update; returns the ticket and, when resolved, the alert location."""
     db_ticket = db.query(MaintenanceTicket).filter(MaintenanceTicket.id == ticket_id).first()
     if not db_ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
@@ -63,7 +86,9 @@ async def update_ticket(ticket_id: int, update: TicketUpdate, db: Session = Depe
         db_ticket.resolved_at = datetime.utcnow()
     
     db.commit()
+    db.refresh(db_ticket)
 
+    location = None
     if update.status == "Resolved":
         related_alert = (
             db.query(LeakAlert)
@@ -71,6 +96,13 @@ async def update_ticket(ticket_id: int, update: TicketUpdate, db: Session = Depe
             .first()
         )
         location = related_alert.location if related_alert else "Unknown"
+    return db_ticket, location
+
+@router.patch("/{ticket_id}")
+async def update_ticket(ticket_id: int, update: TicketUpdate, db: Session = Depends(get_db)):
+    db_ticket, location = await db_executor.run(_update_ticket, db, ticket_id, update)
+
+    if update.status == "Resolved":
         analysis = (
             f"Maintenance ticket #{db_ticket.id} resolved for location {location}. "
             f"Notes: {db_ticket.notes or 'No notes'}"
@@ -86,7 +118,8 @@ async def update_ticket(ticket_id: int, update: TicketUpdate, db: Session = Depe
             "timestamp": datetime.utcnow().isoformat(),
         }
         await manager.broadcast(resolved_payload)
-        notification_manager.send_issue_resolved_alert(
+        notification_executor.spawn(
+            notification_manager.send_issue_resolved_alert,
             ticket_id=db_ticket.id,
             location=location,
             notes=db_ticket.notes,
@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.session import Base
 
 class LeakAlert(Base):
     __tablename__ = "leak_alerts"
+    # Keyset pagination of the history endpoints (app.database.pagination)
+    __table_args__ = (Index("ix_leak_alerts_timestamp_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.now, index=True)
@@ -19,9 +21,18 @@ class LeakAlert(Base):
     avg_pressure = Column(Float)
     avg_flow = Column(Float)
     acoustic_peak = Column(Float)
+    sensor_id = Column(String, index=True, nullable=True)
+
+    # Incident lifecycle for live alerts: one row per leak event, kept open
+    # while detections continue and closed once the sensor reads clear
+    incident_status = Column(String, nullable=True) # "open", "closed"
+    detection_count = Column(Integer, nullable=True)
+    last_detected_at = Column(DateTime, nullable=True)
+    closed_at = Column(DateTime, nullable=True)
 
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
+    __table_args__ = (Index("ix_sensor_readings_timestamp_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.now, index=True)
@@ -29,9 +40,11 @@ class SensorReading(Base):
     flow_rate = Column(Float)
     acoustic_signal = Column(Float)
     mode = Column(String) # Simulation mode at time of reading
+    sensor_id = Column(String, index=True, nullable=True)
 
 class MaintenanceTicket(Base):
     __tablename__ = "maintenance_tickets"
+    __table_args__ = (Index("ix_maintenance_tickets_created_at_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     alert_id = Column(Integer, ForeignKey("leak_alerts.id"))
@@ -56,6 +69,7 @@ class User(Base):
 
 class LeakImagePrediction(Base):
     __tablename__ = "leak_image_predictions"
+    __table_args__ = (Index("ix_leak_image_predictions_timestamp_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
@@ -69,6 +83,7 @@ class LeakImagePrediction(Base):
 
 class WaterQualityReadingRecord(Base):
     __tablename__ = "water_quality_readings"
+    __table_args__ = (Index("ix_water_quality_readings_timestamp_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
@@ -79,3 +94,79 @@ class WaterQualityReadingRecord(Base):
     temperature = Column(Float, nullable=False)
     dissolved_oxygen = Column(Float, nullable=False)
     mode = Column(String, nullable=False)
+
+
+class BackfillCheckpoint(Base):
+    __tablename__ = "backfill_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String, unique=True, index=True, nullable=False)
+    status = Column(String, default="running") # running, completed, failed
+    range_start = Column(DateTime, nullable=True)
+    range_end = Column(DateTime, nullable=True)
+    window_size = Column(Integer, nullable=False)
+    step = Column(Integer, nullable=False)
+    # Keyset position of the last reading whose windows have been scored
+    last_timestamp = Column(DateTime, nullable=True)
+    last_reading_id = Column(Integer, nullable=True)
+    rows_processed = Column(Integer, default=0)
+    windows_scored = Column(Integer, default=0)
+    alerts_written = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class OutboxMessage(Base):
+    __tablename__ = "notification_outbox"
+    __table_args__ = (Index("ix_notification_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+    channel = Column(String, default="email", nullable=False)
+    sender = Column(String, nullable=False)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, default="pending", nullable=False) # pending, sent, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.now, nullable=False)
+    last_error = Column(String, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class _SensorRollupColumns:
+    """Per-(bucket, mode) aggregates of sensor_readings, shared by every rollup resolution."""
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False) # Start of the minute/hour/day
+    mode = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    pressure_sum = Column(Float, nullable=False, default=0.0)
+    pressure_min = Column(Float, nullable=True)
+    pressure_max = Column(Float, nullable=True)
+    pressure_sumsq = Column(Float, nullable=False, default=0.0)
+    flow_rate_sum = Column(Float, nullable=False, default=0.0)
+    flow_rate_min = Column(Float, nullable=True)
+    flow_rate_max = Column(Float, nullable=True)
+    flow_rate_sumsq = Column(Float, nullable=False, default=0.0)
+    acoustic_signal_sum = Column(Float, nullable=False, default=0.0)
+    acoustic_signal_min = Column(Float, nullable=True)
+    acoustic_signal_max = Column(Float, nullable=True)
+    acoustic_signal_sumsq = Column(Float, nullable=False, default=0.0)
+    # Estimated water lost during the bucket (see app.analytics.rollups.water_loss_liters)
+    loss_liters = Column(Float, nullable=False, default=0.0)
+
+
+class SensorRollupMinute(_SensorRollupColumns, Base):
+    __tablename__ = "sensor_rollups_minute"
+    __table_args__ = (Index("ux_sensor_rollups_minute_bucket_mode", "bucket", "mode", unique=True),)
+
+
+class SensorRollupHour(_SensorRollupColumns, Base):
+    __tablename__ = "sensor_rollups_hour"
+    __table_args__ = (Index("ux_sensor_rollups_hour_bucket_mode", "bucket", "mode", unique=True),)
+
+
+class SensorRollupDay(_SensorRollupColumns, Base):
+    __tablename__ = "sensor_rollups_day"
+    __table_args__ = (Index("ux_sensor_rollups_day_bucket_mode", "bucket", "mode", unique=True),)
@@ -0,0 +1 @@
+"""Operational metrics for background subsystems."""
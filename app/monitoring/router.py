@@ -0,0 +1,83 @@
+from fastapi import APIRouter
+from app.alerts.manager import manager
+from app.analytics.archive import parquet_archive
+from app.cluster.leader import leader_election
+from app.database.retention import retention_engine
+from app.detection.scheduler import detection_scheduler
+from app.executors.pool import executors
+from app.notifications.service import notification_manager
+from app.telemetry.writer import telemetry_writer
+
+router = APIRouter()
+
+
+@router.get("/telemetry-writer")
+async def get_telemetry_writer_stats():
+    """
+    Buffer depth, throughput and backpressure counters of the telemetry write-behind buffer.
+    """
+    return telemetry_writer.stats()
+
+
+@router.get("/executors")
+async def get_executor_stats():
+    """
+    Saturation, queue depth and latency of the blocking I/O thread pools.
+    """
+    return {executor.name: executor.stats() for executor in executors}
+
+
+@router.get("/detection-scheduler")
+async def get_detection_scheduler_stats():
+    """
+    Window/hop configuration, evaluation counts and incident transitions of the detection scheduler.
+    """
+    return detection_scheduler.stats()
+
+
+@router.get("/alert-hub")
+async def get_alert_hub_stats():
+    """
+    Connections, per-client queue depth, drops and send latency of the alerts WebSocket hub.
+    """
+    return manager.stats()
+
+
+@router.get("/leader")
+async def get_leader_stats():
+    """
+    Whether this worker holds the leadership lock for the background jobs.
+    """
+    return leader_election.stats()
+
+
+@router.get("/notification-outbox")
+def get_notification_outbox_stats():
+    """
+    Delivery counters of the email outbox worker and row counts per status.
+    """
+    return {**notification_manager.outbox.stats(), "rows": notification_manager.outbox.pending_counts()}
+
+
+@router.get("/notification-digest")
+async def get_notification_digest_stats():
+    """
+    Open digest windows, held alerts and coalescing counters.
+    """
+    return notification_manager.digest.stats()
+
+
+@router.get("/archive")
+def get_archive_stats():
+    """
+    Rows moved to Parquet by the archive job, and archived partitions per table.
+    """
+    return parquet_archive.stats()
+
+
+@router.get("/retention")
+async def get_retention_stats():
+    """
+    Rows pruned (and archived) per table by the retention job.
+    """
+    return retention_engine.stats()
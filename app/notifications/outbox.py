@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+
+from sqlalchemy import func
+
+from app.database.session import SessionLocal
+from app.executors.pool import ExecutorSaturatedError, notification_executor
+from app.models.db_models import OutboxMessage
+
+logger = logging.getLogger("leak_notifications")
+
+
+class SmtpSessionError(Exception):
+    """Connecting, STARTTLS or login failed; no message can go out until it succeeds."""
+
+
+class SmtpConnection:
+    """
+    One SMTP session reused across messages. It connects lazily, reconnects
+    once when the server has dropped an idle session, and is closed after
+    `idle_timeout` seconds without use. STARTTLS and login are skipped when
+    disabled or when no user is configured, so a plain local SMTP stand-in
+    works too.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str | None = None,
+        password: str | None = None,
+        starttls: bool = True,
+        timeout: float = 20.0,
+        idle_timeout: float = 60.0,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._server: smtplib.SMTP | None = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        # A 5xx greeting or a rejected login says nothing about the message
+        # being sent, so it surfaces as SmtpSessionError rather than as an
+        # SMTPResponseException that would fail the message
+        try:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        except (OSError, smtplib.SMTPException) as exc:
+            raise SmtpSessionError(f"connect to {self.host}:{self.port} failed: {exc}") from exc
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except (OSError, smtplib.SMTPException) as exc:
+            server.close()
+            raise SmtpSessionError(f"SMTP session setup failed: {exc}") from exc
+        self.connects += 1
+        return server
+
+    def send(self, msg: MIMEText):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Server closed the idle session; one fresh session per message at most
+            self._server = self._connect()
+            self._server.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+
+class NotificationOutbox:
+    """
+    Durable queue of outgoing emails in the `notification_outbox` table.
+
+    `enqueue` only inserts a row, so alert handling never waits on SMTP. A
+    single drain loop claims due rows in batches of `batch_size`, sends them
+    over one persistent SMTP connection and records every outcome in one
+    commit per batch. Failed sends are retried with exponential backoff
+    (`base_backoff` doubling up to `max_backoff`, with jitter); permanent
+    (5xx) rejections and rows that reach `max_attempts` are marked failed.
+    When the server is unreachable or refuses the session (greeting,
+    STARTTLS or login), the rest of the batch is deferred instead, backing
+    off per consecutive outage without using up the messages' attempts.
+    Delivery is at-least-once: a crash between sending and the commit
+    resends that batch.
+    """
+
+    def __init__(
+        self,
+        connection: SmtpConnection,
+        batch_size: int = 50,
+        poll_interval: float = 5.0,
+        max_attempts: int = 6,
+        base_backoff: float = 10.0,
+        max_backoff: float = 900.0,
+    ):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._drain_lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._running = False
+
+        self._enqueued = 0
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+        self._deferred = 0
+        self._connection_failures = 0
+        self._batches = 0
+        self._last_drain_at: float | None = None
+        self._last_drain_seconds = 0.0
+
+    def enqueue(self, recipient: str, subject: str, body: str, sender: str) -> int:
+        """Store a message for delivery; safe to call from any thread."""
+        db = SessionLocal()
+        try:
+            row = OutboxMessage(
+                sender=sender,
+                recipient=recipient,
+                subject=subject,
+                body=body,
+                next_attempt_at=datetime.now(),
+            )
+            db.add(row)
+            db.commit()
+            row_id = row.id
+        finally:
+            db.close()
+        self._enqueued += 1
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return row_id
+
+    @staticmethod
+    def _message(row: OutboxMessage) -> MIMEText:
+        msg = MIMEText(row.body, _charset="utf-8")
+        msg["Subject"] = row.subject
+        msg["From"] = row.sender
+        msg["To"] = row.recipient
+        return msg
+
+    def _backoff(self, attempts: int) -> timedelta:
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def drain_once(self) -> int:
+        """Send one batch of due messages; returns how many rows were processed."""
+        with self._drain_lock:
+            started = time.perf_counter()
+            db = SessionLocal()
+            try:
+                now = datetime.now()
+                rows = (
+                    db.query(OutboxMessage)
+                    .filter(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+                    .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not rows:
+                    return 0
+
+                connection_error = None
+                deferred = 0
+                for row in rows:
+                    if connection_error is None:
+                        try:
+                            self.connection.send(self._message(row))
+                        except SmtpSessionError as exc:
+                            connection_error = exc
+                            self._connection_failures += 1
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as exc:
+                            code = getattr(exc, "smtp_code", None)
+                            permanent = isinstance(exc, smtplib.SMTPRecipientsRefused) or (code is not None and 500 <= code < 600)
+                            self._record_failure(row, exc, now, permanent)
+                            continue
+                        except (OSError, smtplib.SMTPException) as exc:
+                            # Connection-level failure: nothing else in this batch can go out
+                            connection_error = exc
+                            self._connection_failures += 1
+                            self.connection.close()
+                        else:
+                            row.status = "sent"
+                            row.sent_at = datetime.now()
+                            row.attempts += 1
+                            row.last_error = None
+                            self._sent += 1
+                            continue
+                    self._defer(row, connection_error, now)
+                    deferred += 1
+
+                db.commit()
+                if connection_error is not None:
+                    logger.error("SMTP unavailable, %s emails deferred: %s", deferred, connection_error)
+                else:
+                    self._connection_failures = 0
+                self._batches += 1
+                self._last_drain_at = time.time()
+                self._last_drain_seconds = time.perf_counter() - started
+                return len(rows)
+            finally:
+                db.close()
+
+    def _defer(self, row: OutboxMessage, exc: Exception, now: datetime):
+        """Retry after the outage backoff; the message itself has not failed."""
+        row.last_error = str(exc)[:500]
+        row.next_attempt_at = now + self._backoff(self._connection_failures)
+        self._deferred += 1
+
+    def _record_failure(self, row: OutboxMessage, exc: Exception, now: datetime, permanent: bool):
+        row.attempts += 1
+        row.last_error = str(exc)[:500]
+        if permanent or row.attempts >= self.max_attempts:
+            row.status = "failed"
+            self._failed += 1
+            logger.error("Email #%s to %s failed permanently: %s", row.id, row.recipient, exc)
+        else:
+            row.next_attempt_at = now + self._backoff(row.attempts)
+            self._retried += 1
+
+    async def run(self):
+        """Drain loop; wakes when a message is enqueued or after `poll_interval`."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._running = True
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    # Keep draining while full batches come back
+                    while await notification_executor.run(self.drain_once) >= self.batch_size:
+                        pass
+                except ExecutorSaturatedError as exc:
+                    logger.warning("Notification drain deferred: %s", exc)
+                except Exception as exc:
+                    logger.error("Notification drain failed: %s", exc)
+        finally:
+            self._running = False
+            self._wakeup = None
+            self._loop = None
+            self.connection.close()
+
+    def pending_counts(self) -> dict:
+        db = SessionLocal()
+        try:
+            return dict(
+                db.query(OutboxMessage.status, func.count(OutboxMessage.id))
+                .group_by(OutboxMessage.status)
+                .all()
+            )
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "batch_size": self.batch_size,
+            "poll_interval_seconds": self.poll_interval,
+            "max_attempts": self.max_attempts,
+            "enqueued": self._enqueued,
+            "sent": self._sent,
+            "retried": self._retried,
+            "failed": self._failed,
+            "deferred": self._deferred,
+            "consecutive_connection_failures": self._connection_failures,
+            "batches": self._batches,
+            "smtp_connects": self.connection.connects,
+            "last_drain_at": self._last_drain_at,
+            "last_drain_seconds": round(self._last_drain_seconds, 6),
+        }
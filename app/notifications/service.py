@@ -1,10 +1,17 @@
+import asyncio
 import logging
 import os
-import smtplib
-from email.mime.text import MIMEText
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
 
 from dotenv import load_dotenv
 
+from app.executors.pool import ExecutorSaturatedError, notification_executor
+from app.notifications.outbox import NotificationOutbox, SmtpConnection
+
 load_dotenv()
 
 # Configure logging for notifications
@@ -18,11 +25,183 @@ if not logger.handlers:
     logger.addHandler(handler)
 
 
+@dataclass
+class _DigestEntry:
+    message: str
+    count: int
+    first_at: datetime
+    last_at: datetime
+    # Occurrences already delivered (as the immediate message or an earlier digest)
+    delivered: int = 0
+
+
+@dataclass
+class _DigestWindow:
+    subject: str
+    opened_at: float
+    entries: Dict[str, _DigestEntry] = field(default_factory=dict)
+
+    @property
+    def undelivered(self) -> int:
+        return sum(entry.count - entry.delivered for entry in self.entries.values())
+
+
+class DigestEngine:
+    """
+    Coalesces notifications per (channel, recipient, location).
+
+    The first message for a key is delivered at once and opens a window of
+    `window` seconds. Messages arriving inside the window are held;
+    identical message texts are counted rather than repeated. When the
+    window ends, everything held is delivered as one summary, which opens
+    the next window, so a sustained storm costs one message per window per
+    key. A window that ends with nothing held is dropped, and the next
+    message is again delivered at once.
+    """
+
+    def __init__(self, window: float, deliver: Callable[[str, str, str, str], None], max_listed: int = 20):
+        self.window = window
+        self.deliver = deliver
+        self.max_listed = max_listed
+        self._lock = threading.Lock()
+        self._windows: Dict[Tuple[str, str, str], _DigestWindow] = {}
+        self._submitted = 0
+        self._immediate = 0
+        self._coalesced = 0
+        self._deduplicated = 0
+        self._digests = 0
+
+    def submit(self, channel: str, recipient: str, location: str, subject: str, message: str) -> bool:
+        """Deliver or hold one message; returns True if it was delivered immediately."""
+        key = (channel, recipient, location)
+        now = time.monotonic()
+        stamp = datetime.now()
+        outgoing: List[Tuple[str, str, str, str]] = []
+        with self._lock:
+            self._submitted += 1
+            window = self._windows.get(key)
+            if window is not None and now - window.opened_at >= self.window:
+                outgoing.extend(self._close_locked(key, window, now))
+                window = self._windows.get(key)
+
+            if window is None:
+                window = self._windows[key] = _DigestWindow(subject=subject, opened_at=now)
+                window.entries[message] = _DigestEntry(message, 1, stamp, stamp, delivered=1)
+                self._immediate += 1
+                outgoing.append((channel, recipient, subject, message))
+                immediate = True
+            else:
+                entry = window.entries.get(message)
+                if entry is None:
+                    window.entries[message] = _DigestEntry(message, 1, stamp, stamp)
+                else:
+                    entry.count += 1
+                    entry.last_at = stamp
+                    self._deduplicated += 1
+                self._coalesced += 1
+                immediate = False
+
+        self._deliver_all(outgoing)
+        return immediate
+
+    def flush_due(self) -> int:
+        """Close every window that has ended; returns the number of digests delivered."""
+        now = time.monotonic()
+        with self._lock:
+            outgoing = []
+            for key, window in list(self._windows.items()):
+                if now - window.opened_at >= self.window:
+                    outgoing.extend(self._close_locked(key, window, now))
+        self._deliver_all(outgoing)
+        return len(outgoing)
+
+    def flush_all(self) -> int:
+        """Deliver everything held, regardless of window age (shutdown)."""
+        with self._lock:
+            outgoing = []
+            for key, window in list(self._windows.items()):
+                outgoing.extend(self._close_locked(key, window, time.monotonic(), reopen=False))
+        self._deliver_all(outgoing)
+        return len(outgoing)
+
+    def _close_locked(self, key, window: _DigestWindow, now: float, reopen: bool = True) -> List[Tuple[str, str, str, str]]:
+        held = window.undelivered
+        if not held:
+            del self._windows[key]
+            return []
+        channel, recipient, location = key
+        subject = f"LeakWatch AI Alert Digest: {location} ({held} alert{'s' if held != 1 else ''})"
+        body = self._summarize(location, window)
+        for entry in window.entries.values():
+            entry.delivered = entry.count
+        if reopen:
+            # Messages already summarized stay known, so repeats keep being counted
+            window.opened_at = now
+        else:
+            del self._windows[key]
+        self._digests += 1
+        return [(channel, recipient, subject, body)]
+
+    def _summarize(self, location: str, window: _DigestWindow) -> str:
+        pending = [entry for entry in window.entries.values() if entry.count > entry.delivered]
+        pending.sort(key=lambda entry: entry.first_at)
+        held = sum(entry.count - entry.delivered for entry in pending)
+        lines = [
+            f"{held} alert{'s' if held != 1 else ''} for {location} "
+            f"({len(pending)} distinct) in the last {int(self.window)}s:",
+        ]
+        for entry in pending[:self.max_listed]:
+            new = entry.count - entry.delivered
+            repeat = "Repeated" if entry.delivered else "Seen"
+            lines.append("")
+            lines.append(
+                f"- {repeat} x{new}, {entry.first_at:%Y-%m-%d %H:%M:%S} to {entry.last_at:%H:%M:%S}"
+                if new > 1 else f"- {repeat} once at {entry.last_at:%Y-%m-%d %H:%M:%S}"
+            )
+            lines.extend(f"  {line}" for line in entry.message.splitlines())
+        if len(pending) > self.max_listed:
+            lines.append("")
+            lines.append(f"... and {len(pending) - self.max_listed} more distinct alerts.")
+        return "\n".join(lines)
+
+    def _deliver_all(self, outgoing: List[Tuple[str, str, str, str]]):
+        for channel, recipient, subject, body in outgoing:
+            try:
+                self.deliver(channel, recipient, subject, body)
+            except Exception as exc:
+                logger.error("Failed to deliver %s notification to %s: %s", channel, recipient, exc)
+
+    async def run(self, interval: float | None = None):
+        """Close ended windows periodically."""
+        interval = interval or max(1.0, min(self.window / 4, 15.0))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await notification_executor.run(self.flush_due)
+            except ExecutorSaturatedError as exc:
+                logger.warning("Digest flush deferred: %s", exc)
+            except Exception as exc:
+                logger.error("Digest flush failed: %s", exc)
+
+    def stats(self) -> dict:
+        with self._lock:
+            open_windows = len(self._windows)
+            held = sum(window.undelivered for window in self._windows.values())
+        return {
+            "window_seconds": self.window,
+            "open_windows": open_windows,
+            "held": held,
+            "submitted": self._submitted,
+            "delivered_immediately": self._immediate,
+            "coalesced": self._coalesced,
+            "deduplicated": self._deduplicated,
+            "digests_sent": self._digests,
+        }
+
+
 class NotificationManager:
     def __init__(self):
         self.notification_enabled = True
-        self.max_leak_email_sends = int(os.getenv("LEAK_EMAIL_MAX_SENDS", "5"))
-        self._leak_email_send_count = 0
         self.alert_email = os.getenv("ALERT_EMAIL", "")
         self.alert_phone = os.getenv("ALERT_PHONE", "+1234567890")
 
@@ -32,6 +211,30 @@ class NotificationManager:
         self.smtp_user = os.getenv("SMTP_USER")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         self.smtp_from = os.getenv("SMTP_FROM") or self.smtp_user or "alerts@leakwatch.ai"
+        # STARTTLS and login can be disabled for a local SMTP stand-in
+        self.smtp_starttls = os.getenv("SMTP_STARTTLS", "true").lower() not in ("0", "false", "no")
+        self.smtp_login = os.getenv("SMTP_LOGIN", "true").lower() not in ("0", "false", "no")
+
+        # Emails go through a durable outbox drained by an async worker
+        self.outbox = NotificationOutbox(
+            SmtpConnection(
+                self.smtp_server,
+                self.smtp_port,
+                user=self.smtp_user if self.smtp_login else None,
+                password=self.smtp_password if self.smtp_login else None,
+                starttls=self.smtp_starttls,
+                idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", "60")),
+            ),
+            batch_size=int(os.getenv("NOTIFICATION_OUTBOX_BATCH_SIZE", "50")),
+            poll_interval=float(os.getenv("NOTIFICATION_OUTBOX_POLL_SECONDS", "5")),
+            max_attempts=int(os.getenv("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", "6")),
+            base_backoff=float(os.getenv("NOTIFICATION_OUTBOX_BACKOFF_SECONDS", "10")),
+        )
+        # Alerts per recipient and location are coalesced into digests
+        self.digest = DigestEngine(
+            window=float(os.getenv("NOTIFICATION_DIGEST_WINDOW_SECONDS", "300")),
+            deliver=self._deliver,
+        )
 
     def _resolve_sender(self) -> str:
         """
@@ -60,15 +263,7 @@ class NotificationManager:
             f"Analysis: {analysis}\n"
             f"Action: Immediate inspection required."
         )
-        self._simulate_sms(message)
-        if self._leak_email_send_count < self.max_leak_email_sends:
-            self._send_email(message, subject="LeakWatch AI Leak Alert")
-            self._leak_email_send_count += 1
-        else:
-            logger.warning(
-                "Leak email send limit reached (%s). Skipping leak email notification.",
-                self.max_leak_email_sends,
-            )
+        self._notify(location, "LeakWatch AI Leak Alert", message)
 
     def send_water_quality_alert(
         self,
@@ -89,8 +284,7 @@ class NotificationManager:
             f"WQI Score: {wqi_score}\n"
             f"Details: {analysis}"
         )
-        self._simulate_sms(message)
-        self._send_email(message, subject="LeakWatch AI Water Quality Alert")
+        self._notify(pipeline_id, "LeakWatch AI Water Quality Alert", message)
 
     def send_issue_resolved_alert(
         self,
@@ -108,15 +302,32 @@ class NotificationManager:
             f"Notes: {notes or 'No additional notes'}\n"
             f"Status: Resolved"
         )
-        self._simulate_sms(message)
-        self._send_email(message, subject="LeakWatch AI Issue Resolved")
+        self._notify(location, "LeakWatch AI Issue Resolved", message)
+
+    def _notify(self, location: str, subject: str, message: str):
+        """Route one alert to every channel through the digest engine."""
+        self.digest.submit("sms", self.alert_phone, location, subject, message)
+        self.digest.submit("email", self.alert_email, location, subject, message)
+
+    def _deliver(self, channel: str, recipient: str, subject: str, message: str):
+        if channel == "sms":
+            self._simulate_sms(message)
+        else:
+            self._send_email(message, subject=subject)
 
     def _simulate_sms(self, message: str):
         logger.info("[SMS SIMULATION] -> %s", self.alert_phone)
         logger.info("Message: %s", message)
 
+    def _smtp_configured(self) -> bool:
+        required = [self.smtp_server, self.alert_email]
+        if self.smtp_login:
+            required += [self.smtp_user, self.smtp_password]
+        return all(required)
+
     def _send_email(self, message: str, subject: str):
-        if not all([self.smtp_server, self.smtp_user, self.smtp_password, self.alert_email]):
+        """Queue the email in the outbox; the outbox worker delivers it."""
+        if not self._smtp_configured():
             logger.info("[EMAIL SIMULATION] -> %s", self.alert_email or "<missing ALERT_EMAIL>")
             logger.info("Message: %s", message)
             logger.warning(
@@ -125,19 +336,10 @@ class NotificationManager:
             return
 
         try:
-            msg = MIMEText(message, _charset="utf-8")
-            msg["Subject"] = subject
-            msg["From"] = self._resolve_sender()
-            msg["To"] = self.alert_email
-
-            with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=20) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
-
-            logger.info("[REAL EMAIL SENT] -> %s", self.alert_email)
+            outbox_id = self.outbox.enqueue(self.alert_email, subject, message, sender=self._resolve_sender())
+            logger.info("[EMAIL QUEUED] #%s -> %s", outbox_id, self.alert_email)
         except Exception as exc:
-            logger.error("Failed to send real email: %s", exc)
+            logger.error("Failed to queue email: %s", exc)
 
 
 notification_manager = NotificationManager()
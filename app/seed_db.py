@@ -1,11 +1,12 @@
-from app.database.session import SessionLocal, engine, Base
+from app.database.session import SessionLocal, engine
+from app.database.schema import ensure_schema
 from app.models.db_models import User
 from app.auth.service import get_password_hash
 
 def seed_database():
     print("Seeding database...")
     # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
+    ensure_schema(engine)
     
     db = SessionLocal()
     try:
@@ -3,6 +3,8 @@ from datetime import datetime
 from enum import Enum
 from typing import List
 
+DEFAULT_SENSOR_ID = "SENSOR-001"
+
 class SimulationMode(str, Enum):
     NORMAL = "normal"
     SMALL_LEAK = "small_leak"
@@ -16,6 +18,7 @@ class SensorData(BaseModel):
     flow_rate: float # L/min
     acoustic_signal: float # mV or relative amplitude
     mode: SimulationMode
+    sensor_id: str = DEFAULT_SENSOR_ID
 
 class SimulationState(BaseModel):
     is_active: bool
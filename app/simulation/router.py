@@ -1,22 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import asyncio
 import json
+from datetime import datetime
 from .models import SimulationMode, SensorData, SimulationState
 from .service import simulator_engine
+from app.database.pagination import keyset_page, set_next_cursor
 from app.database.session import get_db
+from app.executors.pool import db_executor
 from app.models.db_models import SensorReading
 
 router = APIRouter()
 
+def _query_sensor_history(db: Session, limit: int, cursor, start, end):
+    return keyset_page(db.query(SensorReading), SensorReading, limit, cursor, start, end)
+
 @router.get("/history")
-async def get_sensor_history(limit: int = 100, db: Session = Depends(get_db)):
+async def get_sensor_history(
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: Session = Depends(get_db),
+):
     """
-    Fetch historical sensor readings from the database.
+    Fetch historical sensor readings from the database, newest first. Pass the
+    X-Next-Cursor response header back as `cursor` for the next page.
     """
-    readings = db.query(SensorReading).order_by(SensorReading.timestamp.desc()).limit(limit).all()
-    return readings
+    rows, next_cursor = await db_executor.run(_query_sensor_history, db, limit, cursor, start, end)
+    set_next_cursor(response, next_cursor)
+    return rows
 
 @router.get("/status", response_model=SimulationState)
 async def get_status():
@@ -0,0 +1 @@
+"""Buffered telemetry persistence."""
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque
+
+from sqlalchemy import insert
+
+from app.analytics import rollups
+from app.database.session import SessionLocal
+from app.executors.pool import ExecutorSaturatedError, db_executor
+from app.models.db_models import SensorReading, WaterQualityReadingRecord
+
+logger = logging.getLogger("telemetry_writer")
+
+
+class TelemetryWriter:
+    """
+    Write-behind buffer for high-frequency telemetry rows.
+
+    Readings are appended to bounded in-memory ring buffers (one per table) and
+    written with a single bulk INSERT per table once either `batch_size` rows
+    are pending or `flush_interval` seconds have elapsed. When a buffer is full
+    the oldest pending row is discarded and counted as dropped. Sensor rows
+    are folded into the analytics rollups in the same transaction.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        max_pending: int = 10000,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._buffers: dict[type, Deque[dict]] = {
+            SensorReading: deque(maxlen=max_pending),
+            WaterQualityReadingRecord: deque(maxlen=max_pending),
+        }
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._running = False
+
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._rollup_buckets = 0
+        self._high_water_mark = 0
+        self._last_flush_at: float | None = None
+        self._last_flush_rows = 0
+        self._last_flush_seconds = 0.0
+
+    def enqueue_sensor_reading(self, reading):
+        self._enqueue(SensorReading, {
+            "timestamp": reading.timestamp,
+            "pressure": reading.pressure,
+            "flow_rate": reading.flow_rate,
+            "acoustic_signal": reading.acoustic_signal,
+            "mode": reading.mode.value,
+            "sensor_id": reading.sensor_id,
+        })
+
+    def enqueue_water_quality_reading(self, reading):
+        self._enqueue(WaterQualityReadingRecord, {
+            "timestamp": reading.timestamp,
+            "pipeline_id": reading.pipeline_id,
+            "ph": reading.ph,
+            "turbidity": reading.turbidity,
+            "tds": reading.tds,
+            "temperature": reading.temperature,
+            "dissolved_oxygen": reading.dissolved_oxygen,
+            "mode": reading.mode.value,
+        })
+
+    def _enqueue(self, model, row: dict):
+        with self._lock:
+            buffer = self._buffers[model]
+            if len(buffer) == buffer.maxlen:
+                # Ring buffer semantics: the append below evicts the oldest row.
+                self._dropped += 1
+            buffer.append(row)
+            self._enqueued += 1
+            pending = self._pending_locked()
+            self._high_water_mark = max(self._high_water_mark, pending)
+
+        if pending >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _pending_locked(self) -> int:
+        return sum(len(buffer) for buffer in self._buffers.values())
+
+    def flush(self) -> int:
+        """
+        Synchronously write every pending row. Safe to call from any thread;
+        concurrent callers are serialized so rows are written in arrival order.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batches = {
+                    model: list(buffer)
+                    for model, buffer in self._buffers.items()
+                    if buffer
+                }
+                for buffer in self._buffers.values():
+                    buffer.clear()
+
+            if not batches:
+                return 0
+
+            started = time.perf_counter()
+            written = 0
+            rollup_buckets = 0
+            db = SessionLocal()
+            try:
+                for model, rows in batches.items():
+                    db.execute(insert(model), rows)
+                    written += len(rows)
+                    if model is SensorReading:
+                        rollup_buckets = rollups.apply_rows(db, rows)
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                self._failed_flushes += 1
+                self._requeue(batches)
+                logger.error(
+                    "Telemetry flush of %s rows failed, re-queued: %s",
+                    sum(len(rows) for rows in batches.values()),
+                    exc,
+                )
+                return 0
+            finally:
+                db.close()
+
+            self._flushes += 1
+            self._written += written
+            self._rollup_buckets += rollup_buckets
+            self._last_flush_at = time.time()
+            self._last_flush_rows = written
+            self._last_flush_seconds = time.perf_counter() - started
+            return written
+
+    def _requeue(self, batches: dict[type, list[dict]]):
+        """Put rows from a failed flush back in front of anything queued since."""
+        with self._lock:
+            for model, rows in batches.items():
+                buffer = self._buffers[model]
+                room = buffer.maxlen - len(buffer)
+                keep = rows[-room:] if room > 0 else []
+                self._dropped += len(rows) - len(keep)
+                buffer.extendleft(reversed(keep))
+
+    async def run(self):
+        """Flush loop; wakes on the size trigger or after `flush_interval`."""
+        self._wakeup = asyncio.Event()
+        self._running = True
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await db_executor.run(self.flush)
+                except ExecutorSaturatedError as exc:
+                    logger.warning("Telemetry flush deferred: %s", exc)
+        finally:
+            self._running = False
+            self._wakeup = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = {
+                model.__tablename__: len(buffer)
+                for model, buffer in self._buffers.items()
+            }
+        total_pending = sum(pending.values())
+        capacity = self.max_pending * len(self._buffers)
+        return {
+            "running": self._running,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "max_pending_per_table": self.max_pending,
+            "pending": pending,
+            "buffer_utilization": round(total_pending / capacity, 4) if capacity else 0.0,
+            "high_water_mark": self._high_water_mark,
+            "enqueued": self._enqueued,
+            "written": self._written,
+            "dropped": self._dropped,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "rollup_buckets_upserted": self._rollup_buckets,
+            "last_flush_at": self._last_flush_at,
+            "last_flush_rows": self._last_flush_rows,
+            "last_flush_seconds": round(self._last_flush_seconds, 6),
+        }
+
+
+telemetry_writer = TelemetryWriter(
+    batch_size=int(os.getenv("TELEMETRY_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("TELEMETRY_FLUSH_INTERVAL_SECONDS", "2.0")),
+    max_pending=int(os.getenv("TELEMETRY_MAX_PENDING", "10000")),
+)
@@ -1,7 +1,7 @@
 import asyncio
 import json
 from datetime import datetime
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError
@@ -16,7 +16,9 @@ from .models import (
     WQIResult,
 )
 from .service import water_quality_service
+from app.database.pagination import keyset_page, set_next_cursor
 from app.database.session import get_db
+from app.executors.pool import db_executor
 from app.models.db_models import WaterQualityReadingRecord
 
 router = APIRouter()
@@ -36,17 +38,15 @@ async def set_simulation_mode(mode: WaterQualitySimulationMode):
     return {"message": f"Water quality simulation mode set to {mode}"}
 
 
-@router.get("/history", response_model=list[WaterQualityPredictionResponse])
-async def get_quality_history(limit: int = 100, db: Session = Depends(get_db)):
+def _query_quality_history(
+    db: Session, limit: int, cursor, start, end
+) -> tuple[list[WaterQualityPredictionResponse], str | None]:
     try:
-        readings: list[WaterQualityReadingRecord] = (
-            db.query(WaterQualityReadingRecord)
-            .order_by(WaterQualityReadingRecord.timestamp.desc())
-            .limit(limit)
-            .all()
+        readings, next_cursor = keyset_page(
+            db.query(WaterQualityReadingRecord), WaterQualityReadingRecord, limit, cursor, start, end
         )
     except OperationalError:
-        return []
+        return [], None
     results: list[WaterQualityPredictionResponse] = []
     for row in readings:
         payload = WaterQualityAssessmentInput(
@@ -63,6 +63,20 @@ async def get_quality_history(limit: int = 100, db: Session = Depends(get_db)):
                 timestamp=row.timestamp,
             )
         )
+    return results, next_cursor
+
+
+@router.get("/history", response_model=list[WaterQualityPredictionResponse])
+async def get_quality_history(
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: Session = Depends(get_db),
+):
+    results, next_cursor = await db_executor.run(_query_quality_history, db, limit, cursor, start, end)
+    set_next_cursor(response, next_cursor)
     return results
 
 